@@ -70,6 +70,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'society.querycount.QueryCountMiddleware',
 ]
 
 ROOT_URLCONF = 'mahall_backend.urls'
@@ -158,6 +159,39 @@ REST_FRAMEWORK = {
 
 }
 
+# Default text search mode for member/house list filters: 'contains' (LIKE)
+# or 'fts' (SQLite FTS5 prefix MATCH). Requests can override with ?search_mode=
+SOCIETY_SEARCH_MODE = 'contains'
+
+# Upper bound on members scored per DigitalRequest search_parents call;
+# requests can lower or raise it with ?max_candidates=
+SEARCH_PARENTS_MAX_CANDIDATES = 500
+
+# Per-request SQL accounting (X-Query-Count/-Time/-Duplicates headers and a
+# warning log for repeated statements); see society/querycount.py.
+# Enable with SOCIETY_QUERY_COUNT=1 in the environment.
+SOCIETY_QUERY_COUNT = os.environ.get('SOCIETY_QUERY_COUNT') == '1'
+SOCIETY_QUERY_COUNT_DUPLICATES = 5
+
+# Seconds between in-process sweeps moving pending obligations past their
+# subcollection's due date to overdue (runserver only; 0 disables). The
+# sweep_overdue management command runs the same sweep on demand.
+SOCIETY_OVERDUE_SWEEP_INTERVAL = int(os.environ.get('SOCIETY_OVERDUE_SWEEP_INTERVAL', 3600))
+
+# /api/changes/ holds back rows written less than this many seconds ago, so a
+# transaction still committing can't slip in behind a client's change token.
+SOCIETY_CHANGES_SETTLE_SECONDS = 2
+
+# Background push of house and member changes to their Firestore family
+# documents (runserver only; 0, the default, disables it): seconds between
+# drains of the outbox, the most document writes per second, and how many
+# drains a change may fail before it is parked as failed. When enabled, every
+# local edit of a linked house or its members is pushed, not only the ones
+# synced from My Actions.
+SOCIETY_FIRESTORE_SYNC_INTERVAL = int(os.environ.get('SOCIETY_FIRESTORE_SYNC_INTERVAL', 0))
+SOCIETY_FIRESTORE_SYNC_RATE = 5
+SOCIETY_FIRESTORE_SYNC_MAX_DRAINS = 10
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -7,4 +7,8 @@ class SocietyConfig(AppConfig):
 
     def ready(self):
         import society.signals
+        from society.overdue import start_periodic_sweep
+        from society.firestore_sync import start_background_sync
+        start_periodic_sweep()
+        start_background_sync()
 
@@ -0,0 +1,415 @@
+"""
+Set-based writes for batches of obligations and their receipts.
+
+The single-row API paths go through a serializer and Model.save(), which costs
+several queries per row (reference lookups, the duplicate check, the area
+denormalization and the signal handlers). The functions here validate a whole
+batch with a few IN queries and write it with bulk_create, or select a whole
+population of members and write it with one INSERT ... SELECT. Both skip
+save() and the signals, so they do the signals' work themselves: new rows are
+flagged sync_pending, and the StatCounter deltas and outbox entries are written
+in the same transaction.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.db import connection, models, transaction
+from django.db.models import F, Max, OuterRef, Subquery, Sum, Value
+from django.utils import timezone
+
+from . import counters, outbox
+from .sequences import next_receipt_numbers
+
+OBLIGATION_BATCH_SIZE = 500
+# Same wording as MemberObligationSerializer.validate
+DUPLICATE_OBLIGATION = "This member is already assigned to this obligation."
+
+
+def _row_error(index, data, errors):
+    return {'index': index, 'data': data, 'errors': errors}
+
+
+def create_obligations(rows, skip_existing=False, batch_size=OBLIGATION_BATCH_SIZE):
+    """
+    Validate and insert obligation `rows`, each shaped like the input of
+    MemberObligationSerializer (`member` is a member_id, `subcollection` a pk).
+
+    Rows failing validation are reported and the rest are still inserted.
+    A (subcollection, member) pair that already exists is an error, or with
+    `skip_existing` is reported as skipped instead.
+
+    Returns (created, errors, skipped): the new MemberObligation instances,
+    [{'index', 'data', 'errors'}] and [{'index', 'data'}], in input order.
+    """
+    from .models import Area, Member, MemberObligation, SubCollection
+    from .serializers import MemberObligationBulkRowSerializer
+
+    errors, skipped, valid = [], [], []
+    for index, data in enumerate(rows):
+        serializer = MemberObligationBulkRowSerializer(data=data)
+        if serializer.is_valid():
+            valid.append((index, data, serializer.validated_data))
+        else:
+            errors.append(_row_error(index, data, serializer.errors))
+
+    # Resolve every reference in the batch with one IN query per model
+    members = {
+        member.member_id: member
+        for member in Member.objects.filter(member_id__in={v['member'] for _, _, v in valid})
+        .select_related('house').only('id', 'member_id', 'house__id', 'house__area')
+    }
+    subcollections = set(SubCollection.objects.filter(
+        pk__in={v['subcollection'] for _, _, v in valid}).values_list('pk', flat=True))
+    area_ids = {v['area'] for _, _, v in valid if v.get('area') is not None}
+    areas = set(Area.objects.filter(pk__in=area_ids).values_list('pk', flat=True)) if area_ids else set()
+
+    resolved = []
+    for index, data, values in valid:
+        row_errors = {}
+        member = members.get(values['member'])
+        if member is None:
+            row_errors['member'] = [f"Object with member_id={values['member']} does not exist."]
+        if values['subcollection'] not in subcollections:
+            row_errors['subcollection'] = [f'Invalid pk "{values["subcollection"]}" - object does not exist.']
+        if values.get('area') is not None and values['area'] not in areas:
+            row_errors['area'] = [f'Invalid pk "{values["area"]}" - object does not exist.']
+        if row_errors:
+            errors.append(_row_error(index, data, row_errors))
+        else:
+            resolved.append((index, data, values, member))
+
+    existing = set()
+    if resolved:
+        existing = set(MemberObligation.objects.filter(
+            subcollection__in={v['subcollection'] for _, _, v, _ in resolved},
+            member__in=[m.pk for _, _, _, m in resolved],
+        ).values_list('subcollection_id', 'member_id'))
+
+    pending, seen = [], set()
+    for index, data, values, member in resolved:
+        pair = (values['subcollection'], member.pk)
+        if pair in existing and skip_existing:
+            skipped.append({'index': index, 'data': data})
+            continue
+        if pair in existing or pair in seen:
+            errors.append(_row_error(index, data, {'non_field_errors': [DUPLICATE_OBLIGATION]}))
+            continue
+        seen.add(pair)
+        area_id = values.get('area')
+        if area_id is None and member.house_id is not None:
+            area_id = member.house.area_id
+        pending.append(MemberObligation(
+            subcollection_id=values['subcollection'],
+            member=member,
+            area_id=area_id,
+            amount=values['amount'],
+            paid_status=values.get('paid_status', 'pending'),
+            sync_pending=True,
+        ))
+
+    created = []
+    if pending:
+        with transaction.atomic():
+            # With skip_existing, a pair inserted concurrently since the check
+            # above is absorbed by ignore_conflicts rather than failing the batch
+            MemberObligation.objects.bulk_create(pending, batch_size=batch_size, ignore_conflicts=skip_existing)
+            created = _with_pks(pending) if skip_existing else pending
+            deltas = Counter(counters.key(counters.OBLIGATION, o.area_id, o.paid_status) for o in created)
+            counters.apply(deltas)
+            outbox.record_many('MemberObligation', [o.pk for o in created], outbox.CREATE,
+                               outbox.tracked_fields(MemberObligation).values())
+
+    errors.sort(key=lambda error: error['index'])
+    return created, errors, skipped
+
+
+def _with_pks(obligations):
+    """
+    Fill in the primary keys bulk_create(ignore_conflicts=True) cannot return,
+    by reading the rows back by (subcollection, member).
+    """
+    from .models import MemberObligation
+
+    by_pair = {(o.subcollection_id, o.member_id): o for o in obligations}
+    for pk, subcollection_id, member_id in MemberObligation.objects.filter(
+            subcollection__in={o.subcollection_id for o in obligations},
+            member__in={o.member_id for o in obligations},
+    ).values_list('pk', 'subcollection_id', 'member_id'):
+        obligation = by_pair.get((subcollection_id, member_id))
+        if obligation is not None:
+            obligation.pk = pk
+            obligation._state.adding = False
+    return [o for o in obligations if o.pk is not None]
+
+
+def _years_ago(today, years):
+    try:
+        return today.replace(year=today.year - years)
+    except ValueError:  # 29 February
+        return today.replace(year=today.year - years, day=28)
+
+
+def _flag(value, name):
+    value = str(value).lower()
+    if value in ('1', 'true', 'yes'):
+        return True
+    if value in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f"{name} must be true or false")
+
+
+def select_members(params, today=None):
+    """
+    Members matching a population selector, given as request parameters:
+    area (one id or a comma-separated list), status (default 'live'; 'all'
+    for any), guardian, gender, general_body_member, min_age and max_age
+    (whole years on `today`). Raises ValueError for malformed values.
+    """
+    from .models import Member
+
+    today = today or timezone.localdate()
+    members = Member.objects.all()
+
+    status = params.get('status') or 'live'
+    if status != 'all':
+        members = members.filter(status=status)
+    if params.get('area'):
+        try:
+            area_ids = [int(a) for a in str(params['area']).split(',') if a.strip()]
+        except ValueError:
+            raise ValueError("area must be an id or a comma-separated list of ids")
+        members = members.filter(house__area__in=area_ids)
+    if params.get('gender'):
+        members = members.filter(gender=params['gender'])
+    if params.get('guardian') not in (None, ''):
+        members = members.filter(isGuardian=_flag(params['guardian'], 'guardian'))
+    if params.get('general_body_member') not in (None, ''):
+        members = members.filter(general_body_member=_flag(params['general_body_member'], 'general_body_member'))
+    for name in ('min_age', 'max_age'):
+        if params.get(name) in (None, ''):
+            continue
+        try:
+            age = int(params[name])
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} must be a whole number of years")
+        if age < 0:
+            raise ValueError(f"{name} must not be negative")
+        if name == 'min_age':
+            members = members.filter(date_of_birth__lte=_years_ago(today, age))
+        else:
+            members = members.filter(date_of_birth__gt=_years_ago(today, age + 1))
+    return members
+
+
+def assign_subcollection(subcollection, members, dry_run=False):
+    """
+    Create an obligation of `subcollection` for every member in the `members`
+    queryset that does not have one yet, with a single INSERT ... SELECT. The
+    amount is the subcollection's and the area is taken from the member's
+    house. Returns {'matched', 'already_assigned', 'created'}.
+    """
+    from .models import MemberObligation
+
+    members = members.order_by()
+    matched = members.count()
+    candidates = members.exclude(obligations__subcollection=subcollection)
+    if dry_run:
+        to_create = candidates.count()
+        return {'matched': matched, 'already_assigned': matched - to_create, 'created': 0, 'would_create': to_create}
+
+    now = timezone.now()
+    # Column -> expression over the member row, in INSERT column order
+    columns = {
+        'subcollection_id': Value(subcollection.pk, output_field=models.IntegerField()),
+        'member_id': F('pk'),
+        'area_id': F('house__area_id'),
+        'amount': Value(subcollection.amount, output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+        'paid_status': Value('pending'),
+        'paid_total': Value(0, output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+        'sync_pending': Value(True),
+        'created_at': Value(now, output_field=models.DateTimeField()),
+        'updated_at': Value(now, output_field=models.DateTimeField()),
+    }
+    aliases = {f'_{column}': expression for column, expression in columns.items()}
+    select = candidates.annotate(**aliases).values_list(*aliases)
+    select_sql, params = select.query.get_compiler(connection=connection).as_sql()
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) {}'.format(
+        quote(MemberObligation._meta.db_table), ', '.join(quote(c) for c in columns), select_sql)
+
+    with transaction.atomic():
+        # The members about to be assigned, so the new rows can be found again
+        # by (subcollection, member) rather than by their timestamp
+        member_ids = list(candidates.values_list('pk', flat=True))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            created = cursor.rowcount
+        if created:
+            deltas = Counter()
+            for start in range(0, len(member_ids), OBLIGATION_BATCH_SIZE):
+                new_rows = MemberObligation.objects.filter(
+                    subcollection=subcollection, member_id__in=member_ids[start:start + OBLIGATION_BATCH_SIZE])
+                deltas.update(counters.obligation_counts(new_rows))
+                outbox.record_many('MemberObligation', new_rows.values_list('pk', flat=True), outbox.CREATE,
+                                   outbox.tracked_fields(MemberObligation).values())
+            counters.apply(deltas)
+    return {'matched': matched, 'already_assigned': matched - created, 'created': created}
+
+
+def settle_obligations(obligation_ids, payment_method='cash', remarks=None):
+    """
+    Mark the given obligations paid. Each one with an outstanding balance gets
+    a receipt for it (created with bulk_create, receipt numbers reserved as
+    one block), so paid_total, the receipts and the status stay in agreement.
+    The obligation totals, statuses and sync flags are then set with a few
+    UPDATEs, all in one transaction.
+
+    Returns {'updated_count', 'receipts_created', 'amount_received'}, where
+    updated_count counts every given obligation that exists, already paid
+    ones included, as the single UPDATE this replaced did.
+    """
+    from .models import MemberObligation, Receipt
+
+    with transaction.atomic():
+        obligations = MemberObligation.objects.filter(id__in=obligation_ids)
+        rows = list(obligations.select_for_update().values_list('pk', 'amount', 'paid_total', 'paid_status'))
+        outstanding = [(pk, amount - paid_total) for pk, amount, paid_total, _ in rows if paid_total < amount]
+        # Fully paid rows that still carry another status
+        relabelled = [pk for pk, amount, paid_total, paid_status in rows
+                      if paid_total >= amount and paid_status != 'paid']
+        deltas = counters.obligation_status_deltas(obligations, 'paid')
+
+        receipts = [
+            Receipt(obligation_id=pk, amount_paid=balance, receipt_number=number,
+                    payment_method=payment_method, remarks=remarks, sync_pending=True)
+            for (pk, balance), number in zip(outstanding, next_receipt_numbers(len(outstanding)) if outstanding else [])
+        ]
+        Receipt.objects.bulk_create(receipts, batch_size=OBLIGATION_BATCH_SIZE)
+        outbox.record_many('Receipt', [r.pk for r in receipts], outbox.CREATE,
+                           outbox.tracked_fields(Receipt).values())
+
+        now = timezone.now()
+        changed = dict(paid_status='paid', updated_at=now, sync_pending=True)
+        if receipts:
+            settled = [pk for pk, _ in outstanding]
+            latest_receipt = Receipt.objects.filter(obligation=OuterRef('pk')).order_by('-payment_date')
+            obligations.filter(id__in=settled).update(
+                paid_total=F('amount'),
+                last_payment_at=Subquery(latest_receipt.values('payment_date')[:1]),
+                **changed,
+            )
+            outbox.record_many('MemberObligation', settled, outbox.UPDATE,
+                               ['paid_total', 'last_payment_at', 'paid_status'])
+        if relabelled:
+            MemberObligation.objects.filter(id__in=relabelled).update(**changed)
+            outbox.record_many('MemberObligation', relabelled, outbox.UPDATE, ['paid_status'])
+        counters.apply(deltas)
+
+    return {
+        'updated_count': len(rows),
+        'receipts_created': len(receipts),
+        'amount_received': sum((balance for _, balance in outstanding), Decimal('0.00')),
+    }
+
+
+def create_receipts(rows, batch_size=OBLIGATION_BATCH_SIZE):
+    """
+    Validate and insert receipt `rows` (obligation pk, amount_paid and the
+    optional payment_method, receipt_number, remarks) with one bulk insert,
+    numbering the rows without a receipt_number from one reserved block.
+
+    The affected obligations' paid_total, last_payment_at and status are then
+    recomputed from a single grouped aggregate of their receipts and written
+    with bulk_update, in the same transaction.
+
+    Returns (receipt_numbers, errors): the numbers in input order (None for a
+    rejected row) and [{'index', 'data', 'errors'}].
+    """
+    from .models import MemberObligation, Receipt
+    from .serializers import ReceiptBulkRowSerializer
+
+    errors, valid = [], []
+    for index, data in enumerate(rows):
+        serializer = ReceiptBulkRowSerializer(data=data)
+        if serializer.is_valid():
+            valid.append((index, data, serializer.validated_data))
+        else:
+            errors.append(_row_error(index, data, serializer.errors))
+
+    receipt_numbers = [None] * len(rows)
+    with transaction.atomic():
+        obligations = {
+            o.pk: o for o in MemberObligation.objects.select_for_update()
+            .filter(pk__in={v['obligation'] for _, _, v in valid})
+            .only('id', 'amount', 'area', 'paid_status', 'paid_total', 'last_payment_at')
+        }
+        given = {v['receipt_number'] for _, _, v in valid if v.get('receipt_number')}
+        taken = set(Receipt.objects.filter(receipt_number__in=given).values_list('receipt_number', flat=True))
+
+        accepted, seen = [], set()
+        for index, data, values in valid:
+            row_errors = {}
+            if values['obligation'] not in obligations:
+                row_errors['obligation'] = [f'Invalid pk "{values["obligation"]}" - object does not exist.']
+            number = values.get('receipt_number') or None
+            if number and (number in taken or number in seen):
+                row_errors['receipt_number'] = ["receipt with this receipt number already exists."]
+            if row_errors:
+                errors.append(_row_error(index, data, row_errors))
+                continue
+            if number:
+                seen.add(number)
+            accepted.append((index, values, number))
+
+        if not accepted:
+            errors.sort(key=lambda error: error['index'])
+            return receipt_numbers, errors
+
+        unnumbered = sum(1 for _, _, number in accepted if not number)
+        numbers = iter(next_receipt_numbers(unnumbered) if unnumbered else [])
+        receipts = []
+        for index, values, number in accepted:
+            receipt = Receipt(
+                obligation_id=values['obligation'],
+                amount_paid=values['amount_paid'],
+                payment_method=values.get('payment_method', 'cash'),
+                receipt_number=number or next(numbers),
+                remarks=values.get('remarks'),
+                sync_pending=True,
+            )
+            receipt_numbers[index] = receipt.receipt_number
+            receipts.append(receipt)
+        Receipt.objects.bulk_create(receipts, batch_size=batch_size)
+        outbox.record_many('Receipt', [r.pk for r in receipts], outbox.CREATE,
+                           outbox.tracked_fields(Receipt).values())
+
+        affected = [obligations[pk] for pk in {r.obligation_id for r in receipts}]
+        totals = {
+            row['obligation']: (row['total'], row['last'])
+            for row in Receipt.objects.filter(obligation__in=[o.pk for o in affected]).order_by()
+            .values('obligation').annotate(total=Sum('amount_paid'), last=Max('payment_date'))
+        }
+        now = timezone.now()
+        deltas = Counter()
+        relabelled = set()
+        for obligation in affected:
+            obligation.paid_total, obligation.last_payment_at = totals[obligation.pk]
+            paid_status = obligation.status_for_paid_total(obligation.paid_total)
+            if paid_status != obligation.paid_status:
+                deltas[counters.key(counters.OBLIGATION, obligation.area_id, obligation.paid_status)] -= 1
+                deltas[counters.key(counters.OBLIGATION, obligation.area_id, paid_status)] += 1
+                obligation.paid_status = paid_status
+                relabelled.add(obligation.pk)
+            obligation.updated_at, obligation.sync_pending = now, True
+        MemberObligation.objects.bulk_update(
+            affected, ['paid_total', 'last_payment_at', 'paid_status', 'updated_at', 'sync_pending'],
+            batch_size=batch_size)
+        counters.apply(deltas)
+        for ids, fields in (
+            ([o.pk for o in affected if o.pk in relabelled], ['paid_total', 'last_payment_at', 'paid_status']),
+            ([o.pk for o in affected if o.pk not in relabelled], ['paid_total', 'last_payment_at']),
+        ):
+            outbox.record_many('MemberObligation', ids, outbox.UPDATE, fields)
+
+    errors.sort(key=lambda error: error['index'])
+    return receipt_numbers, errors
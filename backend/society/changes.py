@@ -0,0 +1,189 @@
+"""
+Incremental change feed behind /api/changes/.
+
+Clients keep a local copy of areas, houses, members, obligations and
+receipts warm by asking for what changed since an opaque token instead of
+re-listing everything. Upserts are found with a keyset scan on each model's
+indexed `updated_at` (ties broken by pk). Deletions come from the Tombstone
+table, which the post_delete handlers in signals.py fill.
+
+Rows newer than SOCIETY_CHANGES_SETTLE_SECONDS are held back until the next
+call. `updated_at` is stamped before the writing transaction commits, so a
+transaction still in flight could otherwise commit a row older than a mark
+the client has already passed.
+
+Clients apply a response's upserts first and its deletions second.
+"""
+import base64
+import binascii
+import datetime
+import json
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .export import MEMBER_COLUMNS
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class Feed:
+    """One model in the change feed: its key in the payload and its columns."""
+
+    def __init__(self, key, model_name, public_id, columns):
+        self.key = key
+        self.model_name = model_name
+        self.public_id = public_id  # field holding the id clients know the row by
+        self.columns = columns  # payload column -> values() lookup
+
+    @property
+    def model(self):
+        from django.apps import apps
+        return apps.get_model('society', self.model_name)
+
+
+FEEDS = [
+    Feed('areas', 'Area', 'id', {
+        'id': 'id', 'name': 'name', 'description': 'description', 'head_person': 'head_person',
+        'firebase_id': 'firebase_id', 'created_at': 'created_at', 'updated_at': 'updated_at',
+    }),
+    Feed('houses', 'House', 'home_id', {
+        'home_id': 'home_id', 'firebase_id': 'firebase_id', 'old_mahall_code': 'old_mahall_code',
+        'house_name': 'house_name', 'family_name': 'family_name', 'location_name': 'location_name',
+        'locality': 'locality', 'area': 'area_id', 'address': 'address',
+        'created_at': 'created_at', 'updated_at': 'updated_at',
+    }),
+    Feed('members', 'Member', 'member_id', MEMBER_COLUMNS),
+    Feed('obligations', 'MemberObligation', 'id', {
+        'id': 'id', 'subcollection': 'subcollection_id', 'member': 'member__member_id', 'area': 'area_id',
+        'amount': 'amount', 'paid_status': 'paid_status', 'paid_total': 'paid_total',
+        'last_payment_at': 'last_payment_at', 'created_at': 'created_at', 'updated_at': 'updated_at',
+    }),
+    Feed('receipts', 'Receipt', 'id', {
+        'id': 'id', 'obligation': 'obligation_id', 'receipt_number': 'receipt_number',
+        'amount_paid': 'amount_paid', 'payment_date': 'payment_date', 'payment_method': 'payment_method',
+        'remarks': 'remarks', 'updated_at': 'updated_at',
+    }),
+]
+FEEDS_BY_MODEL = {feed.model_name: feed for feed in FEEDS}
+
+
+def feed_for(model):
+    return FEEDS_BY_MODEL.get(model.__name__)
+
+
+# --- Tokens ---
+# {'marks': {feed key: [updated_at iso, pk]}, 'tombstone': last tombstone id}
+
+def encode_token(marks, tombstone):
+    raw = json.dumps({'marks': marks, 'tombstone': tombstone}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_token(token):
+    if not token:
+        return {}, 0
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+        marks = {}
+        for key, (stamp, pk) in data.get('marks', {}).items():
+            when = parse_datetime(stamp)
+            if when is None:
+                raise ValueError(stamp)
+            marks[key] = (when, pk)
+        return marks, int(data.get('tombstone', 0))
+    except (binascii.Error, ValueError, TypeError, AttributeError) as e:
+        raise InvalidToken("Invalid or corrupt change token") from e
+
+
+# --- Reading ---
+
+def changes_since(token=None, limit=DEFAULT_LIMIT, now=None):
+    """
+    Rows upserted and deleted since `token` (everything when empty), at most
+    `limit` per model. Returns {'changes': {feed key: [rows]}, 'deleted':
+    {feed key: [public ids]}, 'token', 'has_more'}; with `has_more` the
+    caller should ask again straight away with the new token.
+    """
+    from .models import Tombstone
+
+    marks, tombstone_mark = decode_token(token)
+    settle = datetime.timedelta(seconds=getattr(settings, 'SOCIETY_CHANGES_SETTLE_SECONDS', 2))
+    until = (now or timezone.now()) - settle
+
+    has_more = False
+    changes = {}
+    new_marks = {key: [when.isoformat(), pk] for key, (when, pk) in marks.items()}
+    for feed in FEEDS:
+        rows = feed.model._base_manager.filter(updated_at__lte=until)
+        if feed.key in marks:
+            when, pk = marks[feed.key]
+            rows = rows.filter(Q(updated_at__gt=when) | Q(updated_at=when, pk__gt=pk))
+        columns = list(feed.columns)
+        rows = list(rows.order_by('updated_at', 'pk').values_list(
+            'pk', *[feed.columns[c] for c in columns])[:limit + 1])
+        if len(rows) > limit:
+            has_more = True
+            rows = rows[:limit]
+        changes[feed.key] = [dict(zip(columns, row[1:])) for row in rows]
+        if rows:
+            new_marks[feed.key] = [changes[feed.key][-1]['updated_at'].isoformat(), rows[-1][0]]
+
+    deleted = {feed.key: [] for feed in FEEDS}
+    tombstones = list(Tombstone.objects.filter(id__gt=tombstone_mark, deleted_at__lte=until)
+                      .order_by('id').values_list('id', 'model', 'object_id')[:limit + 1])
+    if len(tombstones) > limit:
+        has_more = True
+        tombstones = tombstones[:limit]
+    for _, model_name, object_id in tombstones:
+        feed = FEEDS_BY_MODEL.get(model_name)
+        if feed is not None:
+            deleted[feed.key].append(object_id)
+    if tombstones:
+        tombstone_mark = tombstones[-1][0]
+
+    return {
+        'changes': changes,
+        'deleted': deleted,
+        'token': encode_token(new_marks, tombstone_mark),
+        'has_more': has_more,
+    }
+
+
+# --- Writing (called from signals.py) ---
+
+def record_deletion(instance):
+    from .models import Tombstone
+
+    feed = feed_for(type(instance))
+    Tombstone.objects.create(model=feed.model_name, object_id=str(getattr(instance, feed.public_id)))
+
+
+def touch_set_null_referrers(instance):
+    """
+    Bump updated_at on feed rows whose foreign key to `instance` the delete
+    will set to NULL, and record them in the outbox. Django clears those
+    columns with a queryset update that leaves updated_at alone, so the feed
+    would otherwise miss the change.
+    """
+    from . import outbox
+
+    by_model = {}
+    for relation in instance._meta.related_objects:
+        if relation.on_delete.__name__ == 'SET_NULL' and feed_for(relation.related_model):
+            condition, fields = by_model.get(relation.related_model, (Q(), []))
+            by_model[relation.related_model] = (
+                condition | Q(**{relation.field.name: instance}), fields + [relation.field.name])
+    for model, (condition, fields) in by_model.items():
+        rows = model._base_manager.filter(condition)
+        feed = feed_for(model)
+        outbox.record_many(feed.model_name, rows.values_list(feed.public_id, flat=True), outbox.UPDATE, fields)
+        rows.update(updated_at=timezone.now())
@@ -0,0 +1,146 @@
+"""
+Materialized per-area counts of houses, members (by status) and obligations
+(by paid_status), kept in the StatCounter table.
+
+Single-row writes are followed by the handlers in signals.py, which turn each
+save/delete into +1/-1 deltas applied with `UPDATE ... SET count = count + n`.
+Set-based writes (queryset.update) bypass signals, so code doing them computes
+the deltas with `obligation_status_deltas` before updating and applies them
+afterwards. `rebuild()` (the `rebuild_counters` command) recounts everything
+and reports drift.
+"""
+from collections import Counter
+from contextlib import nullcontext
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+HOUSE = 'house'
+MEMBER = 'member'
+OBLIGATION = 'obligation'
+
+# area_id stored for rows without an area
+NO_AREA = 0
+
+
+def key(kind, area_id, status=''):
+    return (kind, area_id or NO_AREA, status or '')
+
+
+def apply(deltas):
+    """Apply {(kind, area_id, status): delta} to the counters table."""
+    from .models import StatCounter
+
+    deltas = {k: n for k, n in deltas.items() if n}
+    if not deltas:
+        return
+    # A single UPDATE is atomic on its own; several must land together
+    with transaction.atomic(savepoint=False) if len(deltas) > 1 else nullcontext():
+        for (kind, area_id, status), delta in deltas.items():
+            rows = StatCounter.objects.filter(kind=kind, area_id=area_id, status=status)
+            if rows.update(count=F('count') + delta):
+                continue
+            try:
+                with transaction.atomic():
+                    StatCounter.objects.create(kind=kind, area_id=area_id, status=status, count=delta)
+            except IntegrityError:
+                # Created concurrently; add to the existing row
+                rows.update(count=F('count') + delta)
+
+
+def move(old, new, n=1):
+    """Apply moving `n` rows from key `old` to key `new` (either may be None)."""
+    deltas = Counter()
+    if old is not None:
+        deltas[old] -= n
+    if new is not None:
+        deltas[new] += n
+    apply(deltas)
+
+
+def _grouped(queryset, kind, area_field, status_field=None):
+    fields = [area_field] + ([status_field] if status_field else [])
+    counts = Counter()
+    for row in queryset.order_by().values(*fields).annotate(n=Count('pk')):
+        counts[key(kind, row[area_field], row[status_field] if status_field else '')] += row['n']
+    return counts
+
+
+def member_counts(queryset):
+    """Counter keys for the members in `queryset`, by area and status."""
+    return _grouped(queryset, MEMBER, 'house__area_id', 'status')
+
+
+def obligation_counts(queryset):
+    return _grouped(queryset, OBLIGATION, 'area_id', 'paid_status')
+
+
+def obligation_status_deltas(queryset, paid_status):
+    """
+    Deltas for setting `paid_status` on every obligation in `queryset`.
+    Compute before the update, apply() after it, in the same transaction.
+    """
+    deltas = Counter()
+    for (kind, area_id, status), n in obligation_counts(queryset.exclude(paid_status=paid_status)).items():
+        deltas[(kind, area_id, status)] -= n
+        deltas[key(kind, area_id, paid_status)] += n
+    return deltas
+
+
+def actual_counts():
+    """Count every kind from the source tables."""
+    from .models import House, Member, MemberObligation
+
+    counts = _grouped(House.objects.all(), HOUSE, 'area_id')
+    counts.update(member_counts(Member.objects.all()))
+    counts.update(obligation_counts(MemberObligation.objects.all()))
+    return counts
+
+
+def stored_counts():
+    from .models import StatCounter
+
+    return Counter({
+        (kind, area_id, status): count
+        for kind, area_id, status, count in StatCounter.objects.values_list('kind', 'area_id', 'status', 'count')
+    })
+
+
+def rebuild(dry_run=False):
+    """
+    Recount from the source tables and replace the stored counters.
+    Returns {key: (stored, actual)} for every key that had drifted.
+    """
+    from .models import StatCounter
+
+    with transaction.atomic():
+        actual = actual_counts()
+        stored = stored_counts()
+        drift = {
+            k: (stored.get(k, 0), actual.get(k, 0))
+            for k in set(actual) | set(stored)
+            if stored.get(k, 0) != actual.get(k, 0)
+        }
+        if not dry_run:
+            StatCounter.objects.all().delete()
+            StatCounter.objects.bulk_create([
+                StatCounter(kind=kind, area_id=area_id, status=status, count=n)
+                for (kind, area_id, status), n in actual.items() if n
+            ])
+    return drift
+
+
+def totals(area_id=None):
+    """
+    {kind: {status: count}} summed over all areas, or for one area. Houses
+    are reported under status ''.
+    """
+    from .models import StatCounter
+
+    rows = StatCounter.objects.all()
+    if area_id is not None:
+        rows = rows.filter(area_id=area_id)
+    result = {HOUSE: Counter(), MEMBER: Counter(), OBLIGATION: Counter()}
+    for kind, status, count in rows.values_list('kind', 'status', 'count'):
+        result[kind][status] += count
+    return result
@@ -0,0 +1,98 @@
+"""
+Streaming exports of a queryset as NDJSON or CSV.
+
+Rows are read with `values()` and `.iterator(chunk_size)` and written through a
+StreamingHttpResponse as they arrive. The client can start rendering after the
+first chunk, and server memory stays flat however large the table is.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+CHUNK_SIZE = 1000
+OUTPUTS = ('ndjson', 'csv')
+
+# Exported column -> values() lookup. Relations are exported by their public
+# ids (home_id / member_id), like MemberSerializer does.
+MEMBER_COLUMNS = {
+    'member_id': 'member_id',
+    'name': 'name',
+    'surname': 'surname',
+    'house': 'house__home_id',
+    'house_name': 'house__house_name',
+    'area': 'house__area_id',
+    'area_name': 'house__area__name',
+    'gender': 'gender',
+    'status': 'status',
+    'date_of_birth': 'date_of_birth',
+    'date_of_death': 'date_of_death',
+    'father': 'father__member_id',
+    'father_name': 'father_name',
+    'father_surname': 'father_surname',
+    'mother': 'mother__member_id',
+    'mother_name': 'mother_name',
+    'mother_surname': 'mother_surname',
+    'grandfather_name': 'grandfather_name',
+    'married_to': 'married_to__member_id',
+    'married_to_name': 'married_to_name',
+    'married_to_surname': 'married_to_surname',
+    'second_spouse': 'second_spouse__member_id',
+    'second_spouse_name': 'second_spouse_name',
+    'second_spouse_surname': 'second_spouse_surname',
+    'adhar': 'adhar',
+    'phone': 'phone',
+    'whatsapp': 'whatsapp',
+    'isGuardian': 'isGuardian',
+    'general_body_member': 'general_body_member',
+    'firebase_id': 'firebase_id',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+}
+
+
+def select_columns(available, requested):
+    """
+    The columns to export: all of `available`, or the comma-separated
+    `requested` subset in the order given. Raises ValueError for unknown names.
+    """
+    if not requested:
+        return list(available)
+    columns = [c.strip() for c in requested.split(',') if c.strip()]
+    unknown = [c for c in columns if c not in available]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}")
+    return columns
+
+
+class _Echo:
+    """File-like object whose write() returns the line for the generator."""
+
+    def write(self, value):
+        return value
+
+
+def _ndjson_lines(rows, columns):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+def _csv_lines(rows, columns):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(['' if value is None else value for value in row])
+
+
+def stream(queryset, column_map, columns, output='ndjson', filename='export', chunk_size=CHUNK_SIZE):
+    """StreamingHttpResponse with `columns` of every row of `queryset`."""
+    if output not in OUTPUTS:
+        raise ValueError(f"output must be one of: {', '.join(OUTPUTS)}")
+    rows = queryset.values_list(*[column_map[c] for c in columns]).iterator(chunk_size=chunk_size)
+    if output == 'csv':
+        response = StreamingHttpResponse(_csv_lines(rows, columns), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}.csv"'
+    else:
+        response = StreamingHttpResponse(_ndjson_lines(rows, columns), content_type='application/x-ndjson')
+    return response
@@ -2,6 +2,7 @@ import firebase_admin
 from firebase_admin import credentials, firestore
 from django.conf import settings
 from .models import AppSettings, House
+from . import firestore_sync, outbox
 import json
 import logging
 
@@ -56,106 +57,32 @@ def get_firestore_db():
         return None
 
 def sync_house_to_firebase(house_instance):
-    db = get_firestore_db()
-    if not db:
-        return False, "Firebase DB not initialized"
-    
-    try:
-        # If we have a firebase_id, update that document
-        # If not, we might want to create one? Or wait for linking?
-        
-        if not house_instance.firebase_id:
-            # If no ID, we can't sync TO an existing document.
-            # We could create a new one, but that might duplicate if one exists but isn't linked.
-            return False, "No Linked Firebase ID"
-
-        doc_ref = db.collection('families').document(house_instance.firebase_id)
-        
-        # Prepare data
-        # Mapping Django House -> Firestore Family
-        data = {
-            'houseName': house_instance.house_name,
-            'familyName': house_instance.family_name,
-            'locationName': house_instance.location_name,
-            'address': house_instance.address,
-            # We don't overwrite members here usually, unless we want to do a full sync
-        }
-        
-        doc_ref.update(data)
-        return True, "Synced House"
-    except Exception as e:
-        return False, str(e)
+    """
+    Push the house to its family document: queued for the background sync
+    worker when it runs, written straight away otherwise (see firestore_sync.py).
+    """
+    return _sync_family_row(house_instance, "House")
 
 def sync_member_to_firebase(member_instance):
-    # This is trickier because members are inside the 'families' document array
+    """
+    Push the member to the guardian or its `members` element of the family
+    document: queued for the background sync worker when it runs, written
+    straight away otherwise.
+    """
+    return _sync_family_row(member_instance, "Member")
+
+def _sync_family_row(instance, label):
     db = get_firestore_db()
     if not db:
         return False, "Firebase DB not initialized"
-        
-    try:
-        house = member_instance.house
-        if not house or not house.firebase_id:
-            return False, "Member not assigned to a linked House"
-            
-        doc_ref = db.collection('families').document(house.firebase_id)
-        
-        # Transactional update is best here to avoid race conditions with array
-        # But for simplicity: read, modify, write
-        
-        doc = doc_ref.get()
-        if not doc.exists:
-            return False, "Firebase Document not found"
-            
-        doc_data = doc.to_dict()
-        guardian = doc_data.get('guardian', {})
-        members_list = doc_data.get('members', [])
-        
-        # Check if this member is the guardian
-        if member_instance.isGuardian:
-            # Update guardian fields
-            guardian.update({
-                'fullName': member_instance.name,
-                'surname': member_instance.surname,
-                'phone': member_instance.phone,
-                'dob': str(member_instance.date_of_birth),
-                # ... other fields
-            })
-            doc_ref.update({'guardian': guardian})
-        else:
-            # Update member in array
-            # We need to find the member in the array. 
-            # We assume 'name' matches? Or we need a stable ID in Firestore?
-            # Creating a map is better, but the structure is an array.
-            
-            # Strategy: Look for name+surname match?
-            found = False
-            for i, m in enumerate(members_list):
-                # Simple matching logic
-                if m.get('fullName') == member_instance.name and m.get('surname') == member_instance.surname:
-                    members_list[i].update({
-                        'dob': str(member_instance.date_of_birth),
-                        'phone': member_instance.phone,
-                        'isMarried': True if member_instance.married_to else False,
-                        # ...
-                    })
-                    found = True
-                    break
-            
-            if not found:
-                 # Add new?
-                 members_list.append({
-                     'fullName': member_instance.name,
-                     'surname': member_instance.surname,
-                     'dob': str(member_instance.date_of_birth),
-                     'role': 'member'
-                 })
-            
-            doc_ref.update({'members': members_list})
-            
-        return True, "Synced Member"
-        
-    except Exception as e:
-        return False, str(e)
+    if firestore_sync.running():
+        outbox.record(instance, outbox.UPDATE)
+        firestore_sync.wake()
+        return True, f"Queued {label} sync"
+    outcome, error = firestore_sync.FirestoreSyncWorker(client=db).sync_instance(db, instance)
+    if outcome != firestore_sync.SYNCED:
+        return False, error
+    return True, f"Synced {label}"
 
 def sync_area_to_firebase(area_instance):
     db = get_firestore_db()
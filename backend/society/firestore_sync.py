@@ -0,0 +1,479 @@
+"""
+Background push of house and member changes to their Firestore family
+documents.
+
+The worker drains House and Member entries from the outbox (outbox.py) off
+the request thread. It tracks what it has handled in the entries' own
+`firestore_handled_at` column, not `acked_at`, so /api/outbox/ consumers and
+the worker each see every change. Entries are grouped by family document, so
+each document is read once and written once per drain, however many of its
+members changed. Each write is a batch guarded by the document's update
+time, which turns a concurrent edit from the cloud side into a retry instead
+of a lost update. Writes are rate-limited, failed groups are retried with
+jittered exponential backoff, and every entry gets its outcome (synced,
+skipped or failed) recorded. Synced and skipped entries are marked handled.
+Failed ones stay pending for the next drain, up to `max_drains` drains; after
+that they are parked as handled with outcome failed and their last error, so
+a document that can never be written is not retried forever. A later change
+to the same row records a new entry, which is tried afresh.
+
+Elements of a family's `members` array carry a stable `memberId` (the
+member_id). A drain indexes the array once per document (member_positions),
+so each member is found without a name scan, and renames update the element
+in place instead of appending a duplicate. Firestore cannot update a single
+array element, though: arrayUnion/arrayRemove only add or remove whole equal
+values. So when any member of a family changes, the whole `members` array is
+still written, once per document per drain. The array shape is kept because
+the mobile app and the desktop client read and write it.
+
+Enabled by SOCIETY_FIRESTORE_SYNC_INTERVAL (off by default). Once enabled,
+every local edit of a house or member whose house is linked to a family
+document is pushed to Firestore, not only the ones synced from My Actions.
+Without the worker, sync_house_to_firebase and sync_member_to_firebase
+write their row straight away.
+
+The Firestore client is injectable (`FirestoreSyncWorker(client=...)`); by
+default it comes from firebase_service.get_firestore_db().
+"""
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import BooleanField, Case, F, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from .overdue import in_server_process
+
+logger = logging.getLogger(__name__)
+
+FAMILIES = 'families'
+SYNCED_MODELS = ('House', 'Member')
+SYNCED, SKIPPED, FAILED = 'synced', 'skipped', 'failed'
+
+
+class SyncSkipped(Exception):
+    """A change that cannot be written to Firestore; marked handled with the reason."""
+
+
+def enabled():
+    return bool(getattr(settings, 'SOCIETY_FIRESTORE_SYNC_INTERVAL', 0))
+
+
+def unhandled():
+    """Q for the outbox entries the worker has yet to sync."""
+    return Q(model__in=SYNCED_MODELS, firestore_handled_at__isnull=True)
+
+
+# SQLite uses the partial outbox_firestore_pending index only when the query
+# repeats its condition with the same literal values, not bound parameters
+_SYNCED_MODELS_SQL = RawSQL(
+    '"society_outboxentry"."model" IN (%s)' % ', '.join(f"'{m}'" for m in SYNCED_MODELS),
+    [], output_field=BooleanField())
+
+
+def pending(after=0, limit=500):
+    """Entries the worker has yet to sync with id > `after`, oldest first."""
+    from .models import OutboxEntry
+
+    return list(OutboxEntry.objects.filter(_SYNCED_MODELS_SQL, firestore_handled_at__isnull=True, id__gt=after)
+                .order_by('id')[:limit])
+
+
+# --- Family document fields ---
+
+def house_fields(house):
+    return {
+        'houseName': house.house_name,
+        'familyName': house.family_name,
+        'locationName': house.location_name,
+        'address': house.address,
+    }
+
+
+def guardian_fields(member):
+    return {
+        'memberId': member.member_id,
+        'fullName': member.name,
+        'surname': member.surname,
+        'phone': member.phone,
+        'dob': str(member.date_of_birth),
+    }
+
+
+def element_member_id(element):
+    """The member_id an array element is keyed by (`member_id` in older client uploads)."""
+    member_id = element.get('memberId') or element.get('member_id')
+    return str(member_id) if member_id else None
+
+
+def member_positions(members_list):
+    """{member_id: index} of the keyed elements of a `members` array."""
+    positions = {}
+    for index, element in enumerate(members_list):
+        member_id = element_member_id(element)
+        if member_id:
+            positions[member_id] = index
+    return positions
+
+
+def legacy_match(element, member):
+    """Whether an element without a memberId looks like `member`, by name."""
+    if element_member_id(element):
+        return False
+    if element.get('fullName') == member.name and element.get('surname') == member.surname:
+        return True
+    full_name = f"{member.name} {member.surname}".strip()
+    return full_name in (element.get('fullName'), element.get('name'))
+
+
+def apply_member(members_list, positions, member):
+    """
+    Update `member`'s element of the family `members` array, found through
+    `positions` (see member_positions), or append one. Elements written
+    before memberId existed are matched by name once and keyed from then on.
+    """
+    index = positions.get(member.member_id)
+    if index is None:
+        index = next((i for i, element in enumerate(members_list) if legacy_match(element, member)), None)
+    fields = {
+        'memberId': member.member_id,
+        'fullName': member.name,
+        'surname': member.surname,
+        'dob': str(member.date_of_birth),
+        'phone': member.phone,
+        'isMarried': bool(member.married_to_id),
+    }
+    if index is None:
+        members_list.append({**fields, 'role': 'member'})
+        index = len(members_list) - 1
+    else:
+        members_list[index].update(fields)
+    positions[member.member_id] = index
+
+
+def family_update(doc_data, house=None, members=()):
+    """
+    The field updates that bring a family document up to date. Member changes
+    are applied to a copy of the `members` array through one index of it, and
+    the whole array is returned as the update (Firestore has no per-element
+    array update).
+    """
+    updates = {}
+    if house is not None:
+        updates.update(house_fields(house))
+    if members:
+        guardian = dict(doc_data.get('guardian') or {})
+        members_list = [dict(element) for element in doc_data.get('members') or []]
+        positions = member_positions(members_list)
+        for member in members:
+            if member.isGuardian:
+                guardian.update(guardian_fields(member))
+            else:
+                apply_member(members_list, positions, member)
+        if guardian != (doc_data.get('guardian') or {}):
+            updates['guardian'] = guardian
+        if members_list != (doc_data.get('members') or []):
+            updates['members'] = members_list
+    return updates
+
+
+class FamilyGroup:
+    """The pending changes to one family document."""
+
+    def __init__(self, firebase_id):
+        self.firebase_id = firebase_id
+        self.house = None
+        self.members = {}  # member_id -> Member
+        self.entries = []
+
+
+# --- Worker ---
+
+class FirestoreSyncWorker:
+    """
+    Drains pending House and Member changes into Firestore; `drain()` runs
+    one pass, `start()` repeats it every `interval` seconds on a daemon thread.
+    """
+
+    def __init__(self, client=None, interval=60, rate=5, max_attempts=3, max_drains=10, base_delay=0.5,
+                 max_delay=30, sleep=time.sleep, clock=time.monotonic, jitter=random.uniform):
+        self.client = client
+        self.interval = interval
+        self.rate = rate  # document writes per second
+        self.max_attempts = max(1, max_attempts)  # writes per entry per drain
+        self.max_drains = max(1, max_drains)  # drains an entry may fail before it is parked
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.clock = clock
+        self.jitter = jitter
+        self._next_write = 0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+
+    # Draining
+
+    def drain(self, batch_size=500):
+        """Sync every pending entry once. Returns a Counter of entry outcomes."""
+        from .firebase_service import get_firestore_db
+
+        client = self.client or get_firestore_db()
+        outcomes = Counter()
+        if client is None:
+            return outcomes
+        after = 0
+        while True:
+            entries = pending(after, batch_size)
+            if not entries:
+                return outcomes
+            after = entries[-1].id
+            groups, skipped = self.group(entries)
+            for reason, reason_entries in skipped.items():
+                self.record(reason_entries, SKIPPED, reason)
+                outcomes[SKIPPED] += len(reason_entries)
+            for group in groups:
+                outcome, error = self.sync_group(client, group)
+                self.record(group.entries, outcome, error)
+                outcomes[outcome] += len(group.entries)
+
+    def group(self, entries):
+        """
+        Split `entries` into FamilyGroups by family document, loading the
+        houses and members with one query each. Returns (groups, {reason: entries}).
+        """
+        from .models import House, Member
+
+        ids = {model: {e.object_id for e in entries if e.model == model} for model in SYNCED_MODELS}
+        houses = {h.home_id: h for h in House.objects.filter(home_id__in=ids['House'])}
+        members = {
+            m.member_id: m
+            for m in Member.objects.filter(member_id__in=ids['Member']).select_related('house')
+        }
+
+        groups, skipped = {}, {}
+        for entry in entries:
+            if entry.model == 'House':
+                house = houses.get(entry.object_id)
+                if house is None:
+                    reason = "House no longer exists"
+                elif not house.firebase_id:
+                    reason = "No Linked Firebase ID"
+                else:
+                    reason = None
+                    family = groups.setdefault(house.firebase_id, FamilyGroup(house.firebase_id))
+                    family.house = house
+            else:
+                member = members.get(entry.object_id)
+                if member is None:
+                    reason = "Member no longer exists"
+                elif member.house is None or not member.house.firebase_id:
+                    reason = "Member not assigned to a linked House"
+                else:
+                    reason = None
+                    family = groups.setdefault(member.house.firebase_id, FamilyGroup(member.house.firebase_id))
+                    family.members[member.member_id] = member
+            if reason:
+                skipped.setdefault(reason, []).append(entry)
+            else:
+                family.entries.append(entry)
+        return list(groups.values()), skipped
+
+    def sync_instance(self, client, instance):
+        """Write one House or Member now, with retries. Returns (outcome, error message)."""
+        from .models import House
+
+        if isinstance(instance, House):
+            if not instance.firebase_id:
+                return SKIPPED, "No Linked Firebase ID"
+            group = FamilyGroup(instance.firebase_id)
+            group.house = instance
+        else:
+            house = instance.house
+            if house is None or not house.firebase_id:
+                return SKIPPED, "Member not assigned to a linked House"
+            group = FamilyGroup(house.firebase_id)
+            group.members[instance.member_id] = instance
+        return self.sync_group(client, group)
+
+    def sync_group(self, client, group):
+        """Write `group` with retries. Returns (outcome, error message)."""
+        try:
+            error = self.with_retries(lambda: self.write_group(client, group), group.firebase_id)
+        except SyncSkipped as e:
+            return SKIPPED, str(e)
+        return (FAILED, error) if error else (SYNCED, '')
+
+    def with_retries(self, write, firebase_id):
+        """
+        Call `write` until it succeeds or max_attempts is reached, backing off
+        between attempts. Returns None, or the last error message.
+        """
+        error = None
+        for attempt in range(self.max_attempts):
+            try:
+                write()
+                return None
+            except SyncSkipped:
+                raise
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                logger.warning("Firestore sync of family %s failed (attempt %d): %s",
+                               firebase_id, attempt + 1, error)
+                if attempt + 1 < self.max_attempts:
+                    self.sleep(self.jitter(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+        return error
+
+    def write_group(self, client, group):
+        """Read the family document, then write the group's changes as one batch."""
+        ref = client.collection(FAMILIES).document(group.firebase_id)
+        snapshot = ref.get()
+        if not snapshot.exists:
+            raise SyncSkipped("Firebase Document not found")
+        updates = family_update(snapshot.to_dict() or {}, group.house, list(group.members.values()))
+        if not updates:
+            return
+        self.throttle()
+        batch = client.batch()
+        # Fails if the document changed since it was read; the retry re-reads it
+        batch.update(ref, updates, option=client.write_option(last_update_time=snapshot.update_time))
+        batch.commit()
+
+    def backfill_member_ids(self, houses, dry_run=False):
+        """
+        Key the existing elements of the given houses' family documents with
+        their memberId. Returns a Counter of documents updated, elements
+        keyed, elements left unmatched, and documents missing or failed.
+        """
+        totals = Counter()
+        for house in houses:
+            counts = []
+            error = self.with_retries(lambda: counts.append(self.backfill_document(house, dry_run)),
+                                      house.firebase_id)
+            if error:
+                totals['failed'] += 1
+                logger.error("Backfilling memberIds of family %s failed: %s", house.firebase_id, error)
+            else:
+                totals.update(counts[-1])
+        return totals
+
+    def backfill_document(self, house, dry_run=False):
+        """Key one family document's elements, matching array elements to `house`'s members by name."""
+        counts = Counter()
+        ref = self.client.collection(FAMILIES).document(house.firebase_id)
+        snapshot = ref.get()
+        if not snapshot.exists:
+            counts['missing'] += 1
+            return counts
+        doc_data = snapshot.to_dict() or {}
+        members = list(house.members.all())
+        updates = {}
+
+        members_list = [dict(element) for element in doc_data.get('members') or []]
+        for element in members_list:
+            if element_member_id(element):
+                continue
+            member = next((m for m in members if legacy_match(element, m)), None)
+            if member is None:
+                counts['unmatched'] += 1
+            else:
+                element['memberId'] = member.member_id
+                counts['keyed'] += 1
+        if members_list != (doc_data.get('members') or []):
+            updates['members'] = members_list
+
+        # The guardian map belongs to the house's one guardian, whatever its name
+        guardian = doc_data.get('guardian') or {}
+        guardians = [m for m in members if m.isGuardian]
+        if guardian and not element_member_id(guardian) and len(guardians) == 1:
+            updates['guardian'] = {**guardian, 'memberId': guardians[0].member_id}
+            counts['keyed'] += 1
+
+        if updates:
+            counts['updated'] += 1
+            if not dry_run:
+                self.throttle()
+                batch = self.client.batch()
+                batch.update(ref, updates, option=self.client.write_option(last_update_time=snapshot.update_time))
+                batch.commit()
+        return counts
+
+    def throttle(self):
+        now = self.clock()
+        if self._next_write > now:
+            self.sleep(self._next_write - now)
+        self._next_write = max(now, self._next_write) + 1 / self.rate
+
+    def record(self, entries, outcome, error=''):
+        """
+        Store `outcome` on `entries`, marking them handled unless it failed.
+        Entries failing their `max_drains`th drain are parked as handled too.
+        """
+        from .models import OutboxEntry
+
+        now = timezone.now()
+        changes = dict(outcome=outcome, attempts=F('attempts') + 1, last_error=error)
+        if outcome != FAILED:
+            changes['firestore_handled_at'] = now
+        else:
+            # `attempts` is the count before this drain's increment
+            changes['firestore_handled_at'] = Case(
+                When(attempts__gte=self.max_drains - 1, then=Value(now)), default=Value(None))
+        # Entries re-recorded since they were read were replaced and are not matched
+        OutboxEntry.objects.filter(id__in=[e.id for e in entries], firestore_handled_at__isnull=True).update(**changes)
+
+    # Background thread
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='firestore-sync', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self):
+        """Drain now instead of at the end of the current interval."""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.clear()
+            close_old_connections()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Firestore sync failed")
+            finally:
+                close_old_connections()
+            self._wake.wait(self.interval)
+
+
+_worker = None
+
+
+def start_background_sync():
+    """Start the sync worker, in the server process only."""
+    global _worker
+    if not enabled() or _worker is not None or not in_server_process():
+        return None
+    _worker = FirestoreSyncWorker(interval=settings.SOCIETY_FIRESTORE_SYNC_INTERVAL,
+                                  rate=getattr(settings, 'SOCIETY_FIRESTORE_SYNC_RATE', 5),
+                                  max_drains=getattr(settings, 'SOCIETY_FIRESTORE_SYNC_MAX_DRAINS', 10))
+    _worker.start()
+    return _worker
+
+
+def running():
+    return _worker is not None
+
+
+def wake():
+    if _worker is not None:
+        _worker.wake()
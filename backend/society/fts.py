@@ -0,0 +1,189 @@
+"""
+SQLite FTS5 helpers for member and house text search.
+
+The `society_member_fts` and `society_house_fts` virtual tables are created by
+migration 0022 and kept in sync with their content tables by triggers. When the
+database is not SQLite or the SQLite build has no FTS5, the migration skips them
+and callers fall back to `icontains` filtering.
+
+SQLite rebuilds a table (dropping its triggers) whenever a migration alters it,
+so `repair_triggers` runs after every migrate to put missing triggers back
+and `fts_available` probes again.
+"""
+import re
+import logging
+
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+logger = logging.getLogger(__name__)
+
+MEMBER_FTS_TABLE = 'society_member_fts'
+HOUSE_FTS_TABLE = 'society_house_fts'
+
+MEMBER_FTS_COLUMNS = ('name', 'surname', 'father_name', 'mother_name', 'phone')
+HOUSE_FTS_COLUMNS = ('house_name', 'family_name', 'location_name')
+
+FTS_TABLES = [
+    (MEMBER_FTS_TABLE, 'society_member', MEMBER_FTS_COLUMNS),
+    (HOUSE_FTS_TABLE, 'society_house', HOUSE_FTS_COLUMNS),
+]
+
+_available = None  # cached probe result; reset by reset_availability()
+
+
+def table_sql(table, content_table, columns):
+    cols = ', '.join(columns)
+    return (
+        f"CREATE VIRTUAL TABLE {table} USING fts5({cols}, content='{content_table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+
+
+def trigger_sql(table, content_table, columns):
+    """Return {trigger name: CREATE TRIGGER statement} keeping `table` in sync."""
+    cols = ', '.join(columns)
+    new_cols = ', '.join(f'new.{c}' for c in columns)
+    old_cols = ', '.join(f'old.{c}' for c in columns)
+    insert_new = f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_cols});"
+    delete_old = f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols});"
+    return {
+        f'{table}_ai': f"CREATE TRIGGER {table}_ai AFTER INSERT ON {content_table} BEGIN {insert_new} END",
+        f'{table}_ad': f"CREATE TRIGGER {table}_ad AFTER DELETE ON {content_table} BEGIN {delete_old} END",
+        # Only re-index when an indexed column changes (not on sync_pending flips)
+        f'{table}_au': f"CREATE TRIGGER {table}_au AFTER UPDATE OF {cols} ON {content_table} "
+                       f"BEGIN {delete_old} {insert_new} END",
+    }
+
+
+def rebuild_sql(table):
+    return f"INSERT INTO {table}({table}) VALUES ('rebuild')"
+
+
+def repair_triggers(connection):
+    """
+    Recreate sync triggers missing from existing FTS tables and rebuild those
+    indexes, since rows written while the triggers were absent are not indexed.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+        existing = set(cursor.fetchall())
+        for table, content_table, columns in FTS_TABLES:
+            if ('table', table) not in existing:
+                continue
+            missing = {
+                name: sql for name, sql in trigger_sql(table, content_table, columns).items()
+                if ('trigger', name) not in existing
+            }
+            if not missing:
+                continue
+            logger.info("Recreating %d FTS trigger(s) for %s", len(missing), table)
+            for sql in missing.values():
+                cursor.execute(sql)
+            cursor.execute(rebuild_sql(table))
+
+
+def fts_available():
+    """
+    Return True if the FTS5 tables exist on the default database. The answer,
+    either way, is cached until the next migrate.
+    """
+    global _available
+    if _available is not None:
+        return _available
+    if connection.vendor != 'sqlite':
+        _available = False
+        return _available
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (%s, %s)",
+            [MEMBER_FTS_TABLE, HOUSE_FTS_TABLE],
+        )
+        _available = cursor.fetchone()[0] == 2
+    return _available
+
+
+def reset_availability():
+    """Forget the cached fts_available() result, e.g. after a migration."""
+    global _available
+    _available = None
+
+
+def match_expression(term, columns=None):
+    """
+    Build an FTS5 MATCH expression where every word of `term` must appear as a
+    token prefix, optionally restricted to `columns`. Returns '' for a term with
+    no searchable words.
+    """
+    tokens = re.findall(r'\w+', term or '', re.UNICODE)
+    if not tokens:
+        return ''
+    # Quoting each token keeps FTS5 operators (AND, NEAR, -, ...) literal
+    expression = ' '.join(f'"{token}"*' for token in tokens)
+    if columns:
+        return '{%s} : (%s)' % (' '.join(columns), expression)
+    return expression
+
+
+def _matching_rowids(table, expression):
+    return RawSQL(f'SELECT rowid FROM {table} WHERE {table} MATCH %s', [expression])
+
+
+def _rank(table, content_table, expression):
+    # bm25() is lower for better matches; rows matched some other way get NULL
+    return RawSQL(
+        f'SELECT bm25({table}) FROM {table} WHERE {table} MATCH %s AND rowid = {content_table}.id',
+        [expression],
+    )
+
+
+def search_members(queryset, term):
+    """
+    Filter a Member queryset to rows whose own text or house text matches `term`,
+    ordered by bm25 rank of the member columns.
+    """
+    expression = match_expression(term)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(
+        Q(id__in=_matching_rowids(MEMBER_FTS_TABLE, expression)) |
+        Q(house_id__in=_matching_rowids(HOUSE_FTS_TABLE, expression)) |
+        Q(member_id=term.strip())
+    ).annotate(
+        search_rank=_rank(MEMBER_FTS_TABLE, 'society_member', expression)
+    ).order_by(F('search_rank').asc(nulls_last=True), 'id')
+
+
+def search_houses(queryset, term):
+    """Filter a House queryset by `term`, ordered by bm25 rank."""
+    expression = match_expression(term)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(
+        Q(id__in=_matching_rowids(HOUSE_FTS_TABLE, expression)) |
+        Q(home_id=term.strip())
+    ).annotate(
+        search_rank=_rank(HOUSE_FTS_TABLE, 'society_house', expression)
+    ).order_by(F('search_rank').asc(nulls_last=True), 'id')
+
+
+def filter_member_columns(queryset, columns, term):
+    """Prefix-match `term` against specific member FTS columns."""
+    expression = match_expression(term, columns)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(id__in=_matching_rowids(MEMBER_FTS_TABLE, expression))
+
+
+def filter_house_columns(queryset, columns, term, relation='id'):
+    """
+    Prefix-match `term` against specific house FTS columns. `relation` is the
+    lookup holding the house pk, e.g. 'house_id' for a Member queryset.
+    """
+    expression = match_expression(term, columns)
+    if not expression:
+        return queryset.none()
+    return queryset.filter(**{f'{relation}__in': _matching_rowids(HOUSE_FTS_TABLE, expression)})
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from society.firebase_service import get_firestore_db
+from society.firestore_sync import FirestoreSyncWorker
+from society.models import House
+
+
+class Command(BaseCommand):
+    help = "Key the members of existing Firestore family documents with their memberId"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without writing")
+        parser.add_argument('--house', action='append', dest='houses', metavar='HOME_ID',
+                            help="Only this house (repeatable)")
+
+    def handle(self, *args, **options):
+        client = get_firestore_db()
+        if client is None:
+            raise CommandError("Firebase is not configured or not enabled")
+
+        houses = House.objects.exclude(firebase_id__isnull=True).exclude(firebase_id='')
+        if options['houses']:
+            houses = houses.filter(home_id__in=options['houses'])
+        houses = houses.prefetch_related('members').order_by('home_id')
+
+        totals = FirestoreSyncWorker(client=client).backfill_member_ids(houses, dry_run=options['dry_run'])
+        for name in ('keyed', 'unmatched', 'missing', 'failed'):
+            if totals[name]:
+                self.stdout.write(f"{name}: {totals[name]}")
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{totals['updated']} family document(s) would be updated"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Updated {totals['updated']} family document(s)"))
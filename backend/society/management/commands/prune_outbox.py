@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from society import firestore_sync, outbox
+
+
+class Command(BaseCommand):
+    help = "Delete outbox entries acknowledged more than --days days ago"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="Keep entries acknowledged within this many days")
+
+    def handle(self, *args, **options):
+        if options['days'] < 0:
+            raise CommandError("--days must not be negative")
+        # Entries the Firestore sync worker has yet to handle stay while it is enabled
+        keep = firestore_sync.unhandled() if firestore_sync.enabled() else None
+        deleted = outbox.prune(options['days'], keep=keep)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} acknowledged outbox entr{'y' if deleted == 1 else 'ies'}"))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from society import counters
+
+
+class Command(BaseCommand):
+    help = "Recount the materialized house/member/obligation counters and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without rewriting the counters")
+
+    def handle(self, *args, **options):
+        drift = counters.rebuild(dry_run=options['dry_run'])
+        for (kind, area_id, status), (stored, actual) in sorted(drift.items()):
+            self.stdout.write(f"{kind} area={area_id} status={status or '-'}: stored {stored}, actual {actual}")
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Counters are in sync"))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drift)} counter(s) drifted"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt counters; fixed {len(drift)} drifted counter(s)"))
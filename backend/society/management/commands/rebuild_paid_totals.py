@@ -0,0 +1,54 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, Sum
+
+from society.models import MemberObligation, Receipt
+
+CENTS = Decimal('0.01')
+
+
+class Command(BaseCommand):
+    help = "Recompute MemberObligation.paid_total/last_payment_at from receipts and repair any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without repairing it")
+
+    def handle(self, *args, **options):
+        receipts = {
+            row['obligation']: (row['total'], row['last'])
+            for row in Receipt.objects.order_by().values('obligation').annotate(
+                total=Sum('amount_paid'), last=Max('payment_date'))
+        }
+
+        drifted = []
+        for obligation in MemberObligation.objects.only(
+                'id', 'amount', 'paid_status', 'paid_total', 'last_payment_at').iterator(chunk_size=1000):
+            total, last = receipts.get(obligation.id, (0, None))
+            total = Decimal(total).quantize(CENTS)
+            changes = []
+            if obligation.paid_total != total:
+                changes.append(f"paid_total {obligation.paid_total} -> {total}")
+            if obligation.last_payment_at != last:
+                changes.append(f"last_payment_at {obligation.last_payment_at} -> {last}")
+            if changes:
+                self.stdout.write(f"obligation {obligation.id}: {', '.join(changes)}")
+                obligation.paid_total, obligation.last_payment_at = total, last
+                drifted.append(obligation)
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS("Paid totals are in sync"))
+            return
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{len(drifted)} obligation(s) drifted"))
+            return
+
+        with transaction.atomic():
+            MemberObligation.objects.bulk_update(drifted, ['paid_total', 'last_payment_at'], batch_size=500)
+            for obligation in drifted:
+                paid_status = obligation.status_for_paid_total(obligation.paid_total)
+                if paid_status != obligation.paid_status:
+                    obligation.paid_status = paid_status
+                    obligation.save(update_fields=['paid_status'])
+        self.stdout.write(self.style.SUCCESS(f"Repaired {len(drifted)} obligation(s)"))
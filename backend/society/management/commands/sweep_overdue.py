@@ -0,0 +1,33 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from society import overdue
+from society.models import SubCollection
+
+
+class Command(BaseCommand):
+    help = "Mark pending obligations whose subcollection's due date has passed as overdue"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would change without updating")
+        parser.add_argument('--date', help="Treat this day (YYYY-MM-DD) as today")
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            try:
+                today = datetime.date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("--date must be YYYY-MM-DD")
+
+        changed = overdue.sweep(today=today, dry_run=options['dry_run'])
+        names = {s.pk: s for s in SubCollection.objects.filter(pk__in=changed)}
+        for pk, count in changed.items():
+            self.stdout.write(f"{names[pk]}: {count} obligation(s)")
+
+        total = sum(changed.values())
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"{total} obligation(s) would be marked overdue"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Marked {total} obligation(s) overdue"))
@@ -0,0 +1,69 @@
+import logging
+
+from django.db import migrations
+from django.db.utils import OperationalError
+
+logger = logging.getLogger(__name__)
+
+
+def fts_table_sql(table, content_table, columns):
+    cols = ', '.join(columns)
+    new_cols = ', '.join(f'new.{c}' for c in columns)
+    old_cols = ', '.join(f'old.{c}' for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {table} USING fts5({cols}, content='{content_table}', content_rowid='id', "
+        f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+        f"CREATE TRIGGER {table}_ai AFTER INSERT ON {content_table} BEGIN "
+        f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"CREATE TRIGGER {table}_ad AFTER DELETE ON {content_table} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); END",
+        # Only re-index when an indexed column changes (not on sync_pending flips)
+        f"CREATE TRIGGER {table}_au AFTER UPDATE OF {cols} ON {content_table} BEGIN "
+        f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old_cols}); "
+        f"INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new_cols}); END",
+        f"INSERT INTO {table}({table}) VALUES ('rebuild')",
+    ]
+
+
+FTS_TABLES = [
+    ('society_member_fts', 'society_member', ('name', 'surname', 'father_name', 'mother_name', 'phone')),
+    ('society_house_fts', 'society_house', ('house_name', 'family_name', 'location_name')),
+]
+
+
+def create_fts_tables(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.society_fts5_probe USING fts5(x)")
+            cursor.execute("DROP TABLE temp.society_fts5_probe")
+        except OperationalError:
+            logger.warning("SQLite build has no FTS5; member/house search will use LIKE filtering")
+            return
+        for table, content_table, columns in FTS_TABLES:
+            for statement in fts_table_sql(table, content_table, columns):
+                cursor.execute(statement)
+
+
+def drop_fts_tables(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for table, _, _ in FTS_TABLES:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {table}_{suffix}")
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0021_receipt'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
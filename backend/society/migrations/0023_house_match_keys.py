@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0022_member_house_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='house',
+            name='family_name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='house',
+            name='house_name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='house',
+            name='name_signature',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=200),
+        ),
+        # The keys are filled in by 0024, which recomputes them under the
+        # transliteration rules it introduces
+    ]
@@ -0,0 +1,118 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:34
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+# The key functions as of this migration, copied from society.phonetic so that
+# later changes to the rules do not change what this backfill computes.
+CONSONANT_CLASSES = {
+    'b': 'p', 'f': 'p', 'p': 'p', 'v': 'p',
+    'c': 'k', 'g': 'k', 'j': 'k', 'k': 'k', 'q': 'k', 's': 'k', 'x': 'k', 'z': 'k',
+    'd': 't', 't': 't',
+    'l': 'l',
+    'm': 'm', 'n': 'm',
+    'r': 'r',
+}
+VOWELS = set('aeiouy')
+WORD_ALIASES = {
+    'md': 'muhammad', 'mhd': 'muhammad', 'mohd': 'muhammad', 'muhd': 'muhammad',
+    'mohmd': 'muhammad', 'mohamad': 'muhammad',
+}
+TRANSLITERATION_RULES = [
+    (re.compile(r'\b(abd)[aeiou]*([a-z])\s+\2'), r'\1\2'),
+    (re.compile(r'\babd[aeiou]*l?\s*'), 'abd'),
+    (re.compile(r'zh'), 'l'),
+    (re.compile(r'\bw'), 'v'),
+]
+
+
+def tokens(text):
+    text = unicodedata.normalize('NFKD', text or '')
+    text = text.encode('ascii', 'ignore').decode('ascii').lower()
+    text = ' '.join(WORD_ALIASES.get(word, word) for word in re.sub(r'[^a-z\s]', ' ', text).split())
+    for pattern, replacement in TRANSLITERATION_RULES:
+        text = pattern.sub(replacement, text)
+    return text.split()
+
+
+def token_key(token):
+    key = 'a' if token[0] in VOWELS else CONSONANT_CLASSES.get(token[0], token[0])
+    previous = key
+    for ch in token[1:]:
+        cls = CONSONANT_CLASSES.get(ch)
+        if cls is None:
+            if ch in VOWELS:
+                previous = ''
+            continue
+        if cls != previous:
+            key += cls
+        previous = cls
+    return key
+
+
+def phonetic_key(text):
+    return ''.join(token_key(t) for t in tokens(text))
+
+
+def token_signature(*texts):
+    keys = {token_key(t) for text in texts for t in tokens(text)}
+    keys.discard('')
+    return ' '.join(sorted(keys))
+
+
+def backfill_match_keys(apps, schema_editor):
+    # House keys are recomputed too: the transliteration rules changed them
+    House = apps.get_model('society', 'House')
+    Member = apps.get_model('society', 'Member')
+
+    batch = []
+    for house in House.objects.only('id', 'house_name', 'family_name').iterator(chunk_size=1000):
+        house.house_name_key = phonetic_key(house.house_name)[:100]
+        house.family_name_key = phonetic_key(house.family_name)[:100]
+        house.name_signature = token_signature(house.house_name, house.family_name)[:200]
+        batch.append(house)
+        if len(batch) >= 1000:
+            House.objects.bulk_update(batch, ['house_name_key', 'family_name_key', 'name_signature'])
+            batch = []
+    if batch:
+        House.objects.bulk_update(batch, ['house_name_key', 'family_name_key', 'name_signature'])
+
+    batch = []
+    for member in Member.objects.only('id', 'name', 'surname', 'father_name').iterator(chunk_size=1000):
+        member.name_key = phonetic_key(member.name)[:100]
+        member.surname_key = phonetic_key(member.surname)[:100]
+        member.father_name_key = phonetic_key(member.father_name)[:100]
+        batch.append(member)
+        if len(batch) >= 1000:
+            Member.objects.bulk_update(batch, ['name_key', 'surname_key', 'father_name_key'])
+            batch = []
+    if batch:
+        Member.objects.bulk_update(batch, ['name_key', 'surname_key', 'father_name_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0023_house_match_keys'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='member',
+            name='father_name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='name_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='member',
+            name='surname_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(backfill_match_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:45
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_counters(apps, schema_editor):
+    StatCounter = apps.get_model('society', 'StatCounter')
+    House = apps.get_model('society', 'House')
+    Member = apps.get_model('society', 'Member')
+    MemberObligation = apps.get_model('society', 'MemberObligation')
+
+    sources = [
+        ('house', House.objects.values('area_id').annotate(status=models.Value('')), 'area_id'),
+        ('member', Member.objects.values('house__area_id', 'status'), 'house__area_id'),
+        ('obligation', MemberObligation.objects.values('area_id', status=models.F('paid_status')), 'area_id'),
+    ]
+    counts = {}
+    for kind, rows, area_field in sources:
+        for row in rows.order_by().annotate(n=Count('pk')):
+            k = (kind, row[area_field] or 0, row['status'] or '')
+            counts[k] = counts.get(k, 0) + row['n']
+    StatCounter.objects.bulk_create([
+        StatCounter(kind=kind, area_id=area_id, status=status, count=n)
+        for (kind, area_id, status), n in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0025_idsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('house', 'House'), ('member', 'Member'), ('obligation', 'Obligation')], max_length=20)),
+                ('area_id', models.IntegerField(default=0)),
+                ('status', models.CharField(blank=True, max_length=20)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'unique_together': {('kind', 'area_id', 'status')},
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
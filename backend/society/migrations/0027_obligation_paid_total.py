@@ -0,0 +1,39 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:50
+
+from django.db import migrations, models
+from django.db.models import Max, Sum
+
+
+def backfill_paid_totals(apps, schema_editor):
+    MemberObligation = apps.get_model('society', 'MemberObligation')
+    Receipt = apps.get_model('society', 'Receipt')
+    totals = Receipt.objects.order_by().values('obligation').annotate(total=Sum('amount_paid'), last=Max('payment_date'))
+    batch = []
+    for row in totals.iterator(chunk_size=1000):
+        batch.append(MemberObligation(id=row['obligation'], paid_total=row['total'] or 0, last_payment_at=row['last']))
+        if len(batch) >= 1000:
+            MemberObligation.objects.bulk_update(batch, ['paid_total', 'last_payment_at'])
+            batch = []
+    if batch:
+        MemberObligation.objects.bulk_update(batch, ['paid_total', 'last_payment_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0026_statcounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memberobligation',
+            name='last_payment_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='memberobligation',
+            name='paid_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=10),
+        ),
+        migrations.RunPython(backfill_paid_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0027_obligation_paid_total'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='receipt',
+            name='payment_date',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:04
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def receipts_updated_at_payment_date(apps, schema_editor):
+    # Existing receipts were last written when they were paid
+    Receipt = apps.get_model('society', 'Receipt')
+    Receipt.objects.update(updated_at=F('payment_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0028_receipt_payment_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('object_id', models.CharField(max_length=50)),
+                ('deleted_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(receipts_updated_at_payment_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='area',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='house',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='member',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='memberobligation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0030_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='house',
+            index=models.Index(condition=models.Q(('sync_pending', True)), fields=['-updated_at', '-id'], name='house_sync_pending'),
+        ),
+        migrations.AddIndex(
+            model_name='member',
+            index=models.Index(condition=models.Q(('sync_pending', True)), fields=['-updated_at', '-id'], name='member_sync_pending'),
+        ),
+        migrations.AddIndex(
+            model_name='memberobligation',
+            index=models.Index(condition=models.Q(('sync_pending', True)), fields=['-updated_at', '-id'], name='obligation_sync_pending'),
+        ),
+    ]
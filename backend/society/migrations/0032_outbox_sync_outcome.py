@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0031_pending_sync_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxentry',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='outboxentry',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='outboxentry',
+            name='outcome',
+            field=models.CharField(blank=True, choices=[('synced', 'Synced'), ('skipped', 'Skipped'), ('failed', 'Failed')], max_length=10),
+        ),
+    ]
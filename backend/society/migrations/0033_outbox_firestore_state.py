@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:23
+
+from django.db import migrations, models
+
+
+def carry_over_worker_outcomes(apps, schema_editor):
+    # The worker used to record its handled entries in acked_at
+    OutboxEntry = apps.get_model('society', 'OutboxEntry')
+    OutboxEntry.objects.filter(outcome__in=['synced', 'skipped'], acked_at__isnull=False).update(
+        firestore_handled_at=models.F('acked_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0032_outbox_sync_outcome'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='outboxentry',
+            name='firestore_handled_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='outboxentry',
+            index=models.Index(condition=models.Q(('firestore_handled_at__isnull', True)), fields=['id'], name='outbox_firestore_pending'),
+        ),
+        migrations.RunPython(carry_over_worker_outcomes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('society', '0034_recompute_abd_match_keys'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='outboxentry',
+            name='outbox_firestore_pending',
+        ),
+        migrations.AddIndex(
+            model_name='outboxentry',
+            index=models.Index(condition=models.Q(('firestore_handled_at__isnull', True), ('model__in', ['House', 'Member'])), fields=['id'], name='outbox_firestore_pending'),
+        ),
+    ]
@@ -1,13 +1,27 @@
 from django.db import models, transaction
 from django.core.validators import RegexValidator
 from django.core.exceptions import ValidationError
-from django.db.models import Max
 import os
+from django.utils import timezone
 from django.dispatch import receiver
 from django.db.models.signals import post_delete, pre_save
+from .phonetic import phonetic_key, token_signature
+from .sequences import next_home_ids, next_member_ids, next_receipt_numbers
+from django.db.models.lookups import GreaterThan, GreaterThanOrEqual
+from . import counters, outbox
+from .outbox import OutboxTracked
 
 
-class Area(models.Model):
+class IdSequence(models.Model):
+    """Named counter backing generated IDs (home_id, member_id, receipt numbers)."""
+    name = models.CharField(max_length=50, unique=True)  # e.g. 'home_id', 'receipt:20250101'
+    last_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} = {self.last_value}"
+
+
+class Area(OutboxTracked, models.Model):
     id = models.AutoField(primary_key=True)  # Starts from 1 by default
     firebase_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)
     name = models.CharField(max_length=100, unique=True, db_index=True)  # Indexed for fast lookups
@@ -17,14 +31,14 @@ class Area(models.Model):
     sync_pending = models.BooleanField(default=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.name
 
 
 
-class House(models.Model):
+class House(OutboxTracked, models.Model):
     home_id = models.CharField(max_length=50, unique=True, db_index=True)  # Custom sequential ID, indexed
     firebase_id = models.CharField(max_length=100, blank=True, null=True, db_index=True)  # Link to Firestore document
     old_mahall_code = models.CharField(max_length=50, blank=True, null=True)  # Added old mahall code
@@ -34,29 +48,44 @@ class House(models.Model):
     locality = models.CharField(max_length=100, blank=True)  # Specific Area/Locality name (e.g. Ramanatukara)
     area = models.ForeignKey(Area, on_delete=models.CASCADE, related_name='houses', db_index=True)  # Indexed
     address = models.TextField()
+
+    # Precomputed phonetic blocking keys for duplicate detection (see phonetic.py)
+    house_name_key = models.CharField(max_length=100, blank=True, db_index=True, editable=False)
+    family_name_key = models.CharField(max_length=100, blank=True, db_index=True, editable=False)
+    name_signature = models.CharField(max_length=200, blank=True, db_index=True, editable=False)
     
     sync_pending = models.BooleanField(default=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.house_name} ({self.family_name})"
 
+    class Meta:
+        indexes = [
+            # Newest-first pages of pending syncs (see pending.py)
+            models.Index(fields=['-updated_at', '-id'], condition=models.Q(sync_pending=True),
+                         name='house_sync_pending'),
+        ]
+
+    def refresh_match_keys(self):
+        self.house_name_key = phonetic_key(self.house_name)[:100]
+        self.family_name_key = phonetic_key(self.family_name)[:100]
+        self.name_signature = token_signature(self.house_name, self.family_name)[:200]
+
     def save(self, *args, **kwargs):
+        self.refresh_match_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'house_name', 'family_name'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'house_name_key', 'family_name_key', 'name_signature'}
         if not self.home_id:
-            # Auto-generate sequential ID starting from '1001'
-            with transaction.atomic():
-                max_id = House.objects.aggregate(max_id=Max('home_id'))['max_id']
-                if max_id:
-                    next_id = str(int(max_id) + 1)
-                else:
-                    next_id = '1001'
-                self.home_id = next_id
+            # Auto-generate sequential ID starting from '1001' (see sequences.py)
+            self.home_id = next_home_ids(1)[0]
         super().save(*args, **kwargs)
 
 
-class Member(models.Model):
+class Member(OutboxTracked, models.Model):
     STATUS_CHOICES = [
         ('live', 'Live'),
         ('dead', 'Dead'),
@@ -103,30 +132,47 @@ class Member(models.Model):
     phone = models.CharField(max_length=15, null=True, blank=True)
     whatsapp = models.CharField(max_length=15, null=True, blank=True)
     isGuardian = models.BooleanField(default=False)
+
+    # Precomputed phonetic keys for fuzzy lookups (see phonetic.py)
+    name_key = models.CharField(max_length=100, blank=True, db_index=True, editable=False)
+    surname_key = models.CharField(max_length=100, blank=True, db_index=True, editable=False)
+    father_name_key = models.CharField(max_length=100, blank=True, db_index=True, editable=False)
     
     sync_pending = models.BooleanField(default=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.member_id} - {self.name}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['-updated_at', '-id'], condition=models.Q(sync_pending=True),
+                         name='member_sync_pending'),
+        ]
+
     def clean(self):
         if self.date_of_death and self.date_of_death < self.date_of_birth:
             raise ValidationError("Date of death cannot be before date of birth.")
 
+    MATCH_KEY_SOURCES = {'name': 'name_key', 'surname': 'surname_key', 'father_name': 'father_name_key'}
+
+    def refresh_match_keys(self):
+        for source, key_field in self.MATCH_KEY_SOURCES.items():
+            setattr(self, key_field, phonetic_key(getattr(self, source))[:100])
+
     def save(self, *args, **kwargs):
         is_new = self._state.adding
+        self.refresh_match_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            changed_sources = set(self.MATCH_KEY_SOURCES) & set(update_fields)
+            if changed_sources:
+                kwargs['update_fields'] = set(update_fields) | {self.MATCH_KEY_SOURCES[f] for f in changed_sources}
         if not self.member_id:
-            # Auto-generate sequential ID starting from '1001'
-            with transaction.atomic():
-                max_id = Member.objects.aggregate(max_id=Max('member_id'))['max_id']
-                if max_id:
-                    next_id = str(int(max_id) + 1)
-                else:
-                    next_id = '1001'
-                self.member_id = next_id
+            # Auto-generate sequential ID starting from '1001' (see sequences.py)
+            self.member_id = next_member_ids(1)[0]
         
         # Save first to ensure we have an ID (especially for new members)
         super().save(*args, **kwargs)
@@ -192,7 +238,7 @@ class SubCollection(models.Model):
         return f"{self.name} ({self.year})"
 
 
-class MemberObligation(models.Model):  # The through-table for member-subcollection relations
+class MemberObligation(OutboxTracked, models.Model):  # The through-table for member-subcollection relations
     PAID_STATUS_CHOICES = [
         ('pending', 'Pending'),
         ('paid', 'Paid'),
@@ -206,17 +252,23 @@ class MemberObligation(models.Model):  # The through-table for member-subcollect
     area = models.ForeignKey(Area, on_delete=models.SET_NULL, null=True, db_index=True)  # Denormalized for fast area queries
     amount = models.DecimalField(max_digits=10, decimal_places=2)  # Can override subcollection.amount
     paid_status = models.CharField(max_length=20, choices=PAID_STATUS_CHOICES, default='pending', db_index=True)  # Indexed for filters
+
+    # Running total of receipts, maintained by Receipt writes (see apply_payment)
+    paid_total = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False)
+    last_payment_at = models.DateTimeField(null=True, blank=True, editable=False)
     
     sync_pending = models.BooleanField(default=True, db_index=True)
 
     created_at = models.DateTimeField(auto_now_add=True)  # Full datetime; use .year for year-only
-    updated_at = models.DateTimeField(auto_now=True)  # Assuming "updatedId" means timestamp
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # Assuming "updatedId" means timestamp
 
     class Meta:
         unique_together = ('subcollection', 'member')  # No duplicate obligations
         indexes = [
             models.Index(fields=['subcollection', 'paid_status']),  # For quick unpaid lists per subcollection
             models.Index(fields=['member', 'subcollection']),  # For member-specific queries
+            models.Index(fields=['-updated_at', '-id'], condition=models.Q(sync_pending=True),
+                         name='obligation_sync_pending'),
         ]
 
     def save(self, *args, **kwargs):
@@ -240,8 +292,66 @@ class MemberObligation(models.Model):  # The through-table for member-subcollect
             pass
         super().save(*args, **kwargs)
 
-
-class Receipt(models.Model):
+    def status_for_paid_total(self, paid_total):
+        """Paid status implied by `paid_total`; unpaid rows keep pending/overdue."""
+        if paid_total >= self.amount:
+            return 'paid'
+        if paid_total > 0:
+            return 'partial'
+        return 'pending' if self.paid_status in ('paid', 'partial') else self.paid_status
+
+    def apply_payment(self, delta, paid_at=None):
+        """
+        Add `delta` (negative when a receipt is removed or reduced) to paid_total
+        and refresh the paid status in one F() update. `paid_at` is the new
+        receipt's date; without it last_payment_at is recomputed from receipts.
+        Does the work of the save signals itself (one outbox entry, the counter
+        move), so the row is written once. Call inside the receipt write's
+        transaction.
+        """
+        rows = MemberObligation.objects.filter(pk=self.pk)
+        if paid_at is not None:
+            last_payment_at = models.Case(
+                models.When(last_payment_at__gt=paid_at, then=models.F('last_payment_at')),
+                default=models.Value(paid_at),
+            )
+        else:
+            last_payment_at = models.Subquery(
+                Receipt.objects.filter(obligation=models.OuterRef('pk')).order_by('-payment_date').values('payment_date')[:1]
+            )
+        # status_for_paid_total, evaluated by the database
+        paid_total = models.F('paid_total') + delta
+        paid_status = models.Case(
+            models.When(GreaterThanOrEqual(paid_total, models.F('amount')), then=models.Value('paid')),
+            models.When(GreaterThan(paid_total, 0), then=models.Value('partial')),
+            models.When(paid_status__in=['paid', 'partial'], then=models.Value('pending')),
+            default=models.F('paid_status'),
+        )
+        rows.update(
+            paid_total=paid_total,
+            last_payment_at=last_payment_at,
+            paid_status=paid_status,
+            updated_at=timezone.now(),
+            sync_pending=True,
+        )
+        old_status = self.paid_status
+        self.paid_total, self.last_payment_at, self.paid_status = rows.values_list(
+            'paid_total', 'last_payment_at', 'paid_status').get()
+        self.sync_pending = True
+
+        fields = ['paid_total', 'last_payment_at']
+        if self.paid_status != old_status:
+            fields.append('paid_status')
+            counters.move(counters.key(counters.OBLIGATION, self.area_id, old_status),
+                          counters.key(counters.OBLIGATION, self.area_id, self.paid_status))
+            # A later save() reads the counter key back instead of using a stale snapshot
+            self.__dict__.pop('_counter_loaded', None)
+        outbox.record(self, outbox.UPDATE, fields)
+        self._outbox_loaded.update(paid_total=self.paid_total, last_payment_at=self.last_payment_at,
+                                   paid_status=self.paid_status)
+
+
+class Receipt(OutboxTracked, models.Model):
     PAYMENT_METHOD_CHOICES = [
         ('cash', 'Cash'),
         ('upi', 'UPI'),
@@ -254,37 +364,126 @@ class Receipt(models.Model):
     obligation = models.ForeignKey(MemberObligation, on_delete=models.CASCADE, related_name='receipts')
     receipt_number = models.CharField(max_length=50, unique=True, blank=True, null=True)
     amount_paid = models.DecimalField(max_digits=10, decimal_places=2)
-    payment_date = models.DateTimeField(auto_now_add=True)
+    payment_date = models.DateTimeField(auto_now_add=True, db_index=True)  # Indexed for newest-first cursor pages
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES, default='cash')
     remarks = models.TextField(blank=True, null=True)
     
     sync_pending = models.BooleanField(default=True, db_index=True)
 
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
     def __str__(self):
         return f"Receipt {self.receipt_number or self.id} - {self.obligation.member.name}"
 
     def save(self, *args, **kwargs):
         if not self.receipt_number:
-            # Auto-generate receipt number: R-YYYY-MM-DD-XXXX
-            from django.utils import timezone
-            import random
-            today = timezone.now().strftime('%Y%m%d')
-            random_suffix = ''.join([str(random.randint(0, 9)) for _ in range(4)])
-            self.receipt_number = f"R-{today}-{random_suffix}"
-            
-        super().save(*args, **kwargs)
-        
-        # After saving receipt, update the obligation status if needed
-        # (This is a simplified logic, could be more complex based on total paid vs obligation amount)
-        obligation = self.obligation
-        total_paid = obligation.receipts.aggregate(total=models.Sum('amount_paid'))['total'] or 0
-        
-        if total_paid >= obligation.amount:
-            obligation.paid_status = 'paid'
-        elif total_paid > 0:
-            obligation.paid_status = 'partial'
-        
-        obligation.save(update_fields=['paid_status'])
+            # Auto-generate receipt number: R-YYYYMMDD-NNNN, numbered per day
+            self.receipt_number = next_receipt_numbers(1)[0]
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {'amount_paid', 'obligation', 'obligation_id'} & set(update_fields):
+            super().save(*args, **kwargs)
+            return
+
+        with transaction.atomic(savepoint=False):
+            previous = None
+            if not self._state.adding:
+                previous = Receipt.objects.filter(pk=self.pk).values_list('obligation_id', 'amount_paid').first()
+            super().save(*args, **kwargs)
+
+            # Move the amount onto the obligation's running total (and status)
+            # instead of re-summing its receipts
+            delta = self.amount_paid
+            if previous and previous[0] == self.obligation_id:
+                delta -= previous[1]
+            elif previous:
+                MemberObligation.objects.get(pk=previous[0]).apply_payment(-previous[1])
+            if delta or not previous:
+                self.obligation.apply_payment(delta, paid_at=self.payment_date)
+
+
+class StatCounter(models.Model):
+    """
+    Materialized row counts per area and status, maintained by the handlers in
+    signals.py (see counters.py). `area_id` 0 holds rows without an area.
+    """
+    KIND_CHOICES = [
+        ('house', 'House'),
+        ('member', 'Member'),
+        ('obligation', 'Obligation'),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    area_id = models.IntegerField(default=0)  # Not a FK: counts outlive deleted areas until rebuilt
+    status = models.CharField(max_length=20, blank=True)  # Member status / obligation paid_status; '' for houses
+    count = models.BigIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('kind', 'area_id', 'status')
+
+    def __str__(self):
+        return f"{self.kind} area={self.area_id} {self.status}: {self.count}"
+
+
+class Tombstone(models.Model):
+    """
+    A deleted Area, House, Member, MemberObligation or Receipt, recorded by
+    the post_delete handlers in signals.py so /api/changes/ can report it.
+    `object_id` is the row's public id (home_id, member_id or pk).
+    """
+    model = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=50)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} deleted {self.deleted_at}"
+
+
+class OutboxEntry(models.Model):
+    """
+    One pending or acknowledged change for sync consumers; see outbox.py.
+    `object_id` is the row's public id (home_id, member_id or pk).
+    """
+    OPERATION_CHOICES = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    ]
+
+    model = models.CharField(max_length=50)
+    object_id = models.CharField(max_length=50)
+    operation = models.CharField(max_length=10, choices=OPERATION_CHOICES)
+    changed_fields = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    acked_at = models.DateTimeField(null=True, blank=True)
+
+    # The Firestore sync worker's own state (see firestore_sync.py), kept apart
+    # from acked_at so it and the /api/outbox/ consumers don't hide entries
+    # from each other. Set once the entry is synced or skipped.
+    firestore_handled_at = models.DateTimeField(null=True, blank=True)
+    OUTCOME_CHOICES = [
+        ('synced', 'Synced'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # Pending entries: the collapse lookup and the consumers' in-order reads
+            models.Index(fields=['model', 'object_id'], condition=models.Q(acked_at__isnull=True),
+                         name='outbox_pending_row'),
+            models.Index(fields=['id'], condition=models.Q(acked_at__isnull=True), name='outbox_pending'),
+            # The entries firestore_sync.pending() scans (its SYNCED_MODELS)
+            models.Index(fields=['id'], condition=models.Q(model__in=['House', 'Member'],
+                                                           firestore_handled_at__isnull=True),
+                         name='outbox_firestore_pending'),
+        ]
+
+    def __str__(self):
+        return f"#{self.id} {self.operation} {self.model} {self.object_id}"
 
 
 class Todo(models.Model):
@@ -409,15 +608,9 @@ def update_obligation_status_on_receipt_delete(sender, instance, **kwargs):
     """
     Recalculates and updates MemberObligation status when a Receipt is deleted.
     """
-    obligation = instance.obligation
-    total_paid = obligation.receipts.aggregate(total=models.Sum('amount_paid'))['total'] or 0
-    
-    if total_paid >= obligation.amount:
-        obligation.paid_status = 'paid'
-    elif total_paid > 0:
-        obligation.paid_status = 'partial'
-    else:
-        obligation.paid_status = 'pending'
-    
-    obligation.save(update_fields=['paid_status'])
+    # Receipts only cascade from their obligation, which is then being deleted too
+    origin = kwargs.get('origin')
+    if origin is not None and getattr(origin, 'model', type(origin)) is not Receipt:
+        return
+    instance.obligation.apply_payment(-instance.amount_paid)
 
@@ -0,0 +1,160 @@
+"""
+Transactional outbox of changes to areas, houses, members, obligations and
+receipts, for sync consumers.
+
+Every create, update and delete appends an OutboxEntry (model, public id,
+operation, changed fields) inside the transaction making the change. For
+single-row saves the post_save/post_delete handlers in signals.py write it,
+and the save itself is made atomic by OutboxTracked. The set-based writers
+(bulk.py, overdue.py, apply_payment) call `record_many` themselves.
+
+Repeated edits collapse: an unacknowledged entry for the same row is
+replaced by one new entry at the end of the log, carrying the merged
+operation and fields. A consumer that already read the old entry never
+misses the newer change. Consumers read pending entries in id order after a
+cursor (`pending`) and acknowledge id ranges (`acknowledge`). Acknowledged
+entries stay as history until `prune` (the prune_outbox command) deletes them.
+"""
+import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+
+# Bookkeeping columns that are not reported as changes
+IGNORED_FIELDS = frozenset({
+    'sync_pending', 'created_at', 'updated_at',
+    'name_key', 'surname_key', 'father_name_key',
+    'house_name_key', 'family_name_key', 'name_signature',
+})
+
+
+class OutboxTracked:
+    """Model mixin: save() runs in a transaction so its outbox entry commits with it."""
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+
+_tracked_fields = {}
+
+
+def tracked_fields(model):
+    """{attname: field name} of the columns whose changes are recorded."""
+    fields = _tracked_fields.get(model)
+    if fields is None:
+        fields = _tracked_fields[model] = {
+            f.attname: f.name for f in model._meta.concrete_fields
+            if not f.primary_key and f.name not in IGNORED_FIELDS
+        }
+    return fields
+
+
+def snapshot(instance):
+    """Loaded values of the tracked columns (deferred ones are left out)."""
+    values = instance.__dict__
+    return {attname: values[attname] for attname in tracked_fields(type(instance)) if attname in values}
+
+
+def changed_fields(instance, loaded, update_fields=None):
+    """
+    Names of the tracked fields (limited to `update_fields`, if given) whose
+    value on `instance` differs from `loaded`, or that were not loaded.
+    """
+    fields = tracked_fields(type(instance))
+    if update_fields is not None:
+        wanted = set(update_fields)
+        fields = {attname: name for attname, name in fields.items() if name in wanted or attname in wanted}
+    values = instance.__dict__
+    return sorted(
+        name for attname, name in fields.items()
+        if attname not in loaded or values.get(attname) != loaded[attname]
+    )
+
+
+def _merge(old_operation, old_fields, operation, fields):
+    if operation == DELETE:
+        return DELETE, []
+    if old_operation == CREATE or operation == CREATE:
+        operation = CREATE
+    return operation, sorted(set(old_fields) | set(fields))
+
+
+def record_many(model_name, object_ids, operation, fields=()):
+    """
+    Append one entry per public id in `object_ids` (collapsing into pending
+    entries for the same rows). Call inside the writing transaction.
+    """
+    from .models import OutboxEntry
+
+    object_ids = [str(i) for i in object_ids]
+    if not object_ids:
+        return
+    fields = sorted(fields) if operation != DELETE else []
+    with transaction.atomic(savepoint=False):
+        pending = {}
+        for start in range(0, len(object_ids), 500):
+            chunk = object_ids[start:start + 500]
+            for pk, object_id, old_operation, old_fields in OutboxEntry.objects.filter(
+                    model=model_name, object_id__in=chunk, acked_at__isnull=True,
+            ).values_list('pk', 'object_id', 'operation', 'changed_fields'):
+                pending[object_id] = (pk, old_operation, old_fields)
+        if pending:
+            OutboxEntry.objects.filter(pk__in=[pk for pk, _, _ in pending.values()]).delete()
+
+        entries = []
+        for object_id in dict.fromkeys(object_ids):
+            row_operation, row_fields = operation, fields
+            if object_id in pending:
+                _, old_operation, old_fields = pending[object_id]
+                row_operation, row_fields = _merge(old_operation, old_fields, operation, fields)
+            entries.append(OutboxEntry(model=model_name, object_id=object_id,
+                                       operation=row_operation, changed_fields=row_fields))
+        OutboxEntry.objects.bulk_create(entries, batch_size=500)
+
+
+def record(instance, operation, fields=()):
+    from .changes import feed_for
+
+    feed = feed_for(type(instance))
+    record_many(feed.model_name, [getattr(instance, feed.public_id)], operation, fields)
+
+
+def pending(after=0, limit=500):
+    """Unacknowledged entries with id > `after`, oldest first."""
+    from .models import OutboxEntry
+
+    return list(OutboxEntry.objects.filter(id__gt=after, acked_at__isnull=True).order_by('id')[:limit])
+
+
+def acknowledge(ranges):
+    """
+    Mark the entries in each inclusive (first_id, last_id) range as handled.
+    Returns the number of entries acknowledged.
+    """
+    from .models import OutboxEntry
+
+    now = timezone.now()
+    acked = 0
+    with transaction.atomic(savepoint=False):
+        for first, last in ranges:
+            acked += OutboxEntry.objects.filter(
+                id__gte=first, id__lte=last, acked_at__isnull=True).update(acked_at=now)
+    return acked
+
+
+def prune(days, keep=None):
+    """
+    Delete entries acknowledged more than `days` days ago, except those
+    matching the Q object `keep` (entries another consumer still needs).
+    """
+    from .models import OutboxEntry
+
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    entries = OutboxEntry.objects.filter(acked_at__lt=cutoff)
+    if keep is not None:
+        entries = entries.exclude(keep)
+    deleted, _ = entries.delete()
+    return deleted
@@ -0,0 +1,112 @@
+"""
+Moves pending obligations to `overdue` once their subcollection's due date
+has passed.
+
+`sweep()` issues one UPDATE per subcollection, served by the
+(subcollection, paid_status) index. The updated rows are flagged sync_pending
+with a fresh updated_at, and the StatCounter deltas and outbox entries are
+written in the same transaction, so sync and the dashboard pick the change up
+without per-row saves. It runs from the `sweep_overdue` command and, when
+SOCIETY_OVERDUE_SWEEP_INTERVAL is set, periodically inside the server process
+(see `start_periodic_sweep`).
+"""
+import logging
+import os
+import sys
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import counters, outbox
+
+logger = logging.getLogger(__name__)
+
+
+def due_subcollections(today=None):
+    """Subcollections past their due date that still have pending obligations."""
+    from .models import SubCollection
+
+    today = today or timezone.localdate()
+    return SubCollection.objects.filter(
+        due_date__lt=today, obligations__paid_status='pending').distinct().order_by('due_date', 'pk')
+
+
+def sweep(today=None, dry_run=False):
+    """
+    Mark pending obligations of overdue subcollections as overdue.
+    Returns {subcollection_id: number of obligations moved} (or that would be
+    moved, with `dry_run`).
+    """
+    from .models import MemberObligation
+
+    changed = {}
+    for subcollection in due_subcollections(today):
+        pending = MemberObligation.objects.filter(subcollection=subcollection, paid_status='pending')
+        if dry_run:
+            changed[subcollection.pk] = pending.count()
+            continue
+        with transaction.atomic():
+            ids = list(pending.select_for_update().values_list('pk', flat=True))
+            pending = MemberObligation.objects.filter(pk__in=ids)
+            deltas = counters.obligation_status_deltas(pending, 'overdue')
+            count = pending.update(paid_status='overdue', updated_at=timezone.now(), sync_pending=True)
+            counters.apply(deltas)
+            outbox.record_many('MemberObligation', ids, outbox.UPDATE, ['paid_status'])
+        if count:
+            changed[subcollection.pk] = count
+            logger.info("Marked %d obligation(s) of %s (due %s) overdue", count, subcollection, subcollection.due_date)
+    return changed
+
+
+class PeriodicSweeper:
+    """Runs `sweep()` every `interval` seconds on a daemon thread."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='overdue-sweeper', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                sweep()
+            except Exception:
+                logger.exception("Overdue sweep failed")
+            finally:
+                close_old_connections()
+            self._stop.wait(self.interval)
+
+
+_sweeper = None
+
+
+def in_server_process():
+    """
+    True in the process serving `runserver` (the Electron app's server).
+    False for management commands, tests and the autoreloader's parent.
+    """
+    if 'runserver' not in sys.argv:
+        return False
+    return '--noreload' in sys.argv or os.environ.get('RUN_MAIN') == 'true'
+
+
+def start_periodic_sweep():
+    """Start the in-process sweeper, in the server process only."""
+    global _sweeper
+    interval = getattr(settings, 'SOCIETY_OVERDUE_SWEEP_INTERVAL', 0)
+    if not interval or _sweeper is not None or not in_server_process():
+        return None
+    _sweeper = PeriodicSweeper(interval)
+    _sweeper.start()
+    return _sweeper
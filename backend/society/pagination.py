@@ -0,0 +1,81 @@
+"""
+Opt-in keyset (cursor) pagination for the large list endpoints.
+
+Page-number pagination runs a COUNT(*) over the filtered set and an OFFSET
+scan that grows with the page number. In cursor mode (`?pagination=cursor`,
+or any request carrying a `cursor`) a page is instead read with
+`WHERE key > last_key ORDER BY key LIMIT n` on an indexed key, so page 400
+costs the same as page 1. The total is only counted with `?count=1`.
+
+Cursor pages are always ordered by the view's key, not by search rank.
+"""
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+
+CURSOR_MODE = 'cursor'
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        body = {'next': self.get_next_link(), 'previous': self.get_previous_link()}
+        if self.count is not None:
+            body['count'] = self.count
+        body['results'] = data
+        return Response(body)
+
+
+def keyset_pagination(ordering):
+    """A KeysetPagination subclass ordered by `ordering` (an indexed field)."""
+    return type('KeysetPagination', (KeysetPagination,), {'ordering': ordering})
+
+
+class OptInKeysetPagination(BasePagination):
+    """
+    Uses `cursor_class` for requests asking for cursor mode and
+    `page_number_class` (None: unpaginated) otherwise, so existing clients are
+    unaffected. Results that are not querysets (e.g. ranked pk lists) keep
+    page-number pagination.
+    """
+    cursor_class = None
+    page_number_class = None
+
+    def __init__(self):
+        self.active = None
+
+    def wants_cursor(self, request):
+        params = request.query_params
+        return params.get('pagination') == CURSOR_MODE or self.cursor_class.cursor_query_param in params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.wants_cursor(request) and hasattr(queryset, 'query'):
+            self.active = self.cursor_class()
+        elif self.page_number_class is not None:
+            self.active = self.page_number_class()
+        else:
+            self.active = None
+            return None
+        return self.active.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return self.active.get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        return (self.page_number_class or self.cursor_class)().get_paginated_response_schema(schema)
+
+
+def opt_in_keyset(ordering, page_number_class=None):
+    return type('OptInKeysetPagination', (OptInKeysetPagination,), {
+        'cursor_class': keyset_pagination(ordering),
+        'page_number_class': page_number_class,
+    })
@@ -0,0 +1,149 @@
+"""
+Houses, members and obligations still flagged sync_pending, for the My
+Actions screen behind /api/pending-syncs/.
+
+The three tables are read as one list, newest first, a page at a time. Each
+page runs one keyset query per model on (updated_at, pk) descending, served
+by the partial sync_pending indexes, and merges the results. The cursor
+carries the last item's position, so later pages cost the same as the first.
+Items are acknowledged in bulk with one UPDATE per model and chunk of ids.
+"""
+import base64
+import binascii
+import heapq
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_LIMIT = 200
+MAX_LIMIT = 1000
+ACK_CHUNK_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class Source:
+    """One pending-sync table: its item prefix and how an item is described."""
+
+    def __init__(self, prefix, model_name, label, public_id, columns, describe):
+        self.prefix = prefix  # item ids are '<prefix>_<public id>'
+        self.model_name = model_name
+        self.label = label
+        self.public_id = public_id
+        self.columns = columns
+        self.describe = describe
+
+    @property
+    def model(self):
+        from django.apps import apps
+        return apps.get_model('society', self.model_name)
+
+
+# In tie-break order: at equal updated_at, houses come before members before obligations
+SOURCES = [
+    Source('house', 'House', 'House', 'home_id', ('home_id', 'house_name', 'family_name'),
+           lambda row: f"House pending sync: {row['house_name']} ({row['family_name']})"),
+    Source('member', 'Member', 'Member', 'member_id', ('member_id', 'name', 'surname'),
+           lambda row: f"Member pending sync: {row['name']} {row['surname']}"),
+    Source('obligation', 'MemberObligation', 'Obligation', 'id', ('subcollection__name', 'member__name'),
+           lambda row: "Obligation pending sync: {} for {}".format(
+               row['subcollection__name'] or "Unknown", row['member__name'] or "Unknown")),
+]
+SOURCES_BY_PREFIX = {source.prefix: source for source in SOURCES}
+
+
+# --- Cursors ---
+# [updated_at iso, source rank, pk] of the last item returned
+
+def encode_cursor(updated_at, rank, pk):
+    raw = json.dumps([updated_at.isoformat(), rank, pk], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        stamp, rank, pk = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        when = parse_datetime(stamp)
+        if when is None:
+            raise ValueError(stamp)
+        return when, int(rank), int(pk)
+    except (binascii.Error, ValueError, TypeError) as e:
+        raise InvalidCursor("Invalid or corrupt cursor") from e
+
+
+def _after(rank, position):
+    """Rows of source `rank` that sort after `position` in the merged order."""
+    when, last_rank, last_pk = position
+    if rank > last_rank:
+        return Q(updated_at__lte=when)
+    if rank < last_rank:
+        return Q(updated_at__lt=when)
+    return Q(updated_at__lt=when) | Q(updated_at=when, pk__lt=last_pk)
+
+
+# --- Reading ---
+
+def page(cursor=None, limit=DEFAULT_LIMIT):
+    """
+    Up to `limit` pending items after `cursor`, newest first.
+    Returns {'results', 'next'}; `next` is None on the last page.
+    """
+    position = decode_cursor(cursor)
+    streams = []
+    for rank, source in enumerate(SOURCES):
+        rows = source.model._base_manager.filter(sync_pending=True)
+        if position is not None:
+            rows = rows.filter(_after(rank, position))
+        rows = rows.order_by('-updated_at', '-pk').values('pk', 'updated_at', source.public_id, *source.columns)
+        streams.append([(row['updated_at'], rank, row['pk'], row) for row in rows[:limit + 1]])
+
+    # Newest first; at equal times by source rank, then newest pk
+    merged = list(heapq.merge(*streams, key=lambda item: (-item[0].timestamp(), item[1], -item[2])))
+    results = []
+    for updated_at, rank, pk, row in merged[:limit]:
+        source = SOURCES[rank]
+        object_id = row[source.public_id]
+        results.append({
+            'id': f"{source.prefix}_{object_id}",
+            'model_name': source.label,
+            'object_id': object_id,
+            'description': source.describe(row),
+            'is_sync_pending': True,
+            'action_type': 'UPDATE',
+            'timestamp': updated_at.isoformat(),
+        })
+    next_cursor = None
+    if len(merged) > limit:
+        updated_at, rank, pk, _ = merged[limit - 1]
+        next_cursor = encode_cursor(updated_at, rank, pk)
+    return {'results': results, 'next': next_cursor}
+
+
+# --- Acknowledging ---
+
+def parse_item_ids(item_ids):
+    """Group item ids like 'house_1001' into {Source: [public ids]}. Raises ValueError."""
+    grouped = {}
+    for item_id in item_ids:
+        prefix, _, object_id = str(item_id).partition('_')
+        source = SOURCES_BY_PREFIX.get(prefix)
+        if source is None or not object_id:
+            raise ValueError(f"Unknown pending sync item: {item_id}")
+        grouped.setdefault(source, []).append(object_id)
+    return grouped
+
+
+def acknowledge(item_ids):
+    """Clear sync_pending on the given items. Returns the number of rows cleared."""
+    cleared = 0
+    for source, object_ids in parse_item_ids(item_ids).items():
+        for start in range(0, len(object_ids), ACK_CHUNK_SIZE):
+            chunk = object_ids[start:start + ACK_CHUNK_SIZE]
+            cleared += source.model._base_manager.filter(
+                **{f'{source.public_id}__in': chunk}, sync_pending=True).update(sync_pending=False)
+    return cleared
@@ -0,0 +1,121 @@
+"""
+Phonetic keys used to block and pre-filter fuzzy name matching.
+
+A key keeps the first sound of each word and the consonant classes that
+follow it (Soundex-style), so spelling variants such as "Puthiya"/"Pudhiya"
+or "Veedu"/"Veed" collapse to the same or neighbouring keys. Keys are plain
+lower-case ASCII, so they can be stored in an indexed column and matched by
+equality or prefix range.
+
+Before keying, names are rewritten for the romanizations common in Malayalam
+and Arabic-origin names: abbreviations of Muhammad, the "Abdul"/"Abdu"/"Abdur"
+compounds, Malayalam "zh", and "w"/"v" at the start of a word. Together with the
+consonant classes this maps Muhammed/Mohammed/Muhammad/Mohd, Umer/Omer and
+Abdul Rahman/Abdurahman/Abdurrahman onto the same key.
+"""
+import re
+import unicodedata
+
+# Consonant classes: letters that are commonly swapped between romanizations
+# share a class letter. h, w and y carry no class and are dropped.
+CONSONANT_CLASSES = {
+    'b': 'p', 'f': 'p', 'p': 'p', 'v': 'p',
+    'c': 'k', 'g': 'k', 'j': 'k', 'k': 'k', 'q': 'k', 's': 'k', 'x': 'k', 'z': 'k',
+    'd': 't', 't': 't',
+    'l': 'l',
+    'm': 'm', 'n': 'm',
+    'r': 'r',
+}
+VOWELS = set('aeiouy')
+
+# Number of key characters that define a block; keys sharing this prefix are
+# compared against each other.
+BLOCK_PREFIX_LENGTH = 2
+
+
+# Whole-word abbreviations expanded before keying
+WORD_ALIASES = {
+    'md': 'muhammad', 'mhd': 'muhammad', 'mohd': 'muhammad', 'muhd': 'muhammad',
+    'mohmd': 'muhammad', 'mohamad': 'muhammad',
+}
+
+# Ordered (pattern, replacement) rewrites applied to the normalized text
+TRANSLITERATION_RULES = [
+    # Sun-letter assimilation written apart: "Abdur Rahman", "Abdus Salam".
+    # Not "l": "Abdul Latheef" is the plain article, left to the next rule.
+    (re.compile(r'\b(abd)[aeiou]*([a-km-z])\s+\2'), r'\1\2'),
+    # "Abdul Rahman", "Abdulrahman", "Abdu Rahman", "Abdurahman" -> "abdrahman"
+    (re.compile(r'\babd[aeiou]*l?\s*'), 'abd'),
+    # Malayalam retroflex "zh" is also written "l" (Kozhikode/Kolikode)
+    (re.compile(r'zh'), 'l'),
+    # Word-initial "w" is the same sound as "v" (Wahab/Vahab)
+    (re.compile(r'\bw'), 'v'),
+]
+
+
+def normalize(text):
+    """Lower-case, strip accents and punctuation, and collapse whitespace."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = text.encode('ascii', 'ignore').decode('ascii').lower()
+    text = re.sub(r'[^a-z\s]', ' ', text)
+    return ' '.join(text.split())
+
+
+def transliterate(text):
+    """Normalize `text` and rewrite the romanization variants listed above."""
+    words = [WORD_ALIASES.get(word, word) for word in normalize(text).split()]
+    text = ' '.join(words)
+    for pattern, replacement in TRANSLITERATION_RULES:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def token_key(token):
+    """Phonetic key of a single normalized word."""
+    if not token:
+        return ''
+    # Words starting with a vowel sound share one leading class ("Umer"/"Omer")
+    key = 'a' if token[0] in VOWELS else CONSONANT_CLASSES.get(token[0], token[0])
+    previous = key
+    for ch in token[1:]:
+        cls = CONSONANT_CLASSES.get(ch)
+        if cls is None:
+            # Vowels separate repeated classes, h/w/y do not
+            if ch in VOWELS:
+                previous = ''
+            continue
+        if cls != previous:
+            key += cls
+        previous = cls
+    return key
+
+
+def tokens(text):
+    return transliterate(text).split()
+
+
+def phonetic_key(text):
+    """Phonetic key of a whole name, words concatenated in order."""
+    return ''.join(token_key(t) for t in tokens(text))
+
+
+def token_signature(*texts):
+    """Sorted, de-duplicated word keys, so word order does not matter."""
+    keys = {token_key(t) for text in texts for t in tokens(text)}
+    keys.discard('')
+    return ' '.join(sorted(keys))
+
+
+def prefix_range(field, prefix):
+    """
+    Lookup kwargs selecting rows whose `field` starts with `prefix`. Expressed
+    as a range rather than LIKE so a plain index on the column is used on every
+    backend.
+    """
+    # '~' sorts after every character a key can contain
+    return {f'{field}__gte': prefix, f'{field}__lt': prefix + '~'}
+
+
+def block_range(field, key):
+    """Lookup kwargs selecting rows in the same block as `key`."""
+    return prefix_range(field, key[:BLOCK_PREFIX_LENGTH])
@@ -0,0 +1,118 @@
+"""
+SQL query accounting for requests and tests.
+
+`record_queries()` counts the statements run on a connection, their total time
+and how often each statement *shape* repeats. A shape (fingerprint) is the SQL
+with literals and parameter lists collapsed, so the same SELECT issued once per
+row of a page - the usual N+1 - shows up as one fingerprint with a high count.
+
+`QueryCountMiddleware` reports the same numbers for every request when
+`SOCIETY_QUERY_COUNT` is enabled, as X-Query-* response headers plus a `db`
+entry in Server-Timing, and logs requests that repeat a statement.
+"""
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections, DEFAULT_DB_ALIAS
+
+logger = logging.getLogger(__name__)
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER_LIST = re.compile(r'\(\s*(?:(?:\?|%s)\s*,\s*)+(?:\?|%s)\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalize `sql` so statements differing only in values compare equal."""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryStats:
+    """Statements recorded by `record_queries`."""
+
+    def __init__(self):
+        self.statements = []  # (sql, seconds)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    @property
+    def time(self):
+        """Total time spent in the database, in seconds."""
+        return sum(seconds for _, seconds in self.statements)
+
+    def fingerprints(self):
+        return Counter(fingerprint(sql) for sql, _ in self.statements)
+
+    def duplicates(self):
+        """{fingerprint: count} for statement shapes run more than once."""
+        return {fp: n for fp, n in self.fingerprints().items() if n > 1}
+
+    def summary(self):
+        lines = [f"{self.count} queries in {self.time * 1000:.1f} ms"]
+        for fp, n in sorted(self.duplicates().items(), key=lambda item: -item[1]):
+            lines.append(f"  {n}x {fp[:200]}")
+        return '\n'.join(lines)
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.statements.append((sql, time.perf_counter() - started))
+
+
+@contextmanager
+def record_queries(using=DEFAULT_DB_ALIAS):
+    """
+    Record every statement run on the `using` connection inside the block.
+
+        with record_queries() as stats:
+            client.get('/api/houses/')
+        assert stats.count <= 3, stats.summary()
+    """
+    stats = QueryStats()
+    with connections[using].execute_wrapper(stats):
+        yield stats
+
+
+class QueryCountMiddleware:
+    """
+    Per-request query accounting, enabled with the SOCIETY_QUERY_COUNT setting.
+    Requests repeating one statement shape SOCIETY_QUERY_COUNT_DUPLICATES times
+    or more are logged with their worst offenders.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'SOCIETY_QUERY_COUNT', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.duplicate_threshold = getattr(settings, 'SOCIETY_QUERY_COUNT_DUPLICATES', 5)
+
+    def __call__(self, request):
+        with record_queries() as stats:
+            response = self.get_response(request)
+
+        duplicates = stats.duplicates()
+        response['X-Query-Count'] = str(stats.count)
+        response['X-Query-Time'] = f'{stats.time * 1000:.1f}'
+        response['X-Query-Duplicates'] = str(sum(n - 1 for n in duplicates.values()))
+        timing = f'db;dur={stats.time * 1000:.1f}'
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+
+        if duplicates and max(duplicates.values()) >= self.duplicate_threshold:
+            logger.warning("%s %s repeated queries: %s", request.method, request.path, stats.summary())
+        return response
@@ -0,0 +1,354 @@
+"""
+Resident index for the member search endpoint (MemberViewSet.search).
+
+A search scores only candidate members, not every row. A candidate shares at
+least a third of the term's n-grams with its name, surname, member ID or house
+name, or a phonetic word key with its name or surname. Results are then ranked
+with the same score_member and threshold as the old full scan.
+
+This deviates from the full scan in one way. A term contained in a name,
+surname or member ID shares all of its inner n-grams, so strict matches are
+never pruned. A fuzzy match, on the other hand, can pass the score threshold
+while sharing few n-grams: LCS similarity puts no lower bound on trigram
+overlap. Such members can be missing from the results. The members returned
+keep the order the full scan gives them.
+"""
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from .phonetic import tokens, token_key
+from .scoring import Pattern
+
+logger = logging.getLogger(__name__)
+
+NGRAM_SIZE = 3
+
+
+def ngrams(text, n=NGRAM_SIZE):
+    """Return the set of padded, lower-cased character n-grams of `text`."""
+    text = (text or '').lower().strip()
+    if not text:
+        return set()
+    # Pad like pg_trgm so short strings and word starts still produce grams
+    padded = ' ' * (n - 1) + text + ' '
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def score_member(pattern, name, surname, house_name, member_id):
+    """
+    Score a member against a compiled search term (a scoring.Pattern).
+    Returns (score, is_strict_match). All text arguments must be lower-cased.
+    """
+    term_lower = pattern.term
+    score = 0
+
+    # Name (weight 3, plus a bonus when the term is contained)
+    if name:
+        score += pattern.ratio(name) * 3
+        if term_lower in name:
+            score += 0.5
+
+    # Surname
+    if surname:
+        score += pattern.ratio(surname)
+
+    # House Name
+    if house_name:
+        score += pattern.ratio(house_name)
+
+    # Member ID (Exact or approximate)
+    if member_id == term_lower:
+        score += 5  # Massive boost for ID match
+    elif term_lower in member_id:
+        score += 2
+
+    is_strict_match = (
+        term_lower in name or
+        term_lower in surname or
+        term_lower in member_id
+    )
+    return score, is_strict_match
+
+
+# Fields with per-field phonetic posting lists, used for multi-field lookups
+KEYED_FIELDS = ('name', 'surname', 'father', 'grandfather', 'spouse', 'house')
+
+
+class MemberSearchIndex:
+    """
+    Resident n-gram index over member name, surname, member_id and house name.
+
+    The index is loaded from the database on first use and then kept current by
+    the post_save/post_delete handlers in `society.signals`. A search only scores
+    members that share enough n-grams with the term, or a phonetic word key
+    (so "Mohd" still reaches "Muhammed"), instead of every row.
+
+    It also keeps phonetic word-key posting lists per field (name, surname,
+    father, grandfather, spouse and house name) for `candidates_for_fields`.
+    Father and spouse fall back to the linked member's name when the text field
+    is blank; that fallback is refreshed when the member itself is saved.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._reset()
+
+    def _reset(self):
+        # pk -> (member_id, name, surname, house_id, status), all text lower-cased
+        self.members = {}
+        # pk -> {field: word keys} for the member's own keyed fields
+        self.member_field_keys = {}
+        # house pk -> (house_name, area_id)
+        self.houses = {}
+        self.member_grams = defaultdict(set)
+        # field -> word key -> member pks ('house' maps to house pks)
+        self.field_keys = {field: defaultdict(set) for field in KEYED_FIELDS}
+        self.house_grams = defaultdict(set)
+        self.house_members = defaultdict(set)
+
+    @property
+    def is_built(self):
+        return self._built
+
+    def build(self):
+        """(Re)load the whole index from the database."""
+        from .models import Member, House
+
+        with self._lock:
+            self._reset()
+            for pk, house_name, area_id in House.objects.values_list('pk', 'house_name', 'area_id').iterator():
+                self._add_house(pk, house_name, area_id)
+            rows = list(Member.objects.values_list(
+                'pk', 'member_id', 'name', 'surname', 'house_id', 'status',
+                'father_name', 'father_id', 'grandfather_name', 'married_to_name', 'married_to_id',
+            ).iterator())
+            names = {row[0]: row[2] for row in rows}
+            for (pk, member_id, name, surname, house_id, status,
+                 father_name, father_id, grandfather_name, spouse_name, spouse_id) in rows:
+                relations = (
+                    father_name or names.get(father_id, ''),
+                    grandfather_name,
+                    spouse_name or names.get(spouse_id, ''),
+                )
+                self._add_member(pk, member_id, name, surname, house_id, status, relations)
+            self._built = True
+        logger.info("Member search index built: %d members, %d houses", len(self.members), len(self.houses))
+
+    def ensure_built(self):
+        if not self._built:
+            self.build()
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+            self._built = False
+
+    # --- Incremental maintenance ---
+
+    def _member_text_grams(self, member_id, name, surname):
+        return ngrams(name) | ngrams(surname) | ngrams(member_id)
+
+    @staticmethod
+    def _word_keys(text):
+        return {token_key(t) for t in tokens(text)} - {''}
+
+    def _add_member(self, pk, member_id, name, surname, house_id, status, relations=('', '', '')):
+        entry = (str(member_id or '').lower(), (name or '').lower(), (surname or '').lower(), house_id, status)
+        self.members[pk] = entry
+        for gram in self._member_text_grams(entry[0], entry[1], entry[2]):
+            self.member_grams[gram].add(pk)
+        field_keys = {}
+        for field, text in zip(('name', 'surname', 'father', 'grandfather', 'spouse'), (name, surname) + tuple(relations)):
+            field_keys[field] = self._word_keys(text)
+            for key in field_keys[field]:
+                self.field_keys[field][key].add(pk)
+        self.member_field_keys[pk] = field_keys
+        if house_id is not None:
+            self.house_members[house_id].add(pk)
+
+    def _remove_member(self, pk):
+        entry = self.members.pop(pk, None)
+        if entry is None:
+            return
+        for gram in self._member_text_grams(entry[0], entry[1], entry[2]):
+            postings = self.member_grams.get(gram)
+            if postings is not None:
+                postings.discard(pk)
+                if not postings:
+                    del self.member_grams[gram]
+        for field, keys in self.member_field_keys.pop(pk, {}).items():
+            for key in keys:
+                postings = self.field_keys[field].get(key)
+                if postings is not None:
+                    postings.discard(pk)
+                    if not postings:
+                        del self.field_keys[field][key]
+        if entry[3] is not None:
+            self.house_members[entry[3]].discard(pk)
+
+    def _add_house(self, pk, house_name, area_id):
+        house_name = (house_name or '').lower()
+        self.houses[pk] = (house_name, area_id)
+        for gram in ngrams(house_name):
+            self.house_grams[gram].add(pk)
+        for key in self._word_keys(house_name):
+            self.field_keys['house'][key].add(pk)
+
+    def _remove_house(self, pk):
+        entry = self.houses.pop(pk, None)
+        if entry is None:
+            return
+        for gram in ngrams(entry[0]):
+            postings = self.house_grams.get(gram)
+            if postings is not None:
+                postings.discard(pk)
+                if not postings:
+                    del self.house_grams[gram]
+        for key in self._word_keys(entry[0]):
+            postings = self.field_keys['house'].get(key)
+            if postings is not None:
+                postings.discard(pk)
+                if not postings:
+                    del self.field_keys['house'][key]
+
+    def update_member(self, member):
+        if not self._built:
+            return
+        with self._lock:
+            relations = (
+                member.father_name or self._member_name(member.father_id),
+                member.grandfather_name,
+                member.married_to_name or self._member_name(member.married_to_id),
+            )
+            self._remove_member(member.pk)
+            self._add_member(member.pk, member.member_id, member.name, member.surname,
+                             member.house_id, member.status, relations)
+
+    def _member_name(self, pk):
+        entry = self.members.get(pk)
+        return entry[1] if entry else ''
+
+    def remove_member(self, pk):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove_member(pk)
+
+    def update_house(self, house):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove_house(house.pk)
+            self._add_house(house.pk, house.house_name, house.area_id)
+
+    def remove_house(self, pk):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove_house(pk)
+            # Members keep their entries; the FK is SET_NULL and their own
+            # post_save is not fired, so detach them here.
+            for member_pk in self.house_members.pop(pk, set()):
+                entry = self.members.get(member_pk)
+                if entry is not None:
+                    self.members[member_pk] = entry[:3] + (None,) + entry[4:]
+
+    # --- Querying ---
+
+    def _candidates(self, term_lower):
+        """
+        Return member pks sharing enough n-grams or a word key with the term.
+        Terms shorter than the n-gram size cannot be matched by grams (a two
+        letter term may sit in the middle of a name), so every member is scored.
+        """
+        if len(term_lower) < NGRAM_SIZE:
+            return list(self.members)
+
+        term_grams = ngrams(term_lower)
+        overlap = Counter()
+        for gram in term_grams:
+            for pk in self.member_grams.get(gram, ()):
+                overlap[pk] += 1
+            for house_pk in self.house_grams.get(gram, ()):
+                for pk in self.house_members.get(house_pk, ()):
+                    overlap[pk] += 1
+
+        # A term contained in a field shares all of its inner grams, so this
+        # bound never drops strict matches while skipping one-letter overlaps.
+        min_overlap = max(1, len(term_grams) // 3)
+        candidates = {pk for pk, count in overlap.items() if count >= min_overlap}
+
+        # Romanization variants may share few grams but have the same word key
+        for key in self._word_keys(term_lower):
+            candidates |= self.field_keys['name'].get(key, set())
+            candidates |= self.field_keys['surname'].get(key, set())
+        return candidates
+
+    def _field_postings(self, field, term):
+        """Member pks whose `field` shares a word key with `term`."""
+        postings = set()
+        for key in self._word_keys(term):
+            if field == 'house':
+                for house_pk in self.field_keys['house'].get(key, ()):
+                    postings |= self.house_members.get(house_pk, set())
+            else:
+                postings |= self.field_keys[field].get(key, set())
+        return postings
+
+    def candidates_for_fields(self, terms, max_candidates):
+        """
+        Candidate generation for multi-field searches.
+
+        `terms` maps field names from KEYED_FIELDS to (term, weight). Each field's
+        posting list holds members sharing a phonetic word key with its term.
+        Members on every list (the intersection) come first, then those matching
+        the most weight, capped at `max_candidates`. Returns (pks, matched) where
+        `matched` is the number of members on any list before the cap.
+        """
+        self.ensure_built()
+        matched_weight = Counter()
+        with self._lock:
+            for field, (term, weight) in terms.items():
+                if not term:
+                    continue
+                for pk in self._field_postings(field, term):
+                    matched_weight[pk] += weight
+
+        # Highest matched weight first, ties in pk order
+        ranked = sorted(matched_weight.items(), key=lambda item: (-item[1], item[0]))
+        return [pk for pk, _ in ranked[:max_candidates]], len(ranked)
+
+    def search(self, term, area=None, status=None):
+        """
+        Return member pks matching `term`, best first.
+        `area` and `status` restrict results the same way the list filters do.
+        """
+        self.ensure_built()
+        term_lower = term.strip().lower()
+        if not term_lower:
+            return []
+
+        area = str(area) if area else None
+        pattern = Pattern(term_lower)
+        with self._lock:
+            scored = []
+            # Sorting candidates by pk keeps ties in database order
+            for pk in sorted(self._candidates(term_lower)):
+                member_id, name, surname, house_id, member_status = self.members[pk]
+                if status and member_status != status:
+                    continue
+                house_name, area_id = self.houses.get(house_id, ('', None))
+                if area and str(area_id) != area:
+                    continue
+
+                score, is_strict_match = score_member(pattern, name, surname, house_name, member_id)
+                if score > 1.5 or is_strict_match:
+                    scored.append((pk, score))
+
+        scored.sort(key=lambda x: x[1], reverse=True)
+        return [pk for pk, _ in scored]
+
+
+member_index = MemberSearchIndex()
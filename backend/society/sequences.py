@@ -0,0 +1,102 @@
+"""
+Concurrency-safe allocation of generated identifiers.
+
+Each kind of identifier has a row in `IdSequence`. Allocating bumps that row
+with a single `UPDATE ... SET last_value = last_value + n` and reads it back
+in the same transaction, so concurrent writers are serialized by the row (or
+SQLite database) write lock and never receive the same value. Reserving a
+block of n values costs the same as reserving one.
+
+A counter is seeded from the existing data the first time it is used, so
+databases created before the sequence table keep numbering where they were.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+FIRST_HOUSE_ID = 1001
+FIRST_MEMBER_ID = 1001
+RECEIPT_NUMBER_WIDTH = 4
+
+
+def allocate(name, count=1, seed=None):
+    """
+    Reserve `count` consecutive values from the sequence `name` and return the
+    first one. `seed` (a value or a callable) is the sequence's last value when
+    it does not exist yet; the first allocation then returns seed + 1.
+    """
+    from .models import IdSequence
+
+    if count < 1:
+        raise ValueError("count must be at least 1")
+
+    with transaction.atomic(savepoint=False):
+        updated = IdSequence.objects.filter(name=name).update(last_value=F('last_value') + count)
+        if not updated:
+            start = seed() if callable(seed) else (seed or 0)
+            try:
+                with transaction.atomic():
+                    IdSequence.objects.create(name=name, last_value=start + count)
+            except IntegrityError:
+                # Another writer created it first; take the next block from it
+                IdSequence.objects.filter(name=name).update(last_value=F('last_value') + count)
+        last_value = IdSequence.objects.filter(name=name).values_list('last_value', flat=True).get()
+    return last_value - count + 1
+
+
+def _max_numeric(queryset, field, prefix=''):
+    """Largest integer value of `field` (after `prefix`) among existing rows."""
+    values = queryset.values_list(field, flat=True)
+    if prefix:
+        values = values.filter(**{f'{field}__startswith': prefix})
+    numbers = [int(v[len(prefix):]) for v in values.iterator() if v and v[len(prefix):].isdigit()]
+    return max(numbers, default=0)
+
+
+def _allocate_unused(name, count, seed, model, field, format_value=str):
+    """
+    Allocate `count` formatted values, skipping any already present in `field`
+    (e.g. an ID typed in by hand or restored from an old backup).
+    """
+    values = []
+    while len(values) < count:
+        needed = count - len(values)
+        first = allocate(name, needed, seed)
+        batch = [format_value(n) for n in range(first, first + needed)]
+        taken = set(model.objects.filter(**{f'{field}__in': batch}).values_list(field, flat=True))
+        values.extend(v for v in batch if v not in taken)
+    return values
+
+
+def next_home_ids(count=1):
+    from .models import House
+
+    def seed():
+        return max(_max_numeric(House.objects.all(), 'home_id'), FIRST_HOUSE_ID - 1)
+
+    return _allocate_unused('home_id', count, seed, House, 'home_id')
+
+
+def next_member_ids(count=1):
+    from .models import Member
+
+    def seed():
+        return max(_max_numeric(Member.objects.all(), 'member_id'), FIRST_MEMBER_ID - 1)
+
+    return _allocate_unused('member_id', count, seed, Member, 'member_id')
+
+
+def next_receipt_numbers(count=1, when=None):
+    """Receipt numbers R-YYYYMMDD-NNNN, numbered from 1 each day."""
+    from .models import Receipt
+
+    day = (when or timezone.now()).strftime('%Y%m%d')
+    prefix = f"R-{day}-"
+
+    def seed():
+        return _max_numeric(Receipt.objects.all(), 'receipt_number', prefix)
+
+    return _allocate_unused(
+        f'receipt:{day}', count, seed, Receipt, 'receipt_number',
+        lambda n: f"{prefix}{n:0{RECEIPT_NUMBER_WIDTH}d}",
+    )
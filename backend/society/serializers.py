@@ -13,10 +13,15 @@ class AreaSerializer(serializers.ModelSerializer):
         fields = ['id', 'firebase_id', 'name', 'description', 'head_person', 'password', 'sync_pending', 'created_at', 'updated_at', 'total_houses', 'total_live_members']
     
     def get_total_houses(self, obj: Any) -> int:
+        # Annotated by AreaViewSet.get_queryset; query only for bare instances (e.g. after create)
+        if hasattr(obj, 'total_houses'):
+            return obj.total_houses
         return obj.houses.count()
     
     def get_total_live_members(self, obj: Any) -> int:
         # Count only live members in this area
+        if hasattr(obj, 'total_live_members'):
+            return obj.total_live_members
         return Member.objects.filter(house__area=obj, status='live').count()
 
 
@@ -44,7 +49,9 @@ class HouseListSerializer(serializers.ModelSerializer):
             return None
             
     def get_member_count(self, obj):
-        # Use the related manager to count members
+        # Annotated by HouseViewSet.get_queryset; fall back to the related manager
+        if hasattr(obj, 'member_count'):
+            return obj.member_count
         return obj.members.count()
 
 
@@ -239,6 +246,27 @@ class MemberObligationSerializer(serializers.ModelSerializer):
         return super().validate(data)
 
 
+class MemberObligationBulkRowSerializer(serializers.Serializer):
+    """
+    Field checks for one row of a bulk obligation create. References are left
+    as raw ids and resolved for the whole batch by society.bulk.
+    """
+    member = serializers.CharField()
+    subcollection = serializers.IntegerField()
+    area = serializers.IntegerField(required=False, allow_null=True)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    paid_status = serializers.ChoiceField(choices=MemberObligation.PAID_STATUS_CHOICES, required=False)
+
+
+class ReceiptBulkRowSerializer(serializers.Serializer):
+    """Field checks for one row of a bulk receipt create; see society.bulk."""
+    obligation = serializers.IntegerField()
+    amount_paid = serializers.DecimalField(max_digits=10, decimal_places=2)
+    payment_method = serializers.ChoiceField(choices=Receipt.PAYMENT_METHOD_CHOICES, required=False)
+    receipt_number = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
+    remarks = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+
 class MemberObligationDetailSerializer(serializers.ModelSerializer):
     """Serializer that includes full member details for listing"""
     
@@ -249,6 +277,9 @@ class MemberObligationDetailSerializer(serializers.ModelSerializer):
 
 
 class ReceiptSerializer(serializers.ModelSerializer):
+    # Loaded with the rows the response reads, rather than lazily after the save
+    obligation = serializers.PrimaryKeyRelatedField(
+        queryset=MemberObligation.objects.select_related('member', 'subcollection'))
     member_name = serializers.SerializerMethodField()
     obligation_amount = serializers.SerializerMethodField()
     subcollection_name = serializers.SerializerMethodField()
@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db import connections, transaction
+from collections import Counter
+from django.db.models.signals import post_init, post_save, post_delete, pre_save, pre_delete, post_migrate
 from django.dispatch import receiver
-from .models import House, Member, MemberObligation, Area
+from .models import House, Member, MemberObligation, Area, Receipt
 from .firebase_service import sync_area_to_firebase
+from .search_index import member_index
+from . import changes, counters, fts, outbox
 
 @receiver(pre_save, sender=House)
 @receiver(pre_save, sender=Member)
@@ -42,4 +46,261 @@ def set_house_sync_pending_on_obligation_delete(sender, instance, **kwargs):
         instance.member.house.save(update_fields=['sync_pending'])
 
 
+@receiver(post_save, sender=Member)
+def update_search_index_on_member_save(sender, instance, **kwargs):
+    """
+    Keep the in-memory member search index current once the write is committed.
+    """
+    transaction.on_commit(lambda: member_index.update_member(instance))
+
+
+@receiver(post_delete, sender=Member)
+def update_search_index_on_member_delete(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: member_index.remove_member(pk))
+
+
+@receiver(post_save, sender=House)
+def update_search_index_on_house_save(sender, instance, **kwargs):
+    transaction.on_commit(lambda: member_index.update_house(instance))
+
+
+@receiver(post_delete, sender=House)
+def update_search_index_on_house_delete(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: member_index.remove_house(pk))
+
+
+# --- Materialized counters (see counters.py) ---
+# The fields deciding a row's counter key are snapshotted when the instance is
+# loaded. pre_save compares them with the values being saved and, only when
+# they differ, records the old key in `_counter_old`; post_save then moves the
+# count to the new key. Saves that leave those fields alone cost no queries.
+
+COUNTER_FIELDS = {
+    House: ('area_id',),
+    Member: ('house_id', 'status'),
+    MemberObligation: ('area_id', 'paid_status'),
+}
+_DEFERRED = object()
+
+
+@receiver(post_init, sender=House)
+@receiver(post_init, sender=Member)
+@receiver(post_init, sender=MemberObligation)
+def snapshot_counter_fields(sender, instance, **kwargs):
+    instance._counter_loaded = tuple(instance.__dict__.get(f, _DEFERRED) for f in COUNTER_FIELDS[sender])
+
+
+def _counter_changes(sender, instance, update_fields):
+    """
+    Return the loaded values of the counter fields if the save changes them,
+    else None. Instances loaded with those fields deferred are read back.
+    """
+    instance.__dict__.pop('_counter_old', None)
+    fields = COUNTER_FIELDS[sender]
+    if update_fields is not None and not {f[:-3] if f.endswith('_id') else f for f in fields} & {
+            f[:-3] if f.endswith('_id') else f for f in update_fields}:
+        return None
+    loaded = getattr(instance, '_counter_loaded', None)
+    if loaded is None or _DEFERRED in loaded:
+        loaded = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+        if loaded is None:
+            return None
+    current = tuple(getattr(instance, f) for f in fields)
+    return loaded if tuple(loaded) != current else None
+
+
+def _house_area(house_id):
+    if house_id is None:
+        return None
+    return House.objects.filter(pk=house_id).values_list('area_id', flat=True).first()
+
+
+def _member_area(member):
+    if member.house_id is not None and Member._meta.get_field('house').is_cached(member):
+        return member.house.area_id
+    return _house_area(member.house_id)
+
+
+@receiver(pre_save, sender=House)
+def remember_house_counter_key(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding:
+        instance.__dict__.pop('_counter_old', None)
+        return
+    loaded = _counter_changes(sender, instance, update_fields)
+    if loaded is not None:
+        instance._counter_old = loaded[0]
+
+
+@receiver(post_save, sender=House)
+def update_counters_on_house_save(sender, instance, created, **kwargs):
+    old_area = instance.__dict__.pop('_counter_old', _DEFERRED)
+    snapshot_counter_fields(sender, instance)
+    if created:
+        counters.move(None, counters.key(counters.HOUSE, instance.area_id))
+        return
+    if old_area is _DEFERRED:
+        return
+    # The house's members move with it
+    deltas = Counter({
+        counters.key(counters.HOUSE, old_area): -1,
+        counters.key(counters.HOUSE, instance.area_id): 1,
+    })
+    for (kind, area_id, status), n in counters.member_counts(instance.members.all()).items():
+        deltas[counters.key(kind, old_area, status)] -= n
+        deltas[(kind, area_id, status)] += n
+    counters.apply(deltas)
+
+
+@receiver(pre_delete, sender=House)
+def update_member_counters_on_house_delete(sender, instance, **kwargs):
+    # Member.house is SET_NULL, so the house's members lose their area
+    deltas = Counter()
+    for (kind, area_id, status), n in counters.member_counts(instance.members.all()).items():
+        deltas[(kind, area_id, status)] -= n
+        deltas[counters.key(kind, None, status)] += n
+    counters.apply(deltas)
+
+
+@receiver(post_delete, sender=House)
+def update_counters_on_house_delete(sender, instance, **kwargs):
+    counters.move(counters.key(counters.HOUSE, instance.area_id), None)
+
+
+@receiver(pre_save, sender=Member)
+def remember_member_counter_key(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding:
+        instance.__dict__.pop('_counter_old', None)
+        return
+    loaded = _counter_changes(sender, instance, update_fields)
+    if loaded is not None:
+        house_id, status = loaded
+        area_id = _member_area(instance) if house_id == instance.house_id else _house_area(house_id)
+        instance._counter_old = counters.key(counters.MEMBER, area_id, status)
 
+
+@receiver(post_save, sender=Member)
+def update_counters_on_member_save(sender, instance, created, **kwargs):
+    old = instance.__dict__.pop('_counter_old', _DEFERRED)
+    snapshot_counter_fields(sender, instance)
+    if created:
+        old = None
+    elif old is _DEFERRED:
+        return
+    new = counters.key(counters.MEMBER, _member_area(instance), instance.status)
+    if old != new:
+        counters.move(old, new)
+
+
+@receiver(post_delete, sender=Member)
+def update_counters_on_member_delete(sender, instance, **kwargs):
+    counters.move(counters.key(counters.MEMBER, _member_area(instance), instance.status), None)
+
+
+@receiver(pre_save, sender=MemberObligation)
+def remember_obligation_counter_key(sender, instance, update_fields=None, **kwargs):
+    if instance._state.adding:
+        instance.__dict__.pop('_counter_old', None)
+        return
+    loaded = _counter_changes(sender, instance, update_fields)
+    if loaded is not None:
+        instance._counter_old = counters.key(counters.OBLIGATION, *loaded)
+
+
+@receiver(post_save, sender=MemberObligation)
+def update_counters_on_obligation_save(sender, instance, created, **kwargs):
+    old = instance.__dict__.pop('_counter_old', _DEFERRED)
+    snapshot_counter_fields(sender, instance)
+    if created:
+        old = None
+    elif old is _DEFERRED:
+        return
+    new = counters.key(counters.OBLIGATION, instance.area_id, instance.paid_status)
+    if old != new:
+        counters.move(old, new)
+
+
+@receiver(post_delete, sender=MemberObligation)
+def update_counters_on_obligation_delete(sender, instance, **kwargs):
+    counters.move(counters.key(counters.OBLIGATION, instance.area_id, instance.paid_status), None)
+
+
+@receiver(pre_delete, sender=Area)
+def update_obligation_counters_on_area_delete(sender, instance, **kwargs):
+    # MemberObligation.area is SET_NULL; houses (and their counts) cascade
+    deltas = Counter()
+    for (kind, area_id, status), n in counters.obligation_counts(instance.memberobligation_set.all()).items():
+        deltas[(kind, area_id, status)] -= n
+        deltas[counters.key(kind, None, status)] += n
+    counters.apply(deltas)
+
+
+# Change feed (/api/changes/, see changes.py): deletions leave a tombstone,
+# and rows whose foreign key a delete sets to NULL get a fresh updated_at.
+
+@receiver(pre_delete, sender=Area)
+@receiver(pre_delete, sender=House)
+@receiver(pre_delete, sender=Member)
+def touch_rows_losing_a_reference(sender, instance, **kwargs):
+    changes.touch_set_null_referrers(instance)
+
+
+@receiver(post_delete, sender=Area)
+@receiver(post_delete, sender=House)
+@receiver(post_delete, sender=Member)
+@receiver(post_delete, sender=MemberObligation)
+@receiver(post_delete, sender=Receipt)
+def record_tombstone(sender, instance, **kwargs):
+    changes.record_deletion(instance)
+
+
+# Outbox (see outbox.py): each create/update/delete appends an entry in the
+# same transaction. Loaded values are snapshotted to tell which fields a save
+# changes; saves that only touch bookkeeping columns record nothing.
+
+@receiver(post_init, sender=Area)
+@receiver(post_init, sender=House)
+@receiver(post_init, sender=Member)
+@receiver(post_init, sender=MemberObligation)
+@receiver(post_init, sender=Receipt)
+def snapshot_outbox_fields(sender, instance, **kwargs):
+    # _state.adding is still True here for rows loaded by from_db(), so always
+    # snapshot; post_save reports created rows separately
+    instance._outbox_loaded = outbox.snapshot(instance)
+
+
+@receiver(post_save, sender=Area)
+@receiver(post_save, sender=House)
+@receiver(post_save, sender=Member)
+@receiver(post_save, sender=MemberObligation)
+@receiver(post_save, sender=Receipt)
+def record_outbox_save(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        outbox.record(instance, outbox.CREATE, outbox.tracked_fields(sender).values())
+    else:
+        fields = outbox.changed_fields(instance, getattr(instance, '_outbox_loaded', {}), update_fields)
+        if fields:
+            outbox.record(instance, outbox.UPDATE, fields)
+    instance._outbox_loaded = outbox.snapshot(instance)
+
+
+@receiver(post_delete, sender=Area)
+@receiver(post_delete, sender=House)
+@receiver(post_delete, sender=Member)
+@receiver(post_delete, sender=MemberObligation)
+@receiver(post_delete, sender=Receipt)
+def record_outbox_delete(sender, instance, **kwargs):
+    outbox.record(instance, outbox.DELETE)
+
+
+@receiver(post_migrate)
+def repair_fts_triggers_after_migrate(sender, using, **kwargs):
+    """
+    SQLite drops a table's triggers when a migration rebuilds it, which would
+    silently stop the FTS tables from following member/house writes.
+    """
+    if sender.name == 'society':
+        fts.repair_triggers(connections[using])
+        # The migration may have created or dropped the FTS tables
+        fts.reset_availability()
@@ -1,3 +1,1628 @@
-from django.test import TestCase
+import datetime
+import json
+import re
 
-# Create your tests here.
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import counters, firestore_sync, fts, outbox, overdue, pending, phonetic, sequences
+from .models import Area, Collection, House, Member, MemberObligation, OutboxEntry, Receipt, SubCollection
+from .querycount import fingerprint, record_queries
+from .scoring import Pattern, WeightedScorer
+from .search_index import MemberSearchIndex, member_index, score_member
+
+
+def make_member(house, name, surname='', **kwargs):
+    kwargs.setdefault('date_of_birth', datetime.date(1990, 1, 1))
+    return Member.objects.create(house=house, name=name, surname=surname, **kwargs)
+
+
+class MemberSearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.area = Area.objects.create(name='North')
+        cls.other_area = Area.objects.create(name='South')
+        cls.house = House.objects.create(house_name='Puthiya Veedu', family_name='Karuvanthodi',
+                                         location_name='Town', area=cls.area, address='')
+        cls.other_house = House.objects.create(house_name='Thazhe Veedu', family_name='Kunnath',
+                                               location_name='Town', area=cls.other_area, address='')
+        for name, surname in [('Mohammed Ali', 'K'), ('Muhammad', 'P'), ('Umer', 'T'), ('Omer', ''),
+                              ('Abdul Rahman', 'V'), ('Abdurahman', ''), ('Fathima', 'K'), ('Ayisha', 'M')]:
+            make_member(cls.house, name, surname)
+        for name in ['Muhammed Shafi', 'Zainaba', 'Ali']:
+            make_member(cls.other_house, name, status='dead')
+
+    def setUp(self):
+        self.index = MemberSearchIndex()
+        self.index.build()
+
+    def brute_force(self, term, area=None, status=None):
+        """The scan MemberViewSet.search used before the index existed."""
+        qs = Member.objects.select_related('house').order_by('pk')
+        if area:
+            qs = qs.filter(house__area=area)
+        if status:
+            qs = qs.filter(status=status)
+        term_lower = term.lower()
+        results = []
+        for m in qs:
+            score, strict = score_member(Pattern(term_lower), m.name.lower(), m.surname.lower(),
+                                         m.house.house_name.lower() if m.house else '', m.member_id.lower())
+            if score > 1.5 or strict:
+                results.append((m.pk, score))
+        results.sort(key=lambda x: x[1], reverse=True)
+        return [pk for pk, _ in results]
+
+    def test_ranking_matches_full_scan(self):
+        for term in ['muhammed', 'omer', 'abdurahman', 'veedu', 'ali', 'fa', '1003']:
+            with self.subTest(term=term):
+                indexed = self.index.search(term)
+                full = self.brute_force(term)
+                self.assertTrue(indexed)
+                # Same order as the full scan; only fuzzy (non-strict) matches
+                # sharing few n-grams may be pruned, see search_index
+                self.assertEqual(indexed, [pk for pk in full if pk in set(indexed)])
+                pruned = Member.objects.filter(pk__in=set(full) - set(indexed))
+                for member in pruned:
+                    self.assertFalse(any(term in field.lower() for field in (member.name, member.surname, member.member_id)))
+
+    def test_filters(self):
+        self.assertEqual(self.index.search('muhammed', area=self.other_area.pk),
+                         self.brute_force('muhammed', area=self.other_area.pk))
+        self.assertEqual(self.index.search('ali', status='live'), self.brute_force('ali', status='live'))
+
+    def test_incremental_updates(self):
+        member = make_member(self.house, 'Sainudheen')
+        self.index.update_member(member)
+        self.assertEqual(self.index.search('sainudheen')[0], member.pk)
+
+        member.name = 'Zainudheen'
+        self.index.update_member(member)
+        self.assertEqual(self.index.search('zainudheen')[0], member.pk)
+
+        self.index.remove_member(member.pk)
+        self.assertNotIn(member.pk, self.index.search('zainudheen'))
+
+    def test_house_rename_updates_member_candidates(self):
+        self.house.house_name = 'Kizhakkethil'
+        self.house.save()
+        self.index.update_house(self.house)
+        self.assertEqual(self.index.search('kizhakkethil'), self.brute_force('kizhakkethil'))
+        self.assertNotIn('put', self.index.house_grams)
+
+
+class FtsSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        area = Area.objects.create(name='North')
+        cls.house = House.objects.create(house_name='Puthiya Veedu', family_name='Karuvanthodi',
+                                         location_name='Chemmad', area=area, address='')
+        cls.other_house = House.objects.create(house_name='Kizhakkethil', family_name='Kunnath',
+                                               location_name='Tirur', area=area, address='')
+        cls.ali = make_member(cls.house, 'Mohammed Ali', 'K', father_name='Abdul Rahman', phone='9847012345')
+        cls.fathima = make_member(cls.other_house, 'Fathima', 'P', father_name='Mohammed')
+
+    def setUp(self):
+        if not fts.fts_available():
+            self.skipTest('SQLite build without FTS5')
+
+    def search(self, url, **params):
+        response = self.client.get(url, {'search_mode': 'fts', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_availability_cached_until_migrate(self):
+        from django.apps import apps
+        from .signals import repair_fts_triggers_after_migrate
+
+        with self.assertNumQueries(0):
+            self.assertTrue(fts.fts_available())
+        # A negative answer (e.g. probed before migrating) is cached as well
+        fts._available = False
+        with self.assertNumQueries(0):
+            self.assertFalse(fts.fts_available())
+        repair_fts_triggers_after_migrate(sender=apps.get_app_config('society'), using='default')
+        self.assertTrue(fts.fts_available())
+
+    def test_member_prefix_search(self):
+        results = self.search('/api/members/', search='moham')
+        self.assertEqual({r['member_id'] for r in results}, {self.ali.member_id, self.fathima.member_id})
+        self.assertEqual(self.search('/api/members/', search='ali moham')[0]['member_id'], self.ali.member_id)
+
+    def test_member_search_matches_house_text(self):
+        results = self.search('/api/members/', search='kizhakk')
+        self.assertEqual([r['member_id'] for r in results], [self.fathima.member_id])
+
+    def test_member_column_filters(self):
+        self.assertEqual(len(self.search('/api/members/', father_name='abdul')), 1)
+        self.assertEqual(len(self.search('/api/members/', phone='98470')), 1)
+
+    def test_triggers_follow_updates(self):
+        self.ali.name = 'Shafi'
+        self.ali.save()
+        self.assertEqual(self.search('/api/members/', search='moham', name='moham'), [])
+        self.house.delete()
+        self.assertEqual(self.search('/api/houses/', search='puthiya'), [])
+
+    def test_house_search(self):
+        results = self.search('/api/houses/', search='kunn')
+        self.assertEqual([r['home_id'] for r in results], [self.other_house.home_id])
+
+
+class HouseDuplicateCheckTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        area = Area.objects.create(name='North')
+        cls.house = House.objects.create(house_name='Puthiya Veedu', family_name='Karuvanthodi',
+                                         location_name='Chemmad', area=area, address='')
+        House.objects.create(house_name='Kizhakkethil', family_name='Kunnath', location_name='Tirur',
+                             area=area, address='')
+
+    def check(self, **params):
+        response = self.client.get('/api/houses/check_duplicates/', params)
+        self.assertEqual(response.status_code, 200)
+        return [h['home_id'] for h in response.json()]
+
+    def test_keys_are_stored(self):
+        self.assertEqual(self.house.house_name_key, phonetic.phonetic_key('Pudhiya Veed'))
+        self.assertEqual(self.house.name_signature, phonetic.token_signature('Karuvanthodi', 'Veedu Puthiya'))
+
+    def test_spelling_variants_found(self):
+        self.assertEqual(self.check(house_name='Pudhiya Veed'), [self.house.home_id])
+        self.assertEqual(self.check(house_name='Veedu Puthiya', family_name='Karuvanthody'), [self.house.home_id])
+
+    def test_rename_refreshes_keys(self):
+        self.house.house_name = 'Thazhe Veedu'
+        self.house.save(update_fields=['house_name'])
+        self.house.refresh_from_db()
+        self.assertEqual(self.house.house_name_key, phonetic.phonetic_key('Thazhe Veedu'))
+        self.assertEqual(self.check(house_name='Thazhe Vidu'), [self.house.home_id])
+
+
+class PhoneticKeyTests(TestCase):
+    def assertSameKey(self, *names):
+        keys = {phonetic.phonetic_key(name) for name in names}
+        self.assertEqual(len(keys), 1, f"{names} -> {keys}")
+
+    def test_romanization_variants(self):
+        self.assertSameKey('Muhammed', 'Mohammed', 'Muhammad', 'Mohd', 'Md.')
+        self.assertSameKey('Umer', 'Omer')
+        self.assertSameKey('Abdul Rahman', 'Abdurahman', 'Abdurrahman', 'Abdur Rahman')
+        self.assertSameKey('Abdus Salam', 'Abdussalam', 'Abdul Salam')
+        self.assertSameKey('Abdul Latheef', 'Abdullatheef', 'Abdul Lathif')
+        self.assertNotEqual(phonetic.phonetic_key('Abdul Latheef'), phonetic.phonetic_key('Abdul Thaha'))
+        self.assertSameKey('Kozhikode', 'Kolikode')
+        self.assertSameKey('Wahab', 'Vahab')
+
+    def test_distinct_names(self):
+        self.assertNotEqual(phonetic.phonetic_key('Fathima'), phonetic.phonetic_key('Ayisha'))
+        self.assertNotEqual(phonetic.phonetic_key('Umer'), phonetic.phonetic_key('Usman'))
+
+
+class SearchParentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        area = Area.objects.create(name='North')
+        house = House.objects.create(house_name='Puthiya Veedu', family_name='Karuvanthodi',
+                                     location_name='Chemmad', area=area, address='')
+        cls.omer = make_member(house, 'Omer', 'K', father_name='Abdurahman')
+        make_member(house, 'Fathima', 'K', father_name='Abdul Rahman')
+
+    def test_keys_stored_on_member(self):
+        self.assertEqual(self.omer.name_key, phonetic.phonetic_key('Umer'))
+        self.assertEqual(self.omer.father_name_key, phonetic.phonetic_key('Abdul Rahman'))
+
+    def setUp(self):
+        member_index.clear()
+
+    def search(self, **params):
+        response = self.client.get('/api/digital-requests/search_parents/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_vowel_variant_found(self):
+        response = self.search(search='Umer', father='Abdul Rahman')
+        self.assertEqual([m['id'] for m in response.json()], [self.omer.member_id])
+        self.assertIn('candidates;dur=', response['Server-Timing'])
+
+    def test_candidates_intersect_fields(self):
+        # Both members match the father key; only Omer also matches the name
+        response = self.search(search='Omer', father='Abdurrahman', max_candidates=1)
+        self.assertEqual(response['X-Search-Candidates'], '1')
+        self.assertEqual(response['X-Search-Matched'], '2')
+        self.assertEqual([m['id'] for m in response.json()], [self.omer.member_id])
+
+    def test_spouse_falls_back_to_linked_member(self):
+        spouse = make_member(self.omer.house, 'Sainaba', 'K', married_to=self.omer)
+        response = self.search(search='Zainaba', spouse='Umer')
+        self.assertEqual([m['id'] for m in response.json()], [spouse.member_id])
+
+    def test_fallback_needs_a_key_column(self):
+        # Grandfather names have no key column to block on, so nothing is scored
+        response = self.search(grandfather='Kunhimoideen')
+        self.assertEqual(response.json(), [])
+        self.assertEqual(response['X-Search-Matched'], '0')
+
+    def test_fallback_blocks_on_house_key(self):
+        response = self.search(house='Puthiya Veedu')
+        self.assertEqual(len(response.json()), 2)
+        self.assertEqual(response['X-Search-Matched'], '2')
+
+
+# Spellings as they occur in the member register, for the scoring threshold test
+SAMPLE_NAMES = [
+    'mohammed', 'muhammed', 'muhammad', 'mohamed', 'muhamed', 'ahammed', 'ahmed', 'hameed', 'abdul rahman',
+    'abdurahman', 'abdu rahiman', 'rahman', 'rahim', 'fathima', 'fatima', 'fathimath', 'ayisha', 'aysha',
+    'ayesha', 'aisha', 'umer', 'omer', 'ummer', 'usman', 'uthman', 'ali', 'aliyar', 'alavi', 'kunhi mohammed',
+    'kunhimuhammed', 'musthafa', 'mustafa', 'moosa', 'musa', 'zainaba', 'sainaba', 'khadeeja', 'khadija',
+    'kadeeja', 'haris', 'harris', 'basheer', 'bashir', 'nazeer', 'nasir', 'shameer', 'sameer', 'jameela',
+    'jamila', 'sulaiman', 'puthiya veedu', 'puthan veedu', 'kunnath', 'kunnathodi', 'karuvanthodi',
+    'valiya parambil', 'cheriya parambil', 'thekkethil', 'vadakkethil', 'mohammed ali', 'ali mohammed',
+    'abdul kader', 'abdul khader', 'kader',
+]
+
+
+class ScoringTests(TestCase):
+    def test_ratio_bounds_difflib(self):
+        import difflib
+        for a, b in [('muhammed', 'mohammed ali'), ('umer', 'omer'), ('abc', ''), ('veedu', 'puthiya veedu')]:
+            with self.subTest(a=a, b=b):
+                ratio = Pattern(a).ratio(b)
+                self.assertGreaterEqual(ratio + 1e-9, difflib.SequenceMatcher(None, a, b).ratio())
+                self.assertLessEqual(ratio, 1.0)
+        self.assertEqual(Pattern('omer').ratio('omer'), 1.0)
+
+    def test_thresholds_keep_difflib_matches(self):
+        # Every pair difflib let through a search threshold still passes; the
+        # few additions on this sample are near-misses sharing most letters
+        import difflib
+        import itertools
+
+        pairs = list(itertools.permutations(SAMPLE_NAMES, 2))
+        expected_additions = {
+            0.6: {('abdul rahman', 'abdul khader')},
+            0.55: {('abdurahman', 'sulaiman'), ('abdu rahiman', 'sulaiman'), ('abdu rahiman', 'abdul khader'),
+                   ('haris', 'aisha'), ('jameela', 'kadeeja')},
+        }
+        for threshold, additions in expected_additions.items():
+            with self.subTest(threshold=threshold):
+                old = {(a, b) for a, b in pairs if difflib.SequenceMatcher(None, a, b).ratio() > threshold}
+                new = {(a, b) for a, b in pairs if Pattern(a).ratio(b) > threshold}
+                self.assertLessEqual(old, new)
+                self.assertEqual(new - old, additions)
+
+    def test_weighted_top_k(self):
+        scorer = WeightedScorer([('umer', 3), ('', 1), ('kunnath', 1)])
+        rows = [('omer', 'x', 'kunnath'), ('fathima', '', 'kunnath'), ('umer', '', 'kunnath'), ('omer', '', 'kunnath')]
+        top = scorer.top_k(rows, 2, threshold=0.5)
+        self.assertEqual([i for i, _ in top], [2, 0])  # ties keep input order
+        self.assertAlmostEqual(top[0][1], 1.0)
+
+    def test_skip_empty_values(self):
+        rows = [('veedu', '')]
+        self.assertAlmostEqual(WeightedScorer([('veedu', 1), ('kunnath', 1)]).score(rows[0]), 0.5)
+        self.assertAlmostEqual(WeightedScorer([('veedu', 1), ('kunnath', 1)], skip_empty_values=True).score(rows[0]), 1.0)
+
+
+class SequenceTests(TestCase):
+    def setUp(self):
+        self.area = Area.objects.create(name='North')
+
+    def test_ids_are_sequential_from_1001(self):
+        first = House.objects.create(house_name='A', family_name='A', location_name='X', area=self.area)
+        second = House.objects.create(house_name='B', family_name='B', location_name='X', area=self.area)
+        self.assertEqual((first.home_id, second.home_id), ('1001', '1002'))
+        self.assertEqual(make_member(first, 'Umer').member_id, '1001')
+
+    def test_seeded_numerically_from_existing_ids(self):
+        # A lexicographic Max('home_id') would pick '9999' over '10000'
+        for home_id in ('9999', '10000'):
+            House.objects.create(home_id=home_id, house_name=home_id, family_name='A', location_name='X', area=self.area)
+        house = House.objects.create(house_name='C', family_name='C', location_name='X', area=self.area)
+        self.assertEqual(house.home_id, '10001')
+
+    def test_block_reservation_skips_taken_ids(self):
+        house = House.objects.create(house_name='A', family_name='A', location_name='X', area=self.area)
+        self.assertEqual(make_member(house, 'Umer').member_id, '1001')
+        make_member(house, 'Omer', member_id='1003')  # entered by hand
+        self.assertEqual(sequences.next_member_ids(3), ['1002', '1004', '1005'])
+        self.assertEqual(sequences.next_member_ids(1), ['1006'])
+
+    def test_receipt_numbers_per_day(self):
+        house = House.objects.create(house_name='A', family_name='A', location_name='X', area=self.area)
+        member = make_member(house, 'Umer')
+        sub = SubCollection.objects.create(
+            collection=Collection.objects.create(name='Eid'), year='2025', name='Eid 2025', amount=100,
+            due_date=datetime.date(2025, 4, 1),
+        )
+        obligation = MemberObligation.objects.create(subcollection=sub, member=member, amount=100)
+        day = datetime.datetime(2025, 3, 30)
+        Receipt.objects.create(obligation=obligation, amount_paid=10, receipt_number='R-20250330-0007')
+        self.assertEqual(sequences.next_receipt_numbers(2, when=day), ['R-20250330-0008', 'R-20250330-0009'])
+        self.assertEqual(sequences.next_receipt_numbers(1, when=day + datetime.timedelta(days=1)), ['R-20250331-0001'])
+
+
+class ListQueryCountTests(TestCase):
+    def setUp(self):
+        for a in range(3):
+            area = Area.objects.create(name=f'Area {a}')
+            for h in range(4):
+                house = House.objects.create(house_name=f'Veedu {a}{h}', family_name='K', location_name='X', area=area)
+                make_member(house, 'Umer')
+                make_member(house, 'Ayisha', status='dead')
+
+    def test_area_list_counts(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/areas/').json()
+        self.assertEqual([(a['total_houses'], a['total_live_members']) for a in data], [(4, 4)] * 3)
+
+    def test_house_list_is_constant(self):
+        fts.fts_available()  # cached availability probe
+        for params in ({}, {'search': 'veedu'}, {'search': 'veedu', 'search_mode': 'fts'}):
+            with self.subTest(params=params):
+                # count + page
+                with self.assertNumQueries(2):
+                    data = self.client.get('/api/houses/', {'page_size': 100, **params}).json()
+                self.assertEqual(len(data['results']), 12)
+                self.assertTrue(all(h['member_count'] == 2 and h['area_name'] for h in data['results']))
+        with self.assertNumQueries(2):
+            self.client.get('/api/houses/search/', {'page_size': 100})
+
+
+
+class QueryCountTests(TestCase):
+    def test_fingerprint_collapses_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'O''Neil' AND x IN (%s, %s, %s)"),
+            fingerprint("SELECT * FROM t  WHERE id = 7 AND name = 'x' AND x IN (%s, %s)"),
+        )
+
+    def test_record_queries_reports_duplicates(self):
+        area = Area.objects.create(name='North')
+        with record_queries() as stats:
+            for _ in range(3):
+                Area.objects.get(pk=area.pk)
+        self.assertEqual(stats.count, 3)
+        self.assertEqual(list(stats.duplicates().values()), [3])
+
+    def test_middleware_headers(self):
+        with self.settings(SOCIETY_QUERY_COUNT=True):
+            response = self.client.get('/api/areas/')
+        self.assertEqual(response['X-Query-Count'], '1')
+        self.assertIn('db;dur=', response['Server-Timing'])
+
+# Query budget per route registered in society/urls.py. Each entry lists the
+# requests to make against QueryBudgetTests' seeded data as
+# (method, path, payload, max queries); placeholders in the path are filled
+# from the seeded objects. The seed has several rows on every list, so a change
+# that adds a query per row blows the budget. Routes that cannot run in tests
+# map to the reason instead.
+QUERY_BUDGETS = {
+    'api-root': [('get', '/api/', None, 0)],
+    'area-list': [
+        ('get', '/api/areas/', None, 1),
+        ('post', '/api/areas/', {'name': 'South'}, 6),
+    ],
+    'area-detail': [
+        ('get', '/api/areas/{area}/', None, 1),
+        ('patch', '/api/areas/{area}/', {'description': 'x'}, 5),
+    ],
+    'house-list': [
+        ('get', '/api/houses/', {'page_size': 100}, 2),
+        ('post', '/api/houses/', {'house_name': 'New', 'family_name': 'K', 'location_name': 'X',
+                                  'area': '{area}', 'address': 'A'}, 8),
+    ],
+    'house-search': [('get', '/api/houses/search/', {'search': 'veedu', 'page_size': 100}, 2)],
+    'house-check-duplicates': [('get', '/api/houses/check_duplicates/', {'house_name': 'Veedu 1'}, 1)],
+    'house-detail': [
+        ('get', '/api/houses/{house}/', None, 1),
+        ('patch', '/api/houses/{house}/', {'address': 'B'}, 5),
+    ],
+    'member-list': [
+        ('get', '/api/members/', {'page_size': 100}, 2),
+        ('post', '/api/members/', {'name': 'New', 'surname': 'K', 'house': '{house}',
+                                   'date_of_birth': '1990-01-01'}, 10),
+    ],
+    'member-search': [('get', '/api/members/search/', {'search': 'umer', 'page_size': 100}, 1)],
+    'member-all-members': [('get', '/api/members/all_members/', None, 1)],
+    'member-export': [('get', '/api/members/export/', {'output': 'csv'}, 1)],
+    'member-detail': [
+        ('get', '/api/members/{member}/', None, 1),
+        ('patch', '/api/members/{member}/', {'phone': '123'}, 7),
+    ],
+    # Relatives' parent/spouse slugs are loaded per relative
+    'member-family-tree': [('get', '/api/members/{member}/family_tree/', None, 8)],
+    'collection-list': [('get', '/api/collections/', None, 1)],
+    'collection-detail': [('get', '/api/collections/{collection}/', None, 1)],
+    'subcollection-list': [('get', '/api/subcollections/', None, 1)],
+    'subcollection-detail': [('get', '/api/subcollections/{subcollection}/', None, 1)],
+    'subcollection-assign': [
+        ('post', '/api/subcollections/{other_subcollection}/assign/', {'area': '{other_area}'}, 11),
+        ('post', '/api/subcollections/{other_subcollection}/assign/', {'dry_run': True}, 3),
+    ],
+    'memberobligation-list': [('get', '/api/obligations/', None, 1)],
+    'memberobligation-search': [('get', '/api/obligations/search/', {'subcollection': '{subcollection}'}, 1)],
+    'memberobligation-statistics': [('get', '/api/obligations/statistics/', {'subcollection': '{subcollection}'}, 1)],
+    'memberobligation-batch-statistics': [
+        ('get', '/api/obligations/batch_statistics/', {'subcollections': '{subcollection},{other_subcollection}'}, 1),
+        ('get', '/api/obligations/batch_statistics/', {'collection': '{collection}'}, 2),
+    ],
+    'memberobligation-bulk-create': [
+        ('post', '/api/obligations/bulk_create/', {'obligations': [
+            {'member': '{member}', 'subcollection': '{other_subcollection}', 'amount': '50'},
+        ]}, 9),
+    ],
+    'memberobligation-bulk-pay': [('patch', '/api/obligations/bulk_pay/', {'obligation_ids': ['{obligation}']}, 16)],
+    'memberobligation-detail': [
+        ('get', '/api/obligations/{obligation}/', None, 1),
+        ('patch', '/api/obligations/{obligation}/', {'amount': '120'}, 7),
+    ],
+    'memberobligation-export-data': 'zips the database file and media folder',
+    'memberobligation-import-data': 'replaces the database file',
+    'receipt-list': [
+        ('get', '/api/receipts/', None, 1),
+        # The first partial payment in the area also creates its counter row (3 queries)
+        ('post', '/api/receipts/', {'obligation': '{obligation}', 'amount_paid': '10'}, 17),
+    ],
+    'receipt-bulk-create': [
+        ('post', '/api/receipts/bulk_create/', {'receipts': [
+            {'obligation': '{obligation}', 'amount_paid': '10'},
+        ]}, 19),
+    ],
+    'receipt-detail': [('get', '/api/receipts/{receipt}/', None, 1)],
+    'todo-list': [('get', '/api/todos/', None, 1)],
+    'todo-detail': [('get', '/api/todos/{todo}/', None, 1)],
+    'appsettings-list': [('get', '/api/settings/', None, 3)],
+    'appsettings-detail': [('patch', '/api/settings/{settings}/', {'theme': 'dark'}, 2)],
+    'dashboard-list': [
+        ('get', '/api/dashboard/', None, 5),
+        ('get', '/api/dashboard/', {'year': '2025'}, 6),
+    ],
+    'digitalrequest-list': [('get', '/api/digital-requests/', None, 1)],
+    'digitalrequest-detail': [('get', '/api/digital-requests/{digital_request}/', None, 1)],
+    'digitalrequest-search-parents': [('get', '/api/digital-requests/search_parents/', {'search': 'umer'}, 1)],
+    'digitalrequest-import-from-client': [
+        ('post', '/api/digital-requests/import_from_client/', {'items': [{'id': 'fb-1'}, {'id': 'fb-9'}]}, 3),
+    ],
+    'digitalrequest-sync-firebase': [('post', '/api/digital-requests/sync_firebase/', {}, 1)],
+    'changes-list': [('get', '/api/changes/', None, 6)],
+    'outbox-list': [('get', '/api/outbox/', None, 1)],
+    'outbox-ack': [('post', '/api/outbox/ack/', {'ranges': [[1, 1000]]}, 1)],
+    'pending-syncs-list': [('get', '/api/pending-syncs/', None, 3)],
+    'pending-syncs-ack': [
+        ('post', '/api/pending-syncs/ack/', {'ids': ['house_{house}', 'member_{member}', 'obligation_{obligation}']}, 5),
+    ],
+    'pending-syncs-detail': [('patch', '/api/pending-syncs/member_{member}/', {}, 1)],
+    'google-drive-auth-url': 'calls Google OAuth',
+    'google-drive-connect': 'calls Google OAuth',
+    'google-drive-disconnect': 'changes Google Drive credentials',
+    'google-drive-upload-backup': 'uploads to Google Drive',
+    'google-drive-list-backups': 'calls Google Drive',
+    'google-drive-restore': 'downloads from Google Drive and replaces the database',
+}
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        from .models import AppSettings, DigitalRequest, Todo
+
+        # Rules off so member and obligation writes need no extra setup
+        cls.settings = AppSettings.objects.create(
+            firebase_config='{}',
+            rule_one_guardian_per_house=False, rule_guardian_requires_details=False,
+            rule_track_duplicate_members=False, rule_house_must_have_members=False,
+        )
+        collection = Collection.objects.create(name='Eid')
+        cls.subcollection = SubCollection.objects.create(
+            collection=collection, year='2025', name='Eid 2025', amount=100, due_date=datetime.date(2025, 4, 1))
+        cls.other_subcollection = SubCollection.objects.create(
+            collection=collection, year='2026', name='Eid 2026', amount=100, due_date=datetime.date(2026, 4, 1))
+        for a in range(2):
+            area = Area.objects.create(name=f'Area {a}')
+            for h in range(3):
+                house = House.objects.create(house_name=f'Veedu {a}{h}', family_name='K', location_name='X', area=area)
+                father = make_member(house, 'Umer')
+                for name in ('Ayisha', 'Omar'):
+                    make_member(house, name, father=father)
+        for member in Member.objects.all():
+            obligation = MemberObligation.objects.create(subcollection=cls.subcollection, member=member, amount=100)
+            if member.pk % 3 == 0:
+                Receipt.objects.create(obligation=obligation, amount_paid=100)
+        for i in range(3):
+            Todo.objects.create(title=f'Todo {i}', completed=bool(i % 2))
+            DigitalRequest.objects.create(firebase_id=f'fb-{i}', data={'name': f'Request {i}'})
+
+        cls.placeholders = {
+            'area': Area.objects.first().pk,
+            'other_area': Area.objects.last().pk,
+            'house': House.objects.first().home_id,
+            'member': Member.objects.filter(father__isnull=False).first().member_id,
+            'collection': collection.pk,
+            'subcollection': cls.subcollection.pk,
+            'other_subcollection': cls.other_subcollection.pk,
+            'obligation': MemberObligation.objects.first().pk,
+            'receipt': Receipt.objects.first().pk,
+            'todo': Todo.objects.first().pk,
+            'settings': cls.settings.pk,
+            'digital_request': DigitalRequest.objects.first().pk,
+        }
+
+    def setUp(self):
+        # Measure steady state: the member index and FTS probe are built once
+        # per process, not per request
+        member_index.build()
+        fts.fts_available()
+
+    def fill(self, value):
+        if isinstance(value, str):
+            match = re.fullmatch(r'\{(\w+)\}', value)
+            return self.placeholders[match.group(1)] if match else value.format(**self.placeholders)
+        if isinstance(value, dict):
+            return {k: self.fill(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.fill(v) for v in value]
+        return value
+
+    def test_budgets_cover_every_route(self):
+        from .urls import router
+        names = {url.name for url in router.urls}
+        self.assertEqual(names - set(QUERY_BUDGETS), set(), "routes without a query budget")
+        self.assertEqual(set(QUERY_BUDGETS) - names, set(), "budgets for unknown routes")
+
+    def test_query_budgets(self):
+        for name, checks in QUERY_BUDGETS.items():
+            if isinstance(checks, str):
+                continue
+            for method, path, payload, budget in checks:
+                with self.subTest(route=name, method=method):
+                    path = self.fill(path)
+                    payload = self.fill(payload)
+                    kwargs = {} if method == 'get' else {'content_type': 'application/json'}
+                    if payload is not None and method != 'get':
+                        payload = json.dumps(payload)
+                    # Roll each request back so writes don't change later routes' row counts
+                    with transaction.atomic():
+                        with record_queries() as stats:
+                            response = getattr(self.client, method)(path, payload, **kwargs)
+                            if response.streaming:
+                                b''.join(response.streaming_content)
+                        transaction.set_rollback(True)
+                    self.assertLess(response.status_code, 400, getattr(response, 'content', b'')[:500])
+                    self.assertLessEqual(stats.count, budget, f"{method.upper()} {path}: {stats.summary()}")
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        collection = Collection.objects.create(name='Eid')
+        subs = [
+            SubCollection.objects.create(collection=collection, year=year, name=f'Eid {year}', amount=100,
+                                         due_date=datetime.date(int(year), 4, 1))
+            for year in ('2024', '2025')
+        ]
+        for a in range(2):
+            area = Area.objects.create(name=f'Area {a}')
+            house = House.objects.create(house_name=f'Veedu {a}', family_name='K', location_name='X', area=area)
+            for status in ('live', 'live', 'dead'):
+                member = make_member(house, 'Umer', status=status)
+                for sub in subs:
+                    MemberObligation.objects.create(subcollection=sub, member=member, amount=100,
+                                                    paid_status='paid' if status == 'dead' else 'pending')
+        self.area = area
+
+    def test_unscoped_counts(self):
+        with self.assertNumQueries(5):
+            data = self.client.get('/api/dashboard/').json()
+        self.assertEqual((data['areas_count'], data['houses_count'], data['members_count']), (2, 2, 6))
+        self.assertEqual(data['members_by_status'], {'live': 4, 'dead': 2, 'terminated': 0})
+        self.assertEqual(data['obligations_by_status'], {'pending': 8, 'paid': 4, 'overdue': 0, 'partial': 0})
+        self.assertEqual((data['collections_count'], data['subcollections_count']), (1, 2))
+
+    def test_area_and_year_scope(self):
+        data = self.client.get('/api/dashboard/', {'area': self.area.pk, 'year': '2025'}).json()
+        self.assertEqual((data['areas_count'], data['houses_count'], data['members_count']), (1, 1, 3))
+        self.assertEqual(data['obligations_count'], 3)
+        self.assertEqual(data['obligations_by_status']['paid'], 1)
+        self.assertEqual((data['collections_count'], data['subcollections_count']), (1, 1))
+        self.assertEqual(self.client.get('/api/dashboard/', {'year': '25'}).status_code, 400)
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.north = Area.objects.create(name='North')
+        self.south = Area.objects.create(name='South')
+        self.house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=self.north)
+        self.other = House.objects.create(house_name='Manzil', family_name='P', location_name='X', area=self.south)
+        self.members = [make_member(self.house, 'Umer'), make_member(self.house, 'Ayisha'), make_member(self.other, 'Omar')]
+        self.sub = SubCollection.objects.create(
+            collection=Collection.objects.create(name='Eid'), year='2025', name='Eid 2025', amount=100,
+            due_date=datetime.date(2025, 4, 1))
+        self.obligations = [
+            MemberObligation.objects.create(subcollection=self.sub, member=m, amount=100) for m in self.members
+        ]
+
+    def assertInSync(self):
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+    def test_signals_follow_row_changes(self):
+        self.assertEqual(counters.totals(self.north.pk)[counters.MEMBER], {'live': 2})
+        umer, ayisha, omar = Member.objects.filter(pk__in=[m.pk for m in self.members]).order_by('pk')
+        ayisha.status = 'dead'
+        ayisha.save()
+        omar.house = self.house
+        omar.save()
+        self.assertInSync()
+        self.house.area = self.south
+        self.house.save()
+        self.assertInSync()
+        Receipt.objects.create(obligation=self.obligations[0], amount_paid=100)
+        Receipt.objects.create(obligation=self.obligations[1], amount_paid=10)
+        self.client.patch('/api/obligations/bulk_pay/', {'obligation_ids': [self.obligations[2].pk]},
+                          content_type='application/json')
+        self.assertInSync()
+        self.assertEqual(counters.totals()[counters.OBLIGATION], {'paid': 2, 'partial': 1, 'pending': 0})
+        self.other.delete()
+        self.assertInSync()
+        umer.delete()
+        self.assertInSync()
+        self.south.delete()  # cascades the house; members and obligations lose their area
+        self.assertInSync()
+        self.assertEqual(counters.totals(counters.NO_AREA)[counters.MEMBER], {'dead': 1, 'live': 1})
+
+    def test_area_list_reads_counters(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/areas/').json()
+        self.assertEqual([(a['total_houses'], a['total_live_members']) for a in data], [(1, 2), (1, 1)])
+
+    def test_rebuild_command_reports_drift(self):
+        from io import StringIO
+        from django.core.management import call_command
+        from .models import StatCounter
+
+        StatCounter.objects.filter(kind=counters.HOUSE, area_id=self.north.pk).update(count=5)
+        out = StringIO()
+        call_command('rebuild_counters', '--dry-run', stdout=out)
+        self.assertIn(f'house area={self.north.pk} status=-: stored 5, actual 1', out.getvalue())
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertInSync()
+
+    def test_migration_backfill_matches(self):
+        import importlib
+        from django.apps import apps
+        from .models import StatCounter
+
+        StatCounter.objects.all().delete()
+        importlib.import_module('society.migrations.0026_statcounter').populate_counters(apps, None)
+        self.assertInSync()
+
+
+class ObligationStatisticsTests(TestCase):
+    def setUp(self):
+        area = Area.objects.create(name='North')
+        house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=area)
+        self.collection = Collection.objects.create(name='Eid')
+        self.sub = SubCollection.objects.create(collection=self.collection, year='2025', name='Eid 2025',
+                                                amount=100, due_date=datetime.date(2025, 4, 1))
+        self.empty = SubCollection.objects.create(collection=self.collection, year='2026', name='Eid 2026',
+                                                  amount=100, due_date=datetime.date(2026, 4, 1))
+        obligations = [
+            MemberObligation.objects.create(subcollection=self.sub, member=make_member(house, name), amount=100)
+            for name in ('Umer', 'Ayisha', 'Omar', 'Fathima')
+        ]
+        Receipt.objects.create(obligation=obligations[0], amount_paid=100)
+        Receipt.objects.create(obligation=obligations[1], amount_paid=30)
+        Receipt.objects.create(obligation=obligations[1], amount_paid=20)
+        obligations[3].paid_status = 'overdue'
+        obligations[3].save()
+
+    def test_statistics(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/obligations/statistics/', {'subcollection': self.sub.pk}).json()
+        self.assertEqual(data, {
+            'total_members': 4,
+            'paid': {'count': 1, 'amount': 150.0},
+            'pending_overdue': {'count': 2, 'amount': 250.0},
+            'partial': {'count': 1, 'amount': 1.0, 'amount_value': 100.0},
+            'collection_progress': {'percentage': 37.5, 'paid_amount': 150.0, 'total_amount': 400.0},
+        })
+        self.assertEqual(self.client.get('/api/obligations/statistics/', {'subcollection': self.empty.pk}).json()['total_members'], 0)
+        self.assertEqual(self.client.get('/api/obligations/statistics/', {'subcollection': 999}).status_code, 404)
+
+    def test_batch_statistics(self):
+        single = self.client.get('/api/obligations/statistics/', {'subcollection': self.sub.pk}).json()
+        by_ids = self.client.get('/api/obligations/batch_statistics/',
+                                 {'subcollections': f'{self.sub.pk},{self.empty.pk}'}).json()
+        by_collection = self.client.get('/api/obligations/batch_statistics/', {'collection': self.collection.pk}).json()
+        self.assertEqual(by_ids, by_collection)
+        self.assertEqual(by_ids[str(self.sub.pk)], single)
+        self.assertEqual(by_ids[str(self.empty.pk)]['collection_progress']['total_amount'], 0.0)
+        self.assertEqual(self.client.get('/api/obligations/batch_statistics/', {'subcollections': 'x'}).status_code, 400)
+
+
+class PaidTotalTests(TestCase):
+    def setUp(self):
+        area = Area.objects.create(name='North')
+        house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=area)
+        sub = SubCollection.objects.create(collection=Collection.objects.create(name='Eid'), year='2025',
+                                           name='Eid 2025', amount=100, due_date=datetime.date(2025, 4, 1))
+        self.obligation = MemberObligation.objects.create(subcollection=sub, member=make_member(house, 'Umer'), amount=100)
+        self.other = MemberObligation.objects.create(subcollection=sub, member=make_member(house, 'Omar'), amount=100)
+
+    def state(self, obligation):
+        obligation.refresh_from_db()
+        return obligation.paid_total, obligation.paid_status
+
+    def test_receipt_writes_update_running_total(self):
+        first = Receipt.objects.create(obligation=self.obligation, amount_paid=40)
+        self.assertEqual(self.state(self.obligation), (40, 'partial'))
+        self.assertEqual(self.obligation.last_payment_at, first.payment_date)
+        second = Receipt.objects.create(obligation=self.obligation, amount_paid=60)
+        self.assertEqual(self.state(self.obligation), (100, 'paid'))
+        self.assertEqual(self.obligation.last_payment_at, second.payment_date)
+
+        second.amount_paid = 30
+        second.save()
+        self.assertEqual(self.state(self.obligation), (70, 'partial'))
+        second.obligation = self.other
+        second.save()
+        self.assertEqual(self.state(self.obligation), (40, 'partial'))
+        self.assertEqual(self.obligation.last_payment_at, first.payment_date)
+        self.assertEqual(self.state(self.other), (30, 'partial'))
+
+        first.delete()
+        self.assertEqual(self.state(self.obligation), (0, 'pending'))
+        self.assertIsNone(self.obligation.last_payment_at)
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+    def test_receipt_writes_obligation_once(self):
+        with record_queries() as stats:
+            Receipt.objects.create(obligation=self.obligation, amount_paid=40)
+        writes = [sql for sql, _ in stats.statements
+                  if sql.startswith(('UPDATE "society_memberobligation"', 'INSERT INTO "society_outboxentry"'))]
+        # One obligation UPDATE; one outbox entry each for the receipt and the obligation
+        self.assertEqual(len(writes), 3, stats.summary())
+        self.assertEqual(self.obligation.paid_status, 'partial')
+        # Saving the same instance afterwards must not move its counter again
+        self.obligation.amount = 120
+        self.obligation.save()
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+    def test_rebuild_command_repairs_drift(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        Receipt.objects.create(obligation=self.obligation, amount_paid=100)
+        MemberObligation.objects.filter(pk=self.obligation.pk).update(paid_total=0, paid_status='pending')
+        out = StringIO()
+        call_command('rebuild_paid_totals', '--dry-run', stdout=out)
+        self.assertIn(f'obligation {self.obligation.pk}: paid_total 0.00 -> 100.00', out.getvalue())
+        self.assertEqual(self.state(self.obligation), (0, 'pending'))
+        call_command('rebuild_paid_totals', stdout=StringIO())
+        self.assertEqual(self.state(self.obligation), (100, 'paid'))
+
+
+class BulkObligationTests(TestCase):
+    def setUp(self):
+        self.area = Area.objects.create(name='North')
+        house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=self.area)
+        self.south = Area.objects.create(name='South')
+        other = House.objects.create(house_name='Other', family_name='K', location_name='X', area=self.south)
+        self.members = [make_member(house, f'Member {i}') for i in range(20)]
+        self.away = [make_member(other, 'Away'), make_member(other, 'Abroad')]
+        self.sub = SubCollection.objects.create(collection=Collection.objects.create(name='Eid'), year='2025',
+                                                name='Eid 2025', amount=100, due_date=datetime.date(2025, 4, 1))
+
+    def post(self, rows, **extra):
+        return self.client.post('/api/obligations/bulk_create/', {'obligations': rows, **extra},
+                                content_type='application/json')
+
+    def rows(self, members, amount='100'):
+        return [{'member': m.member_id, 'subcollection': self.sub.pk, 'amount': amount} for m in members]
+
+    def test_creates_batch_with_constant_queries(self):
+        with record_queries() as small:
+            self.assertEqual(self.post(self.rows(self.members[:1] + self.away[:1])).status_code, 201)
+        with record_queries() as large:
+            response = self.post(self.rows(self.members[1:] + self.away[1:]))
+        self.assertEqual(response.status_code, 201)
+        # The first batch also creates the counter rows
+        self.assertLessEqual(large.count, small.count, large.summary())
+        self.assertEqual(response.json()['total_created'], 20)
+        self.assertEqual(response.json()['created'][0]['member'], self.members[1].member_id)
+
+        obligations = MemberObligation.objects.filter(subcollection=self.sub)
+        self.assertEqual(obligations.count(), 22)
+        self.assertEqual(obligations.filter(area=self.area).count(), 20)
+        self.assertEqual(obligations.filter(area=self.south).count(), 2)
+        self.assertFalse(obligations.filter(sync_pending=False).exists())
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+    def test_reports_errors_per_row(self):
+        MemberObligation.objects.create(subcollection=self.sub, member=self.members[0], amount=100)
+        rows = self.rows(self.members[:3]) + [
+            {'member': 'nobody', 'subcollection': self.sub.pk, 'amount': '100'},
+            {'member': self.members[3].member_id, 'subcollection': self.sub.pk, 'amount': 'lots'},
+            {'member': self.members[1].member_id, 'subcollection': self.sub.pk, 'amount': '100'},
+        ]
+        body = self.post(rows).json()
+        self.assertEqual((body['total_created'], body['total_errors']), (2, 4))
+        self.assertEqual([e['index'] for e in body['errors']], [0, 3, 4, 5])
+        self.assertEqual(body['errors'][0]['errors']['non_field_errors'],
+                         ["This member is already assigned to this obligation."])
+        self.assertIn('member', body['errors'][1]['errors'])
+        self.assertIn('amount', body['errors'][2]['errors'])
+        self.assertEqual(self.post(rows[:1]).status_code, 400)
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+    def test_skip_existing(self):
+        MemberObligation.objects.create(subcollection=self.sub, member=self.members[0], amount=100)
+        body = self.post(self.rows(self.members[:3]), skip_existing=True).json()
+        self.assertEqual((body['total_created'], body['total_skipped'], body['total_errors']), (2, 1, 0))
+        self.assertEqual([o['id'] is not None for o in body['created']], [True, True])
+        self.assertEqual(body['skipped'][0]['index'], 0)
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+
+class AssignSubCollectionTests(TestCase):
+    def setUp(self):
+        self.north, self.south = Area.objects.create(name='North'), Area.objects.create(name='South')
+        north_house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=self.north)
+        south_house = House.objects.create(house_name='Other', family_name='K', location_name='X', area=self.south)
+        self.father = make_member(north_house, 'Umer', isGuardian=True, general_body_member=True, gender='male',
+                                  date_of_birth=datetime.date(1970, 1, 1))
+        self.child = make_member(north_house, 'Ayisha', gender='female', date_of_birth=datetime.date(2015, 1, 1))
+        self.dead = make_member(north_house, 'Ali', status='dead', date_of_birth=datetime.date(1940, 1, 1))
+        self.south_member = make_member(south_house, 'Omar', isGuardian=True, date_of_birth=datetime.date(1990, 6, 1))
+        self.sub = SubCollection.objects.create(collection=Collection.objects.create(name='Eid'), year='2025',
+                                                name='Eid 2025', amount=250, due_date=datetime.date(2025, 4, 1))
+
+    def assign(self, **selector):
+        return self.client.post(f'/api/subcollections/{self.sub.pk}/assign/', selector, content_type='application/json')
+
+    def assigned(self):
+        return set(MemberObligation.objects.filter(subcollection=self.sub).values_list('member__name', flat=True))
+
+    def test_selector(self):
+        from . import bulk
+
+        today = datetime.date(2025, 1, 1)
+        def names(**params):
+            return set(bulk.select_members(params, today=today).values_list('name', flat=True))
+
+        self.assertEqual(names(), {'Umer', 'Ayisha', 'Omar'})
+        self.assertEqual(names(status='all'), {'Umer', 'Ayisha', 'Omar', 'Ali'})
+        self.assertEqual(names(area=str(self.north.pk)), {'Umer', 'Ayisha'})
+        self.assertEqual(names(area=f'{self.north.pk},{self.south.pk}', guardian='true'), {'Umer', 'Omar'})
+        self.assertEqual(names(gender='female'), {'Ayisha'})
+        self.assertEqual(names(general_body_member='false'), {'Ayisha', 'Omar'})
+        self.assertEqual(names(min_age=18), {'Umer', 'Omar'})
+        self.assertEqual(names(min_age=18, max_age=34), {'Omar'})
+        self.assertEqual(names(max_age=10), {'Ayisha'})
+        with self.assertRaises(ValueError):
+            names(min_age='adult')
+
+    def test_assign_skips_existing_rows(self):
+        MemberObligation.objects.create(subcollection=self.sub, member=self.father, amount=100)
+
+        response = self.assign(dry_run=True)
+        self.assertEqual(response.json(), {'matched': 3, 'already_assigned': 1, 'created': 0, 'would_create': 2})
+        self.assertEqual(self.assigned(), {'Umer'})
+
+        response = self.assign()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {'matched': 3, 'already_assigned': 1, 'created': 2})
+        self.assertEqual(self.assigned(), {'Umer', 'Ayisha', 'Omar'})
+        created = MemberObligation.objects.get(subcollection=self.sub, member=self.south_member)
+        self.assertEqual((created.amount, created.area, created.paid_status, created.paid_total, created.sync_pending),
+                         (250, self.south, 'pending', 0, True))
+        self.assertIsNotNone(created.created_at)
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+        self.assertEqual(self.assign().json()['created'], 0)
+        self.assertEqual(self.assign(min_age='x').status_code, 400)
+
+    def test_assign_finds_only_inserted_rows(self):
+        from unittest import mock
+
+        # An existing row stamped with the same time must not be taken for a new one
+        now = timezone.now()
+        with mock.patch('django.utils.timezone.now', return_value=now):
+            existing = MemberObligation.objects.create(subcollection=self.sub, member=self.father, amount=100)
+            OutboxEntry.objects.all().delete()
+            self.assertEqual(self.assign().json()['created'], 2)
+
+        created = set(OutboxEntry.objects.filter(model='MemberObligation').values_list('object_id', flat=True))
+        self.assertEqual(len(created), 2)
+        self.assertNotIn(str(existing.pk), created)
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+
+class BulkPayTests(TestCase):
+    def setUp(self):
+        area = Area.objects.create(name='North')
+        house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=area)
+        self.sub = SubCollection.objects.create(collection=Collection.objects.create(name='Eid'), year='2025',
+                                                name='Eid 2025', amount=100, due_date=datetime.date(2025, 4, 1))
+        self.obligations = [
+            MemberObligation.objects.create(subcollection=self.sub, member=make_member(house, f'Member {i}'), amount=100)
+            for i in range(12)
+        ]
+
+    def pay(self, obligations, **extra):
+        return self.client.patch('/api/obligations/bulk_pay/', {'obligation_ids': [o.pk for o in obligations], **extra},
+                                 content_type='application/json')
+
+    def test_creates_missing_receipts(self):
+        pending, partial, paid, marked = self.obligations[:4]
+        Receipt.objects.create(obligation=partial, amount_paid=40)
+        Receipt.objects.create(obligation=paid, amount_paid=100)
+        # Marked paid without receipts by the old bulk_pay
+        MemberObligation.objects.filter(pk=marked.pk).update(paid_status='paid')
+        MemberObligation.objects.update(sync_pending=False)
+        counters.rebuild()
+
+        response = self.pay([pending, partial, paid, marked], payment_method='upi')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        # updated_count still counts the row that was already paid
+        self.assertEqual((body['updated_count'], body['receipts_created'], body['amount_received']), (4, 3, '260.00'))
+
+        for obligation, balance in ((pending, 100), (partial, 60), (marked, 100)):
+            obligation.refresh_from_db()
+            receipt = obligation.receipts.latest('payment_date')
+            self.assertEqual((receipt.amount_paid, receipt.payment_method), (balance, 'upi'))
+            self.assertEqual((obligation.paid_status, obligation.paid_total, obligation.sync_pending), ('paid', 100, True))
+            self.assertEqual(obligation.last_payment_at, receipt.payment_date)
+        paid.refresh_from_db()
+        self.assertFalse(paid.sync_pending)
+        self.assertEqual(len(set(Receipt.objects.values_list('receipt_number', flat=True))), Receipt.objects.count())
+
+        stats = self.client.get('/api/obligations/statistics/', {'subcollection': self.sub.pk}).json()
+        self.assertEqual(stats['paid']['amount'], 400)
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('rebuild_paid_totals', '--dry-run', stdout=out)
+        self.assertIn('in sync', out.getvalue())
+
+    def test_query_count_does_not_grow_with_batch(self):
+        with record_queries() as small:
+            self.pay(self.obligations[:2])
+        with record_queries() as large:
+            self.pay(self.obligations[2:])
+        self.assertLessEqual(large.count, small.count, large.summary())
+        self.assertFalse(MemberObligation.objects.exclude(paid_status='paid').exists())
+
+    def test_rejects_non_numeric_ids(self):
+        response = self.client.patch('/api/obligations/bulk_pay/', {'obligation_ids': ['abc']},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkReceiptTests(TestCase):
+    def setUp(self):
+        area = Area.objects.create(name='North')
+        house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=area)
+        sub = SubCollection.objects.create(collection=Collection.objects.create(name='Eid'), year='2025',
+                                           name='Eid 2025', amount=100, due_date=datetime.date(2025, 4, 1))
+        self.obligations = [
+            MemberObligation.objects.create(subcollection=sub, member=make_member(house, f'Member {i}'), amount=100)
+            for i in range(10)
+        ]
+
+    def post(self, rows):
+        return self.client.post('/api/receipts/bulk_create/', {'receipts': rows}, content_type='application/json')
+
+    def test_inserts_batch_and_recomputes_obligations(self):
+        first, second = self.obligations[:2]
+        Receipt.objects.create(obligation=first, amount_paid=30)
+        rows = [
+            {'obligation': first.pk, 'amount_paid': '70', 'payment_method': 'upi'},
+            {'obligation': 0, 'amount_paid': '10'},
+            {'obligation': second.pk, 'amount_paid': '20', 'receipt_number': 'MANUAL-1'},
+            {'obligation': second.pk, 'amount_paid': 'ten'},
+            {'obligation': second.pk, 'amount_paid': '5'},
+        ]
+        body = self.post(rows).json()
+        self.assertEqual(body['created_count'], 3)
+        self.assertEqual([e['index'] for e in body['errors']], [1, 3])
+        numbers = body['receipt_numbers']
+        self.assertEqual((numbers[1], numbers[2], numbers[3]), (None, 'MANUAL-1', None))
+        self.assertEqual(Receipt.objects.get(receipt_number=numbers[0]).payment_method, 'upi')
+        self.assertEqual(Receipt.objects.get(receipt_number=numbers[4]).amount_paid, 5)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.paid_total, first.paid_status), (100, 'paid'))
+        self.assertEqual((second.paid_total, second.paid_status), (25, 'partial'))
+        self.assertEqual(second.last_payment_at, second.receipts.latest('payment_date').payment_date)
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+
+        body = self.post([{'obligation': second.pk, 'amount_paid': '1', 'receipt_number': 'MANUAL-1'}]).json()
+        self.assertIn('receipt_number', body['errors'][0]['errors'])
+
+    def test_query_count_does_not_grow_with_batch(self):
+        rows = [{'obligation': o.pk, 'amount_paid': '100'} for o in self.obligations]
+        with record_queries() as small:
+            self.post(rows[:2])
+        with record_queries() as large:
+            self.post(rows[2:])
+        self.assertLessEqual(large.count, small.count, large.summary())
+        self.assertEqual(MemberObligation.objects.filter(paid_status='paid').count(), 10)
+
+
+class OverdueSweepTests(TestCase):
+    def setUp(self):
+        area = Area.objects.create(name='North')
+        house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=area)
+        collection = Collection.objects.create(name='Eid')
+        self.past = SubCollection.objects.create(collection=collection, year='2024', name='Eid 2024', amount=100,
+                                                 due_date=datetime.date(2024, 4, 1))
+        self.future = SubCollection.objects.create(collection=collection, year='2025', name='Eid 2025', amount=100,
+                                                   due_date=datetime.date(2025, 4, 1))
+        self.members = [make_member(house, f'Member {i}') for i in range(3)]
+        for sub in (self.past, self.future):
+            for member in self.members:
+                MemberObligation.objects.create(subcollection=sub, member=member, amount=100)
+        Receipt.objects.create(obligation=MemberObligation.objects.get(subcollection=self.past, member=self.members[0]),
+                               amount_paid=50)
+        MemberObligation.objects.update(sync_pending=False)
+
+    def statuses(self, sub):
+        return sorted(MemberObligation.objects.filter(subcollection=sub).values_list('paid_status', flat=True))
+
+    def test_sweep_marks_pending_past_due(self):
+        today = datetime.date(2025, 1, 1)
+        self.assertEqual(overdue.sweep(today=today, dry_run=True), {self.past.pk: 2})
+        self.assertEqual(self.statuses(self.past), ['partial', 'pending', 'pending'])
+
+        with record_queries() as stats:
+            self.assertEqual(overdue.sweep(today=today), {self.past.pk: 2})
+        self.assertEqual(self.statuses(self.past), ['overdue', 'overdue', 'partial'])
+        self.assertEqual(self.statuses(self.future), ['pending'] * 3)
+        self.assertEqual(MemberObligation.objects.filter(sync_pending=True).count(), 2)
+        self.assertEqual(len([sql for sql, _ in stats.statements if sql.startswith('UPDATE "society_memberobligation"')]), 1)
+        self.assertEqual(counters.rebuild(dry_run=True), {})
+        self.assertEqual(overdue.sweep(today=today), {})
+
+    def test_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command('sweep_overdue', '--date', '2025-06-01', stdout=out)
+        self.assertIn('Eid 2024 (2024): 2 obligation(s)', out.getvalue())
+        self.assertIn('Marked 5 obligation(s) overdue', out.getvalue())
+        self.assertEqual(self.statuses(self.future), ['overdue'] * 3)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        area = Area.objects.create(name='North')
+        house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=area)
+        sub = SubCollection.objects.create(collection=Collection.objects.create(name='Eid'), year='2025',
+                                           name='Eid 2025', amount=100, due_date=datetime.date(2025, 4, 1))
+        for i in range(12):
+            member = make_member(house, f'Member {i}')
+            obligation = MemberObligation.objects.create(subcollection=sub, member=member, amount=100)
+            Receipt.objects.create(obligation=obligation, amount_paid=10)
+
+    def walk(self, url, params):
+        pages, seen = [], []
+        response = self.client.get(url, params)
+        while True:
+            body = response.json()
+            pages.append(body)
+            seen.extend(body['results'])
+            if not body['next']:
+                return pages, seen
+            response = self.client.get(body['next'])
+
+    def test_cursor_pages_cover_everything_in_key_order(self):
+        pages, members = self.walk('/api/members/', {'pagination': 'cursor', 'page_size': 5})
+        self.assertEqual(len(pages), 3)
+        ids = [m['member_id'] for m in members]
+        self.assertEqual(ids, sorted(Member.objects.values_list('member_id', flat=True)))
+        self.assertNotIn('count', pages[0])
+
+        _, receipts = self.walk('/api/receipts/', {'pagination': 'cursor', 'page_size': 5})
+        dates = [r['payment_date'] for r in receipts]
+        self.assertEqual((len(dates), dates), (12, sorted(dates, reverse=True)))
+        _, obligations = self.walk('/api/obligations/', {'pagination': 'cursor', 'page_size': 5})
+        self.assertEqual([o['id'] for o in obligations], sorted(o['id'] for o in obligations))
+        _, houses = self.walk('/api/houses/', {'pagination': 'cursor'})
+        self.assertEqual(len(houses), 1)
+
+    def test_deep_pages_cost_the_same_and_count_is_optional(self):
+        first = self.client.get('/api/members/', {'pagination': 'cursor', 'page_size': 2}).json()
+        with record_queries() as page_one:
+            self.client.get('/api/members/', {'pagination': 'cursor', 'page_size': 2})
+        cursor = first['next']
+        for _ in range(4):
+            cursor = self.client.get(cursor).json()['next']
+        with record_queries() as page_six:
+            self.client.get(cursor)
+        self.assertEqual(page_six.count, page_one.count)
+        self.assertFalse(any('COUNT(' in sql for sql, _ in page_six.statements))
+
+        body = self.client.get('/api/members/', {'pagination': 'cursor', 'count': 1}).json()
+        self.assertEqual(body['count'], 12)
+
+    def test_default_modes_unchanged(self):
+        self.assertIn('count', self.client.get('/api/members/').json())
+        self.assertIsInstance(self.client.get('/api/obligations/').json(), list)
+        self.assertIsInstance(self.client.get('/api/receipts/').json(), list)
+
+
+class MemberExportTests(TestCase):
+    def setUp(self):
+        area = Area.objects.create(name='North')
+        self.house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=area)
+        self.father = make_member(self.house, 'Umer', isGuardian=True)
+        make_member(self.house, 'Ayisha', father=self.father)
+        make_member(self.house, 'Ali', status='dead')
+
+    def get(self, **params):
+        response = self.client.get('/api/members/export/', params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        with record_queries() as stats:
+            response, body = self.get(columns='member_id,name,house,father,date_of_birth', status='live')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([r['name'] for r in rows], ['Umer', 'Ayisha'])
+        self.assertEqual(rows[1], {
+            'member_id': rows[1]['member_id'], 'name': 'Ayisha', 'house': self.house.home_id,
+            'father': self.father.member_id, 'date_of_birth': '1990-01-01',
+        })
+        self.assertEqual(stats.count, 1, stats.summary())
+
+    def test_csv(self):
+        import csv
+        response, body = self.get(output='csv')
+        self.assertIn('members.csv', response['Content-Disposition'])
+        rows = list(csv.reader(body.splitlines()))
+        self.assertEqual(rows[0][:3], ['member_id', 'name', 'surname'])
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[1][rows[0].index('isGuardian')], 'True')
+        self.assertEqual(rows[1][rows[0].index('father')], '')
+
+    def test_rejects_unknown_options(self):
+        self.assertEqual(self.client.get('/api/members/export/', {'columns': 'name,salary'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/members/export/', {'output': 'xml'}).status_code, 400)
+
+
+@override_settings(SOCIETY_CHANGES_SETTLE_SECONDS=0)
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.area = Area.objects.create(name='North')
+        self.house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=self.area)
+        self.father = make_member(self.house, 'Umer')
+        self.child = make_member(self.house, 'Ayisha', father=self.father)
+        sub = SubCollection.objects.create(collection=Collection.objects.create(name='Eid'), year='2025',
+                                           name='Eid 2025', amount=100, due_date=datetime.date(2025, 4, 1))
+        self.obligation = MemberObligation.objects.create(subcollection=sub, member=self.child, amount=100)
+
+    def changes(self, since=None, **params):
+        if since:
+            params['since'] = since
+        response = self.client.get('/api/changes/', params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_initial_sync_then_deltas(self):
+        body = self.changes()
+        self.assertEqual({k: len(v) for k, v in body['changes'].items()},
+                         {'areas': 1, 'houses': 1, 'members': 2, 'obligations': 1, 'receipts': 0})
+        self.assertEqual(body['changes']['houses'][0]['home_id'], self.house.home_id)
+        self.assertFalse(body['has_more'])
+        token = body['token']
+
+        empty = self.changes(token)
+        self.assertEqual(sum(len(v) for v in empty['changes'].values()), 0)
+        self.assertEqual(sum(len(v) for v in empty['deleted'].values()), 0)
+
+        receipt = Receipt.objects.create(obligation=self.obligation, amount_paid=40)
+        body = self.changes(empty['token'])
+        self.assertEqual([r['receipt_number'] for r in body['changes']['receipts']], [receipt.receipt_number])
+        self.assertEqual([o['paid_total'] for o in body['changes']['obligations']], [40.0])
+        self.assertEqual(body['changes']['members'], [])
+
+        father_id = self.father.member_id
+        self.father.delete()
+        body = self.changes(body['token'])
+        self.assertEqual(body['deleted']['members'], [father_id])
+        # The child's father link was cleared by the delete
+        self.assertEqual([(m['member_id'], m['father']) for m in body['changes']['members']],
+                         [(self.child.member_id, None)])
+
+    def test_pages_with_limit(self):
+        for i in range(4):
+            make_member(self.house, f'Member {i}')
+        seen, token, calls = [], None, 0
+        while True:
+            body = self.changes(token, limit=2)
+            seen.extend(m['member_id'] for m in body['changes']['members'])
+            token, calls = body['token'], calls + 1
+            if not body['has_more']:
+                break
+        self.assertEqual(sorted(seen), sorted(Member.objects.values_list('member_id', flat=True)))
+        self.assertEqual(calls, 3)
+
+    def test_recent_writes_wait_until_settled(self):
+        with self.settings(SOCIETY_CHANGES_SETTLE_SECONDS=60):
+            self.assertEqual(sum(len(v) for v in self.changes()['changes'].values()), 0)
+
+    def test_rejects_bad_token(self):
+        self.assertEqual(self.client.get('/api/changes/', {'since': 'garbage'}).status_code, 400)
+
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        self.area = Area.objects.create(name='North')
+        self.house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=self.area)
+        self.member = make_member(self.house, 'Umer')
+        self.sub = SubCollection.objects.create(collection=Collection.objects.create(name='Eid'), year='2025',
+                                                name='Eid 2025', amount=100, due_date=datetime.date(2025, 4, 1))
+        outbox.acknowledge([(0, OutboxEntry.objects.order_by('-id').values_list('id', flat=True).first())])
+
+    def entries(self):
+        return [(e.model, e.object_id, e.operation, e.changed_fields) for e in outbox.pending()]
+
+    def test_saves_record_changed_fields(self):
+        self.member.phone = '123'
+        self.member.save()
+        self.member.save()  # nothing changed
+        self.house.sync_pending = False
+        self.house.save(update_fields=['sync_pending'])
+        self.assertEqual(self.entries(), [('Member', self.member.member_id, 'update', ['phone'])])
+
+    def test_rows_loaded_from_the_database_record_only_changes(self):
+        member = Member.objects.get(pk=self.member.pk)
+        member.phone = '123'
+        member.save()
+        House.objects.get(pk=self.house.pk).save()
+        self.assertEqual(self.entries(), [('Member', self.member.member_id, 'update', ['phone'])])
+
+    def test_prune_outbox_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        OutboxEntry.objects.update(acked_at=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        self.member.phone = '1'
+        self.member.save()
+        call_command('prune_outbox', '--days', '30', stdout=StringIO())
+        self.assertEqual(list(OutboxEntry.objects.values_list('model', flat=True)), ['Member'])
+
+    def test_repeated_edits_collapse(self):
+        area = Area.objects.create(name='South')
+        area.description = 'x'
+        area.save()
+        self.member.phone = '1'
+        self.member.save()
+        self.member.whatsapp = '2'
+        self.member.save()
+        self.assertEqual(self.entries(), [
+            ('Area', str(area.pk), 'create', sorted(outbox.tracked_fields(Area).values())),
+            ('Member', self.member.member_id, 'update', ['phone', 'whatsapp']),
+        ])
+        area_id = str(area.pk)
+        area.delete()
+        self.assertEqual(self.entries()[-1], ('Area', area_id, 'delete', []))
+
+    def test_set_based_writes_are_recorded(self):
+        obligation = MemberObligation.objects.create(subcollection=self.sub, member=self.member, amount=100)
+        outbox.acknowledge([(0, OutboxEntry.objects.order_by('-id').values_list('id', flat=True).first())])
+        overdue.sweep(today=datetime.date(2025, 5, 1))
+        self.assertEqual(self.entries(), [('MemberObligation', str(obligation.pk), 'update', ['paid_status'])])
+
+        response = self.client.patch('/api/obligations/bulk_pay/', {'obligation_ids': [obligation.pk]},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        receipt = Receipt.objects.get(obligation=obligation)
+        self.assertEqual(sorted(self.entries()), [
+            ('MemberObligation', str(obligation.pk), 'update', ['last_payment_at', 'paid_status', 'paid_total']),
+            ('Receipt', str(receipt.pk), 'create', sorted(outbox.tracked_fields(Receipt).values())),
+        ])
+
+    def test_rollback_discards_entries(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            make_member(self.house, 'Ghost')
+            raise RuntimeError
+        self.assertEqual(self.entries(), [])
+
+    def test_read_and_acknowledge_api(self):
+        self.member.phone = '1'
+        self.member.save()
+        self.house.address = 'B'
+        self.house.save()
+        body = self.client.get('/api/outbox/', {'limit': 1}).json()
+        self.assertEqual([e['model'] for e in body['entries']], ['Member'])
+        body = self.client.get('/api/outbox/', {'after': body['next']}).json()
+        self.assertEqual([e['model'] for e in body['entries']], ['House'])
+
+        first = OutboxEntry.objects.filter(acked_at__isnull=True).order_by('id').first().id
+        response = self.client.post('/api/outbox/ack/', {'ranges': [[first, body['next']]]},
+                                    content_type='application/json')
+        self.assertEqual(response.json(), {'acknowledged': 2})
+        self.assertEqual(self.client.get('/api/outbox/').json()['entries'], [])
+        self.assertEqual(self.client.post('/api/outbox/ack/', {'ranges': 'x'},
+                                          content_type='application/json').status_code, 400)
+
+
+class PendingSyncTests(TestCase):
+    def setUp(self):
+        area = Area.objects.create(name='North')
+        self.houses = [House.objects.create(house_name=f'Veedu {i}', family_name='K', location_name='X', area=area)
+                       for i in range(3)]
+        self.members = [make_member(house, f'Umer {i}') for i, house in enumerate(self.houses)]
+        sub = SubCollection.objects.create(collection=Collection.objects.create(name='Eid'), year='2025',
+                                           name='Eid 2025', amount=100, due_date=datetime.date(2025, 4, 1))
+        self.obligations = [MemberObligation.objects.create(subcollection=sub, member=m, amount=100)
+                            for m in self.members]
+        # Give some rows the same timestamp so pages have to break ties
+        same = self.houses[0].updated_at
+        House.objects.filter(pk=self.houses[1].pk).update(updated_at=same)
+        Member.objects.filter(pk__in=[m.pk for m in self.members[:2]]).update(updated_at=same)
+
+    def expected(self):
+        rows = []
+        for rank, (label, prefix, model, public_id) in enumerate([
+                ('House', 'house', House, 'home_id'), ('Member', 'member', Member, 'member_id'),
+                ('Obligation', 'obligation', MemberObligation, 'id')]):
+            for pk, updated_at, object_id in model.objects.filter(sync_pending=True).values_list(
+                    'pk', 'updated_at', public_id):
+                rows.append((-updated_at.timestamp(), rank, -pk, f'{prefix}_{object_id}'))
+        return [item_id for *_, item_id in sorted(rows)]
+
+    def test_pages_merge_newest_first(self):
+        seen, cursor, calls = [], None, 0
+        while True:
+            params = {'limit': 2}
+            if cursor:
+                params['cursor'] = cursor
+            with self.assertNumQueries(3):
+                body = self.client.get('/api/pending-syncs/', params).json()
+            seen.extend(item['id'] for item in body['results'])
+            cursor, calls = body['next'], calls + 1
+            if not cursor:
+                break
+        self.assertEqual(seen, self.expected())
+        self.assertEqual(calls, 5)
+        obligation = self.obligations[0]
+        item = next(i for i in self.client.get('/api/pending-syncs/').json()['results']
+                    if i['id'] == f'obligation_{obligation.pk}')
+        self.assertEqual(item['description'], f'Obligation pending sync: Eid 2025 for {self.members[0].name}')
+
+    def test_bulk_ack(self):
+        ids = [f'house_{h.home_id}' for h in self.houses] + [f'obligation_{o.pk}' for o in self.obligations[:2]]
+        response = self.client.post('/api/pending-syncs/ack/', {'ids': ids}, content_type='application/json')
+        self.assertEqual(response.json(), {'acknowledged': 5})
+        self.assertFalse(House.objects.filter(sync_pending=True).exists())
+        self.assertEqual(list(MemberObligation.objects.filter(sync_pending=True).values_list('pk', flat=True)),
+                         [self.obligations[2].pk])
+        remaining = [i['id'] for i in self.client.get('/api/pending-syncs/').json()['results']]
+        self.assertEqual(sorted(remaining), sorted(self.expected()))
+        self.assertEqual(len(remaining), 4)
+
+        response = self.client.post('/api/pending-syncs/ack/', {'ids': ['garage_1']}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_bad_cursor(self):
+        self.assertEqual(self.client.get('/api/pending-syncs/', {'cursor': 'garbage'}).status_code, 400)
+        with self.assertRaises(pending.InvalidCursor):
+            pending.decode_cursor('e30')
+
+
+class FakeSnapshot:
+    def __init__(self, data, update_time):
+        self.exists = data is not None
+        self._data = data
+        self.update_time = update_time
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeDocument:
+    def __init__(self, store, path):
+        self.store, self.path = store, path
+
+    def get(self):
+        self.store.reads += 1
+        data, version = self.store.docs.get(self.path, (None, None))
+        return FakeSnapshot(data, version)
+
+
+class FakeBatch:
+    def __init__(self, store):
+        self.store, self.writes = store, []
+
+    def update(self, ref, data, option=None):
+        self.writes.append((ref.path, data, option))
+
+    def commit(self):
+        if self.store.failures:
+            self.store.failures -= 1
+            raise ConnectionError("unavailable")
+        for path, data, option in self.writes:
+            current, version = self.store.docs[path]
+            if option is not None and option['last_update_time'] != version:
+                raise ValueError("document changed since it was read")
+            self.store.docs[path] = ({**current, **data}, version + 1)
+        self.store.commits += 1
+
+
+class FakeFirestore:
+    """Just enough of the Firestore client for FirestoreSyncWorker."""
+
+    def __init__(self, docs, failures=0):
+        self.docs = {('families', doc_id): (data, 1) for doc_id, data in docs.items()}
+        self.failures = failures
+        self.reads = self.commits = 0
+
+    def collection(self, name):
+        store = self
+
+        class Collection:
+            def document(self, doc_id):
+                return FakeDocument(store, (name, doc_id))
+        return Collection()
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def write_option(self, last_update_time):
+        return {'last_update_time': last_update_time}
+
+    def family(self, doc_id):
+        return self.docs[('families', doc_id)][0]
+
+
+class FirestoreSyncTests(TestCase):
+    def setUp(self):
+        area = Area.objects.create(name='North')
+        self.house = House.objects.create(house_name='Veedu', family_name='K', location_name='X', area=area,
+                                          address='A', firebase_id='fam-1')
+        self.guardian = make_member(self.house, 'Umer', 'K', isGuardian=True)
+        self.child = make_member(self.house, 'Ayisha', 'K')
+        self.unlinked = House.objects.create(house_name='Other', family_name='P', location_name='X', area=area)
+        OutboxEntry.objects.update(firestore_handled_at=datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc))
+        self.client_ = FakeFirestore({'fam-1': {
+            'houseName': 'Veedu', 'guardian': {'fullName': 'Umer'},
+            'members': [{'fullName': 'Ayisha', 'surname': 'K', 'dob': '2000-01-01'}],
+        }})
+        self.sleeps = []
+
+    def worker(self, **kwargs):
+        # A clock that moves on a minute per reading never throttles
+        kwargs.setdefault('clock', iter(range(0, 10 ** 6, 60)).__next__)
+        return firestore_sync.FirestoreSyncWorker(client=self.client_, sleep=self.sleeps.append,
+                                                  jitter=lambda low, high: high, **kwargs)
+
+    def test_groups_changes_into_one_write_per_family(self):
+        self.house.address = 'B'
+        self.house.save()
+        for member, phone in ((self.guardian, '111'), (self.child, '222')):
+            member.phone = phone
+            member.save()
+        self.unlinked.address = 'C'
+        self.unlinked.save()
+
+        outcomes = self.worker().drain()
+        self.assertEqual(outcomes, {'synced': 3, 'skipped': 1})
+        self.assertEqual((self.client_.reads, self.client_.commits), (1, 1))
+        family = self.client_.family('fam-1')
+        self.assertEqual(family['address'], 'B')
+        self.assertEqual(family['guardian']['phone'], '111')
+        self.assertEqual([(m['fullName'], m['phone']) for m in family['members']], [('Ayisha', '222')])
+
+        self.assertEqual(firestore_sync.pending(), [])
+        skipped = OutboxEntry.objects.get(model='House', object_id=self.unlinked.home_id, outcome='skipped')
+        self.assertEqual((skipped.outcome, skipped.last_error), ('skipped', 'No Linked Firebase ID'))
+        self.assertEqual(self.worker().drain(), {})
+        # /api/outbox/ consumers still see every change the worker handled
+        self.assertEqual(len([e for e in outbox.pending() if e.model in ('House', 'Member')]), 4)
+
+    def test_members_are_keyed_by_member_id(self):
+        self.child.phone = '222'
+        self.child.save()
+        self.worker().drain()
+        self.assertEqual(self.client_.family('fam-1')['members'][0]['memberId'], self.child.member_id)
+
+        # A rename updates the keyed element instead of appending a new one
+        self.child.name = 'Aysha'
+        self.child.save()
+        newcomer = make_member(self.house, 'Ayisha', 'K')
+        self.worker().drain()
+        members = self.client_.family('fam-1')['members']
+        self.assertEqual([(m['memberId'], m['fullName']) for m in members],
+                         [(self.child.member_id, 'Aysha'), (newcomer.member_id, 'Ayisha')])
+        self.assertEqual(firestore_sync.member_positions(members),
+                         {self.child.member_id: 0, newcomer.member_id: 1})
+
+    def test_backfill_member_ids(self):
+        self.client_.docs[('families', 'fam-1')][0]['members'].append({'name': 'Stranger'})
+        houses = House.objects.filter(pk=self.house.pk)
+        self.assertEqual(self.worker().backfill_member_ids(houses, dry_run=True),
+                         {'keyed': 2, 'unmatched': 1, 'updated': 1})
+        self.assertEqual(self.client_.commits, 0)
+
+        self.worker().backfill_member_ids(houses)
+        family = self.client_.family('fam-1')
+        self.assertEqual(family['guardian']['memberId'], self.guardian.member_id)
+        self.assertEqual([m.get('memberId') for m in family['members']], [self.child.member_id, None])
+        self.assertEqual(self.worker().backfill_member_ids(houses), {'unmatched': 1})
+
+    def test_retries_with_backoff_then_leaves_failures_pending(self):
+        self.child.phone = '222'
+        self.child.save()
+        self.client_.failures = 1
+        self.assertEqual(self.worker(base_delay=1).drain(), {'synced': 1})
+        self.assertEqual(self.sleeps, [1])
+
+        self.child.phone = '333'
+        self.child.save()
+        self.client_.failures = 5
+        self.assertEqual(self.worker(max_attempts=3, base_delay=1).drain(), {'failed': 1})
+        self.assertEqual(self.sleeps[1:], [1, 2])
+        entry = firestore_sync.pending()[0]
+        self.assertEqual((entry.outcome, entry.attempts), ('failed', 1))
+        self.assertIn('unavailable', entry.last_error)
+
+    def test_parks_entries_failing_every_drain(self):
+        self.child.phone = '222'
+        self.child.save()
+        self.client_.failures = 10
+        self.assertEqual(self.worker(max_attempts=1, max_drains=2).drain(), {'failed': 1})
+        entry = firestore_sync.pending()[0]
+        self.assertEqual((entry.attempts, entry.firestore_handled_at), (1, None))
+
+        self.assertEqual(self.worker(max_attempts=1, max_drains=2).drain(), {'failed': 1})
+        self.assertEqual(firestore_sync.pending(), [])
+        entry.refresh_from_db()
+        self.assertEqual((entry.outcome, entry.attempts), ('failed', 2))
+        self.assertIsNotNone(entry.firestore_handled_at)
+        self.assertEqual(self.worker(max_attempts=1, max_drains=2).drain(), {})
+
+        # A later change is tried afresh
+        self.client_.failures = 0
+        self.child.phone = '333'
+        self.child.save()
+        self.assertEqual(self.worker(max_drains=2).drain(), {'synced': 1})
+        self.assertEqual(self.client_.family('fam-1')['members'][0]['phone'], '333')
+
+    def test_at_least_one_attempt(self):
+        self.child.phone = '222'
+        self.child.save()
+        self.client_.failures = 1
+        self.assertEqual(self.worker(max_attempts=0).drain(), {'failed': 1})
+
+    def test_sync_functions_without_the_worker(self):
+        from unittest import mock
+        from .firebase_service import sync_house_to_firebase, sync_member_to_firebase
+
+        with mock.patch('society.firebase_service.get_firestore_db', return_value=None):
+            self.assertEqual(sync_house_to_firebase(self.house), (False, "Firebase DB not initialized"))
+        with mock.patch('society.firebase_service.get_firestore_db', return_value=self.client_):
+            self.child.phone = '999'
+            self.assertEqual(sync_member_to_firebase(self.child), (True, "Synced Member"))
+            self.assertEqual(sync_house_to_firebase(self.unlinked), (False, "No Linked Firebase ID"))
+        self.assertEqual(self.client_.family('fam-1')['members'][0]['phone'], '999')
+
+    def test_rate_limits_writes(self):
+        other = House.objects.create(house_name='Third', family_name='Q', location_name='X',
+                                     area=self.house.area, address='A', firebase_id='fam-2')
+        self.client_.docs[('families', 'fam-2')] = ({}, 1)
+        self.house.address = 'B'
+        self.house.save()
+        other.address = 'B'
+        other.save()
+        worker = self.worker(rate=2, clock=lambda: 100.0)
+        self.assertEqual(worker.drain(), {'synced': 2})
+        self.assertEqual(self.sleeps, [0.5])
@@ -15,8 +15,10 @@ router.register(r'settings', AppSettingsViewSet)
 router.register(r'dashboard', DashboardViewSet, basename='dashboard')
 router.register(r'digital-requests', DigitalRequestViewSet)
 
-from .views import PendingSyncViewSet, GoogleDriveViewSet
+from .views import PendingSyncViewSet, GoogleDriveViewSet, ChangesViewSet, OutboxViewSet
 router.register(r'pending-syncs', PendingSyncViewSet, basename='pending-syncs')
+router.register(r'changes', ChangesViewSet, basename='changes')
+router.register(r'outbox', OutboxViewSet, basename='outbox')
 router.register(r'google-drive', GoogleDriveViewSet, basename='google-drive')
 
 
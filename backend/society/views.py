@@ -2,18 +2,28 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
-from django.db.models import Q, Sum, Count
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import Q, Sum, Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.http import HttpResponse, Http404
 from django.conf import settings
 from django.core.management import execute_from_command_line
-from .models import Member, Area, House, Collection, SubCollection, MemberObligation, Todo, AppSettings, DigitalRequest, Receipt
+from .models import Member, Area, House, Collection, SubCollection, MemberObligation, Todo, AppSettings, DigitalRequest, Receipt, StatCounter
+from .search_index import member_index
+from .pagination import opt_in_keyset
+from . import bulk, changes, counters, export, fts, outbox, pending
+from .phonetic import phonetic_key, token_signature, block_range
+from .scoring import WeightedScorer
 from .serializers import MemberSerializer, AreaSerializer, HouseSerializer, CollectionSerializer, SubCollectionSerializer, MemberObligationSerializer, MemberObligationDetailSerializer, TodoSerializer, AppSettingsSerializer, DigitalRequestSerializer, ReceiptSerializer
+import logging
 import os
 import zipfile
 import tempfile
 import shutil
 from typing import Any
-import difflib
+import time
+
+logger = logging.getLogger(__name__)
 
 # Custom pagination class
 class MemberPagination(PageNumberPagination):
@@ -26,15 +36,36 @@ class HousePagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+def use_fts_search(request):
+    """
+    Whether text filters should go through the FTS5 tables (`search_mode=fts`)
+    instead of `icontains`. Falls back to `icontains` when FTS5 is unavailable.
+    """
+    mode = request.query_params.get('search_mode', getattr(settings, 'SOCIETY_SEARCH_MODE', 'contains'))
+    return mode == 'fts' and fts.fts_available()
+
 class AreaViewSet(viewsets.ModelViewSet):
     queryset = Area.objects.all()
     serializer_class = AreaSerializer
 
+    def get_queryset(self):
+        # Counts are read from the materialized counters (one row per area and
+        # status, see counters.py) instead of counting houses and members.
+        def counter(kind, status=''):
+            rows = StatCounter.objects.filter(kind=kind, area_id=OuterRef('pk'), status=status)
+            return Coalesce(Subquery(rows.values('count')[:1]), 0)
+
+        return Area.objects.annotate(
+            total_houses=counter(counters.HOUSE),
+            total_live_members=counter(counters.MEMBER, 'live'),
+        ).order_by('id')
+
 class HouseViewSet(viewsets.ModelViewSet):
     queryset = House.objects.all()
     serializer_class = HouseSerializer
     lookup_field = 'home_id'
-    pagination_class = HousePagination
+    # ?pagination=cursor pages by home_id instead of page numbers
+    pagination_class = opt_in_keyset('home_id', HousePagination)
     
     def get_serializer_class(self):
         if self.action == 'list' or self.action == 'search':
@@ -55,13 +86,19 @@ class HouseViewSet(viewsets.ModelViewSet):
         family_name_filter = self.request.query_params.get('family_name', None)
         location_name_filter = self.request.query_params.get('location_name', None)
 
+        # FTS5 mode: token-prefix MATCH ranked by bm25 instead of LIKE '%x%' scans
+        use_fts = use_fts_search(self.request)
+
         if search:
-            queryset = queryset.filter(
-                Q(house_name__icontains=search) | 
-                Q(family_name__icontains=search) | 
-                Q(location_name__icontains=search) |
-                Q(home_id__icontains=search)
-            )
+            if use_fts:
+                queryset = fts.search_houses(queryset, search)
+            else:
+                queryset = queryset.filter(
+                    Q(house_name__icontains=search) | 
+                    Q(family_name__icontains=search) | 
+                    Q(location_name__icontains=search) |
+                    Q(home_id__icontains=search)
+                )
             
         if area_id:
             queryset = queryset.filter(area=area_id)
@@ -71,13 +108,31 @@ class HouseViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(home_id__icontains=home_id_filter)
         
         if house_name_filter:
-            queryset = queryset.filter(house_name__icontains=house_name_filter)
+            if use_fts:
+                queryset = fts.filter_house_columns(queryset, ['house_name'], house_name_filter)
+            else:
+                queryset = queryset.filter(house_name__icontains=house_name_filter)
             
         if family_name_filter:
-            queryset = queryset.filter(family_name__icontains=family_name_filter)
+            if use_fts:
+                queryset = fts.filter_house_columns(queryset, ['family_name'], family_name_filter)
+            else:
+                queryset = queryset.filter(family_name__icontains=family_name_filter)
             
         if location_name_filter:
-            queryset = queryset.filter(location_name__icontains=location_name_filter)
+            if use_fts:
+                queryset = fts.filter_house_columns(queryset, ['location_name'], location_name_filter)
+            else:
+                queryset = queryset.filter(location_name__icontains=location_name_filter)
+
+        if self.action in ('list', 'search'):
+            # HouseListSerializer reads these instead of querying per house. A
+            # correlated count keeps the page query (and its COUNT) free of a
+            # members join and GROUP BY.
+            members = Member.objects.filter(house=OuterRef('pk')).order_by().values('house')
+            queryset = queryset.select_related('area').annotate(
+                member_count=Coalesce(Subquery(members.annotate(n=Count('id')).values('n')), 0)
+            )
             
         return queryset
     
@@ -110,42 +165,31 @@ class HouseViewSet(viewsets.ModelViewSet):
             return Response([])
             
         # Strategy:
-        # 1. Fetch a broad set of candidates (e.g. all houses, or filtered by first letter if dataset is huge)
-        # 2. Score them using difflib
-        
-        queryset = House.objects.all()
-        candidates = list(queryset) # For SQLite/small-medium datasets, fetching all is okay (~1000s). For larger, filter first.
-        
-        results = []
-        for house in candidates:
-            score = 0
-            checks = 0
-            
-            if house_name:
-                checks += 1
-                # Check house name similarity
-                s = difflib.SequenceMatcher(None, house_name.lower(), house.house_name.lower()).ratio()
-                score += s
-                
-            if family_name and house.family_name:
-                checks += 1
-                # Check family name similarity
-                s = difflib.SequenceMatcher(None, family_name.lower(), house.family_name.lower()).ratio()
-                score += s
-            
-            # Normalize score
-            final_score = (score / checks) if checks > 0 else 0
-            
-            # Threshold: > 0.6 means decent similarity (e.g. "muhammed" vs "mohammed" is high)
-            if final_score > 0.6:
-                results.append({
-                    'data': house,
-                    'score': final_score
-                })
+        # 1. Fetch candidates from the same or neighbouring phonetic blocks
+        #    (indexed key columns on House, see phonetic.py)
+        # 2. Score them in one batch with the shared scorer (scoring.py)
         
-        # Sort by score descending
-        results.sort(key=lambda x: x['score'], reverse=True)
-        top_matches = [r['data'] for r in results[:10]]
+        blocks = Q()
+        house_key = phonetic_key(house_name)
+        family_key = phonetic_key(family_name)
+        if house_key:
+            blocks |= Q(**block_range('house_name_key', house_key))
+        if family_key:
+            blocks |= Q(**block_range('family_name_key', family_key))
+        signature = token_signature(house_name, family_name)
+        if signature:
+            blocks |= Q(name_signature=signature)
+        if not blocks:
+            return Response([])
+
+        candidates = list(House.objects.filter(blocks))
+
+        # Family name only counts when the stored house has one
+        scorer = WeightedScorer([(house_name, 1), (family_name, 1)], skip_empty_values=True)
+        rows = [(house.house_name.lower(), (house.family_name or '').lower()) for house in candidates]
+
+        # Threshold: > 0.6 means decent similarity (e.g. "muhammed" vs "mohammed" is high)
+        top_matches = [candidates[i] for i, _ in scorer.top_k(rows, 10, threshold=0.6)]
         
         serializer = self.get_serializer(top_matches, many=True)
         return Response(serializer.data)
@@ -154,7 +198,8 @@ class MemberViewSet(viewsets.ModelViewSet):
     queryset = Member.objects.all()
     serializer_class = MemberSerializer
     lookup_field = 'member_id'
-    pagination_class = MemberPagination
+    # ?pagination=cursor pages by member_id instead of page numbers
+    pagination_class = opt_in_keyset('member_id', MemberPagination)
     
     def get_serializer_class(self):
         if self.action == 'search':
@@ -163,7 +208,10 @@ class MemberViewSet(viewsets.ModelViewSet):
         return MemberSerializer
     
     def get_queryset(self):
-        queryset = Member.objects.all().select_related('house', 'house__area')
+        # The serializer renders father/mother/spouse as member_id slugs
+        queryset = Member.objects.all().select_related(
+            'house', 'house__area', 'father', 'mother', 'married_to', 'second_spouse'
+        )
         
         # Apply filters from query parameters
         search = self.request.query_params.get('search', None)
@@ -182,13 +230,19 @@ class MemberViewSet(viewsets.ModelViewSet):
         gender_filter = self.request.query_params.get('gender', None)
         house_name_filter = self.request.query_params.get('house_name', None)
         
+        # FTS5 mode: token-prefix MATCH ranked by bm25 instead of LIKE '%x%' scans
+        use_fts = use_fts_search(self.request)
+
         if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) | 
-                Q(surname__icontains=search) | 
-                Q(house__house_name__icontains=search) |
-                Q(member_id__icontains=search)
-            )
+            if use_fts:
+                queryset = fts.search_members(queryset, search)
+            else:
+                queryset = queryset.filter(
+                    Q(name__icontains=search) | 
+                    Q(surname__icontains=search) | 
+                    Q(house__house_name__icontains=search) |
+                    Q(member_id__icontains=search)
+                )
             
         if area_id:
             queryset = queryset.filter(house__area=area_id)
@@ -204,13 +258,25 @@ class MemberViewSet(viewsets.ModelViewSet):
         if member_id_filter:
             queryset = queryset.filter(member_id__icontains=member_id_filter)
         if name_filter:
-            queryset = queryset.filter(Q(name__icontains=name_filter) | Q(surname__icontains=name_filter))
+            if use_fts:
+                queryset = fts.filter_member_columns(queryset, ['name', 'surname'], name_filter)
+            else:
+                queryset = queryset.filter(Q(name__icontains=name_filter) | Q(surname__icontains=name_filter))
         if father_filter:
-            queryset = queryset.filter(father_name__icontains=father_filter)
+            if use_fts:
+                queryset = fts.filter_member_columns(queryset, ['father_name'], father_filter)
+            else:
+                queryset = queryset.filter(father_name__icontains=father_filter)
         if mother_filter:
-            queryset = queryset.filter(mother_name__icontains=mother_filter)
+            if use_fts:
+                queryset = fts.filter_member_columns(queryset, ['mother_name'], mother_filter)
+            else:
+                queryset = queryset.filter(mother_name__icontains=mother_filter)
         if phone_filter:
-            queryset = queryset.filter(phone__icontains=phone_filter)
+            if use_fts:
+                queryset = fts.filter_member_columns(queryset, ['phone'], phone_filter)
+            else:
+                queryset = queryset.filter(phone__icontains=phone_filter)
         if whatsapp_filter:
             queryset = queryset.filter(whatsapp__icontains=whatsapp_filter)
         if adhar_filter:
@@ -218,7 +284,10 @@ class MemberViewSet(viewsets.ModelViewSet):
         if gender_filter:
             queryset = queryset.filter(gender__iexact=gender_filter)
         if house_name_filter:
-            queryset = queryset.filter(house__house_name__icontains=house_name_filter)
+            if use_fts:
+                queryset = fts.filter_house_columns(queryset, ['house_name'], house_name_filter, relation='house_id')
+            else:
+                queryset = queryset.filter(house__house_name__icontains=house_name_filter)
             
         # Add support for direct house ID filtering
         house_id = self.request.query_params.get('house', None) or self.request.query_params.get('home_id', None)
@@ -249,108 +318,52 @@ class MemberViewSet(viewsets.ModelViewSet):
             return Response(serializer.data)
             
         # --- Fuzzy Search Logic ---
-        
-        # 1. Get base queryset with OTHER filters applied (e.g. Area, Status)
-        # We temporarily remove the 'search' param from request to avoid double-filtering
-        # if the standard filter logic does simple icontains.
-        # But `get_queryset` handles 'search' manually. 
-        # Strategy: We'll manually call filter_queryset but strictly we want to avoid 
-        # the standard `icontains` if we are doing fuzzy.
-        # However, `get_queryset` implementation (lines 165-171) applies strict filter if `search` is present.
-        # We should probably bypass `get_queryset`'s search filter or relax it.
-        # EASIEST: Just use `get_queryset` but pass `search=None` to it by tricking it, 
-        # or better: Fetch all (filtered by other params) and filter in memory.
-        
-        # Determine filters from request, excluding 'search'
-        base_qs = Member.objects.all().select_related('house')
-        area_id = request.query_params.get('area', None)
-        status_param = request.query_params.get('status', None)
-        
-        if area_id:
-            base_qs = base_qs.filter(house__area=area_id)
-        if status_param:
-            base_qs = base_qs.filter(status=status_param)
-            
-        # Fetch candidates
-        candidates = list(base_qs)
-        
-        scored_results = []
-        term_lower = search_term.lower()
-        
-        for m in candidates:
-            # Calculate match score
-            # We check: Name (high weight), Surname, House Name, ID
-            score = 0
-            max_possible = 0
-            
-            # Name
-            if m.name:
-                s = difflib.SequenceMatcher(None, term_lower, m.name.lower()).ratio()
-                score += (s * 3) # Weight 3
-                max_possible += 3
-                
-                # Check contains bonus
-                if term_lower in m.name.lower():
-                    score += 0.5
-            
-            # Surname
-            if m.surname:
-                s = difflib.SequenceMatcher(None, term_lower, m.surname.lower()).ratio()
-                score += s
-                max_possible += 1
-                
-            # House Name
-            if m.house and m.house.house_name:
-                s = difflib.SequenceMatcher(None, term_lower, m.house.house_name.lower()).ratio()
-                score += s
-                max_possible += 1
-            
-            # Member ID (Exact or approximate)
-            if str(m.member_id).lower() == term_lower:
-                score += 5 # Massive boost for ID match
-            elif term_lower in str(m.member_id).lower():
-                score += 2
-                
-            # Normalize? Or just use raw score.
-            # Let's normalize slightly by dividing by weights if we want a 0-1 range, 
-            # but raw score is fine for sorting.
-            
-            # Heuristic threshold: 
-            # If name match is decent (>0.6), score will be > 1.8. 
-            # Let's simple filter low matches.
-            
-            # A simple fast includes check to always include strict matches even if diff is weird
-            is_strict_match = (
-                term_lower in (m.name or "").lower() or 
-                term_lower in (m.surname or "").lower() or 
-                term_lower in str(m.member_id).lower()
-            )
-            
-            if score > 1.5 or is_strict_match:
-                scored_results.append((m, score))
-        
-        # Sort by score descending
-        scored_results.sort(key=lambda x: x[1], reverse=True)
-        
-        # Extract members
-        final_list = [x[0] for x in scored_results]
-        
-        # Pagination
-        page = self.paginate_queryset(final_list)
+        # Candidates come from the resident n-gram index (see search_index.py),
+        # which applies the Area/Status filters and returns ranked member pks.
+        ranked_pks = member_index.search(
+            search_term,
+            area=request.query_params.get('area', None),
+            status=request.query_params.get('status', None),
+        )
+
+        # Pagination happens on the pk list so only the visible page is loaded
+        page = self.paginate_queryset(ranked_pks)
         if page is not None:
-            serializer = self.get_serializer(page, many=True)
+            serializer = self.get_serializer(self._members_in_order(page), many=True)
             return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(final_list, many=True)
+
+        serializer = self.get_serializer(self._members_in_order(ranked_pks), many=True)
         return Response(serializer.data)
 
+    def _members_in_order(self, pks):
+        """Load members for the given pks, preserving the order of `pks`."""
+        members = Member.objects.select_related('house', 'house__area').in_bulk(pks)
+        return [members[pk] for pk in pks if pk in members]
+
     @action(detail=False, methods=['get'])
     def all_members(self, request):
-        """Get all members without pagination"""
+        """Get all members without pagination (see `export` for large registers)"""
         queryset = self.filter_queryset(self.get_queryset())
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream the filtered members as NDJSON (default) or CSV.
+
+        ?output=ndjson|csv chooses the encoding and ?columns=member_id,name,...
+        the columns (see export.MEMBER_COLUMNS). Accepts the list filters.
+        Rows are streamed in chunks instead of being serialized into one list.
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            columns = export.select_columns(export.MEMBER_COLUMNS, request.query_params.get('columns'))
+            return export.stream(queryset, export.MEMBER_COLUMNS, columns,
+                                 output=request.query_params.get('output', 'ndjson'), filename='members')
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
     @action(detail=True, methods=['get'])
     def family_tree(self, request, member_id=None):
         """
@@ -404,9 +417,35 @@ class SubCollectionViewSet(viewsets.ModelViewSet):
     queryset = SubCollection.objects.all()
     serializer_class = SubCollectionSerializer
 
+    @action(detail=True, methods=['post'])
+    def assign(self, request, pk=None):
+        """Create obligations for a population of members
+
+        The selector is read from the body: area (id or "1,2"), status
+        (default live, "all" for any), guardian, gender, general_body_member,
+        min_age, max_age. Members already assigned are skipped and the amount
+        is the subcollection's. With "dry_run": true only the counts are
+        returned.
+
+        Returns {"matched": 120, "already_assigned": 20, "created": 100}
+        """
+        subcollection = self.get_object()
+        try:
+            members = bulk.select_members(request.data)
+            dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true')
+            result = bulk.assign_subcollection(subcollection, members, dry_run=dry_run)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except IntegrityError as e:
+            # Another writer assigned some of the same members meanwhile
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response(result, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
 class MemberObligationViewSet(viewsets.ModelViewSet):
     queryset = MemberObligation.objects.all()
     serializer_class = MemberObligationSerializer
+    # Unpaginated unless ?pagination=cursor, which pages by id
+    pagination_class = opt_in_keyset('id')
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -429,7 +468,8 @@ class MemberObligationViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     def get_queryset(self):
-        queryset = MemberObligation.objects.all()
+        # Detail serializer nests member, subcollection and area (depth=1)
+        queryset = MemberObligation.objects.all().select_related('member', 'subcollection', 'area')
         
         # Filter by subcollection if provided
         subcollection_id = self.request.query_params.get('subcollection', None)
@@ -464,97 +504,87 @@ class MemberObligationViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def bulk_create(self, request):
-        """Create multiple obligations at once"""
-        # Log the incoming data for debugging
-        print("=== DEBUG: Incoming bulk obligation data ===")
-        print("Request data:", request.data)
+        """Create multiple obligations at once
+
+        Expects {"obligations": [{"member", "subcollection", "amount", ...}, ...]}
+        and optionally "skip_existing": true to skip members already assigned
+        instead of reporting them as errors. The batch is validated with a few
+        IN queries and inserted with bulk_create in one transaction; rows that
+        fail validation are listed in `errors` with their index.
+        """
+        obligations_data = request.data.get('obligations', [])
+        if not obligations_data:
+            return Response({'error': 'No obligations data provided'}, status=status.HTTP_400_BAD_REQUEST)
+        if not isinstance(obligations_data, list):
+            return Response({'error': 'obligations must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        skip_existing = str(request.data.get('skip_existing', '')).lower() in ('1', 'true')
+
         try:
-            obligations_data = request.data.get('obligations', [])
-            if not obligations_data:
-                return Response({'error': 'No obligations data provided'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            created_obligations = []
-            errors = []
-            
-            for i, obligation_data in enumerate(obligations_data):
-                try:
-                    print(f"--- Processing obligation {i+1} ---")
-                    print("Obligation data:", obligation_data)
-                    serializer = self.get_serializer(data=obligation_data)
-                    if serializer.is_valid():
-                        print("Serializer is valid")
-                        obligation = serializer.save()
-                        created_obligations.append(serializer.data)
-                        print("Created obligation:", serializer.data)
-                    else:
-                        print("Serializer errors:", serializer.errors)
-                        errors.append({
-                            'data': obligation_data,
-                            'errors': serializer.errors
-                        })
-                except Exception as e:
-                    print("Exception during obligation creation:", str(e))
-                    errors.append({
-                        'data': obligation_data,
-                        'errors': str(e)
-                    })
-            
-            response_data = {
-                'created': created_obligations,
-                'errors': errors,
-                'total_created': len(created_obligations),
-                'total_errors': len(errors)
-            }
-            
-            if errors:
-                print("=== DEBUG: Response with errors ===")
-                print("Response data:", response_data)
-                print("==================================")
-                return Response(response_data, status=status.HTTP_201_CREATED if created_obligations else status.HTTP_400_BAD_REQUEST)
-            
-            print("=== DEBUG: Successful response ===")
-            print("Response data:", response_data)
-            print("==================================")
-            return Response(response_data, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            print("Exception in bulk_create:", str(e))
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            created, errors, skipped = bulk.create_obligations(obligations_data, skip_existing=skip_existing)
+        except IntegrityError as e:
+            # Lost a race with another writer assigning the same members
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+
+        response_data = {
+            'created': MemberObligationSerializer(created, many=True).data,
+            'errors': errors,
+            'total_created': len(created),
+            'total_errors': len(errors)
+        }
+        if skip_existing:
+            response_data['skipped'] = skipped
+            response_data['total_skipped'] = len(skipped)
+
+        if errors and not created:
+            return Response(response_data, status=status.HTTP_400_BAD_REQUEST)
+        return Response(response_data, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['patch'])
     def bulk_pay(self, request):
-        """Mark multiple obligations as paid in a single database operation
-        
+        """Mark multiple obligations as paid in a single transaction
+
+        Every obligation with a balance left gets a receipt for it, so the
+        receipts, paid totals and statuses agree afterwards.
+
         Expects a JSON payload with:
         {
-            "obligation_ids": [1, 2, 3, ...]  # List of obligation IDs to mark as paid
+            "obligation_ids": [1, 2, 3, ...],  # List of obligation IDs to mark as paid
+            "payment_method": "cash",          # Optional, for the new receipts
+            "remarks": "..."                   # Optional
         }
-        
+
         Returns:
         {
-            "updated_count": 3,  # Number of obligations actually updated
+            "updated_count": 3,  # Number of the given obligations found, already paid ones included
+            "receipts_created": 2,
+            "amount_received": "150.00",
             "message": "Successfully marked 3 obligations as paid"
         }
         """
+        obligation_ids = request.data.get('obligation_ids', [])
+        if not obligation_ids:
+            return Response({'error': 'No obligation IDs provided'}, status=status.HTTP_400_BAD_REQUEST)
+        payment_method = request.data.get('payment_method') or 'cash'
+        if payment_method not in dict(Receipt.PAYMENT_METHOD_CHOICES):
+            return Response({'error': f'Unknown payment_method {payment_method!r}'}, status=status.HTTP_400_BAD_REQUEST)
+
         try:
-            obligation_ids = request.data.get('obligation_ids', [])
-            if not obligation_ids:
-                return Response({'error': 'No obligation IDs provided'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            # Update all obligations to paid status
-            updated_count = MemberObligation.objects.filter(
-                id__in=obligation_ids
-            ).update(paid_status='paid')
-            
-            return Response({
-                'updated_count': updated_count,
-                'message': f'Successfully marked {updated_count} obligations as paid'
-            }, status=status.HTTP_200_OK)
-            
-        except Exception as e:
-            print("Exception in bulk_pay:", str(e))
+            result = bulk.settle_obligations(obligation_ids, payment_method=payment_method,
+                                             remarks=request.data.get('remarks'))
+        except (TypeError, ValueError) as e:
+            # e.g. an obligation id that is not a number
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except DatabaseError as e:
+            logger.exception("bulk_pay failed for %d obligation(s)", len(obligation_ids))
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        return Response({
+            'updated_count': result['updated_count'],
+            'receipts_created': result['receipts_created'],
+            'amount_received': str(result['amount_received']),
+            'message': f'Successfully marked {result["updated_count"]} obligations as paid'
+        }, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'])
     def search(self, request):
         """Search obligations with filters"""
@@ -591,59 +621,48 @@ class MemberObligationViewSet(viewsets.ModelViewSet):
         serializer = MemberObligationDetailSerializer(queryset, many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['get'])
-    def statistics(self, request):
-        """Get obligation statistics for a subcollection"""
-        subcollection_id = request.query_params.get('subcollection', None)
-        
-        if not subcollection_id:
-            return Response({'error': 'subcollection parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
-            
-        try:
-            subcollection = SubCollection.objects.get(id=subcollection_id)
-        except SubCollection.DoesNotExist:
-            return Response({'error': 'Subcollection not found'}, status=status.HTTP_404_NOT_FOUND)
-        
-        # Get obligations for this subcollection
-        obligations = MemberObligation.objects.filter(subcollection=subcollection)
-        
-        # Calculate statistics
-        total_members = obligations.count()
-        paid_count = obligations.filter(paid_status='paid').count()
-        pending_count = obligations.filter(paid_status='pending').count()
-        overdue_count = obligations.filter(paid_status='overdue').count()
-        partial_count = obligations.filter(paid_status='partial').count()
-        
-        # Combine pending and overdue for "Pending / Overdue"
-        pending_overdue_count = pending_count + overdue_count
-        
-        # Calculate amounts
-        total_amount = obligations.aggregate(total=Sum('amount'))['total'] or 0
-        
-        # Calculate paid amount based on actual receipts
-        paid_amount = Receipt.objects.filter(obligation__subcollection=subcollection).aggregate(total=Sum('amount_paid'))['total'] or 0
-        
-        # Calculate pending amount (total - paid)
-        # Or you can do it based on status if you prefer, but total_amount - paid_amount is more accurate for partials
+    @staticmethod
+    def _statistics_by_subcollection(obligations):
+        """
+        Aggregate obligation statistics per subcollection in one query: status
+        counts and amounts via conditional aggregates, paid amounts from the
+        denormalized paid_total. Returns {subcollection_id: row}.
+        """
+        rows = obligations.order_by().values('subcollection').annotate(
+            total_members=Count('pk'),
+            paid_count=Count('pk', filter=Q(paid_status='paid')),
+            pending_overdue_count=Count('pk', filter=Q(paid_status__in=['pending', 'overdue'])),
+            partial_count=Count('pk', filter=Q(paid_status='partial')),
+            total_amount=Sum('amount'),
+            partial_amount=Sum('amount', filter=Q(paid_status='partial')),
+            paid_amount=Sum('paid_total'),
+        )
+        return {row['subcollection']: row for row in rows}
+
+    @staticmethod
+    def _statistics_payload(row):
+        row = row or {}
+        total_amount = row.get('total_amount') or 0
+        # Paid amount is based on actual receipts; pending is what remains,
+        # which is more accurate for partial payments than a status-based sum
+        paid_amount = row.get('paid_amount') or 0
         pending_amount = total_amount - paid_amount
-        
-        # Calculate collection progress percentage
         progress_percentage = (paid_amount / total_amount * 100) if total_amount > 0 else 0
-        
-        stats = {
-            'total_members': total_members,
+        partial_count = row.get('partial_count', 0)
+        return {
+            'total_members': row.get('total_members', 0),
             'paid': {
-                'count': paid_count,
+                'count': row.get('paid_count', 0),
                 'amount': float(paid_amount)
             },
             'pending_overdue': {
-                'count': pending_overdue_count,
+                'count': row.get('pending_overdue_count', 0),
                 'amount': float(pending_amount)
             },
             'partial': {
                 'count': partial_count,
-                'amount': float(obligations.filter(paid_status='partial').count()), # Change to count
-                'amount_value': float(obligations.filter(paid_status='partial').aggregate(total=Sum('amount'))['total'] or 0)
+                'amount': float(partial_count), # Change to count
+                'amount_value': float(row.get('partial_amount') or 0)
             },
             'collection_progress': {
                 'percentage': round(progress_percentage, 2),
@@ -651,8 +670,58 @@ class MemberObligationViewSet(viewsets.ModelViewSet):
                 'total_amount': float(total_amount)
             }
         }
+
+    @action(detail=False, methods=['get'])
+    def statistics(self, request):
+        """Get obligation statistics for a subcollection"""
+        subcollection_id = request.query_params.get('subcollection', None)
         
-        return Response(stats)
+        if not subcollection_id:
+            return Response({'error': 'subcollection parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if not subcollection_id.isdigit():
+            return Response({'error': 'Subcollection not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        subcollection_id = int(subcollection_id)
+        rows = self._statistics_by_subcollection(MemberObligation.objects.filter(subcollection=subcollection_id))
+        # Only a subcollection without obligations needs an existence check
+        if subcollection_id not in rows and not SubCollection.objects.filter(id=subcollection_id).exists():
+            return Response({'error': 'Subcollection not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(self._statistics_payload(rows.get(subcollection_id)))
+
+    @action(detail=False, methods=['get'])
+    def batch_statistics(self, request):
+        """
+        Statistics for many subcollections in one request.
+        Query params (one of):
+        - subcollections: Comma-separated subcollection ids
+        - collection: A collection id; covers all of its subcollections
+
+        Returns {subcollection_id: statistics} in the shape of `statistics`.
+        Requested subcollections without obligations report zeros.
+        """
+        ids_param = request.query_params.get('subcollections', '')
+        collection_id = request.query_params.get('collection', None)
+
+        if collection_id:
+            if not collection_id.isdigit():
+                return Response({'error': 'collection must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+            subcollection_ids = list(SubCollection.objects.filter(collection=collection_id).values_list('id', flat=True))
+        elif ids_param:
+            try:
+                subcollection_ids = [int(i) for i in ids_param.split(',') if i.strip()]
+            except ValueError:
+                return Response({'error': 'subcollections must be comma-separated integers'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            return Response({'error': 'subcollections or collection parameter is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = self._statistics_by_subcollection(
+            MemberObligation.objects.filter(subcollection__in=subcollection_ids)
+        ) if subcollection_ids else {}
+        return Response({
+            str(subcollection_id): self._statistics_payload(rows.get(subcollection_id))
+            for subcollection_id in subcollection_ids
+        })
 
     @action(detail=False, methods=['post'])
     def export_data(self, request):
@@ -727,9 +796,13 @@ class MemberObligationViewSet(viewsets.ModelViewSet):
 class ReceiptViewSet(viewsets.ModelViewSet):
     queryset = Receipt.objects.all().order_by('-payment_date')
     serializer_class = ReceiptSerializer
+    # Unpaginated unless ?pagination=cursor, which pages newest first
+    pagination_class = opt_in_keyset('-payment_date')
     
     def get_queryset(self):
-        queryset = Receipt.objects.all().order_by('-payment_date')
+        queryset = Receipt.objects.all().select_related(
+            'obligation', 'obligation__member', 'obligation__subcollection'
+        ).order_by('-payment_date')
         
         # Filter by obligation if provided
         obligation_id = self.request.query_params.get('obligation', None)
@@ -754,24 +827,23 @@ class ReceiptViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def bulk_create(self, request):
-        """Create multiple receipts at once"""
+        """Create multiple receipts at once
+
+        The receipts are inserted with one bulk statement and their
+        obligations' totals and statuses recomputed together afterwards.
+        `receipt_numbers` lists the new numbers in input order, with null for
+        rows listed in `errors`.
+        """
         receipts_data = request.data.get('receipts', [])
         if not receipts_data:
             return Response({'error': 'No receipts data provided'}, status=status.HTTP_400_BAD_REQUEST)
-        
-        created_receipts = []
-        errors = []
-        
-        for data in receipts_data:
-            serializer = self.get_serializer(data=data)
-            if serializer.is_valid():
-                serializer.save()
-                created_receipts.append(serializer.data)
-            else:
-                errors.append({'data': data, 'errors': serializer.errors})
-        
+        if not isinstance(receipts_data, list):
+            return Response({'error': 'receipts must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+
+        receipt_numbers, errors = bulk.create_receipts(receipts_data)
         return Response({
-            'created_count': len(created_receipts),
+            'created_count': sum(1 for number in receipt_numbers if number),
+            'receipt_numbers': receipt_numbers,
             'errors': errors
         }, status=status.HTTP_201_CREATED)
 
@@ -842,9 +914,16 @@ class DigitalRequestViewSet(viewsets.ModelViewSet):
         Search for potential parents/spouses using fuzzy matching options.
         Query params:
         - search: Name term to search
+        - surname: Surname term (optional)
         - father: Father's name term (optional)
         - grandfather: Grandfather's name term (optional)
+        - spouse: Spouse's name term (optional)
         - house: House name term (optional)
+        - max_candidates: Cap on members scored (optional, default SEARCH_PARENTS_MAX_CANDIDATES)
+
+        Response headers carry timing metadata: Server-Timing (candidates, fetch,
+        score phases), X-Search-Candidates (members scored) and X-Search-Matched
+        (members on any posting list, or in the fallback key block, before the cap).
         """
         search_term = request.query_params.get('search', '').strip()
         surname_term = request.query_params.get('surname', '').strip()
@@ -854,94 +933,71 @@ class DigitalRequestViewSet(viewsets.ModelViewSet):
         house_term = request.query_params.get('house', '').strip()
         
         # FUZZY SEARCH STRATEGY
-        # 1. Fetch broad candidates. If search_term is present, filter by first letter or allow all if empty.
-        #    Currently fetching all might be too heavy if DB is huge. optimize by filtering where possible.
-        
+        # 1. Candidate generation: intersect per-field phonetic posting lists from
+        #    the in-memory member index, capped at `max_candidates`.
+        #    Keys are romanization-aware, so "Umer" and "Omer" or "Mohd" and
+        #    "Muhammed" share postings, unlike a first-letter filter.
+        # 2. Score only those candidates in one batch (scoring.py).
+        started = time.perf_counter()
+
+        try:
+            max_candidates = int(request.query_params.get('max_candidates', settings.SEARCH_PARENTS_MAX_CANDIDATES))
+        except ValueError:
+            return Response({'error': 'max_candidates must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        max_candidates = max(1, min(max_candidates, 5000))
+
+        # One (term, weight) per scored field; fields without a term are skipped
+        fields = {
+            'name': (search_term, 3),           # 1. Name Match (Highest Weight)
+            'surname': (surname_term, 1),       # 2. Surname
+            'father': (father_term, 1.5),       # 3. Father
+            'grandfather': (grandfather_term, 1),  # 4. Grandfather
+            'spouse': (spouse_term, 1.5),       # 5. Spouse
+            'house': (house_term, 1),           # 6. House
+        }
+        scorer = WeightedScorer(list(fields.values()))
+        if not scorer:
+            return Response([])  # No search terms
+
+        candidate_pks, matched = member_index.candidates_for_fields(fields, max_candidates)
+        generated = time.perf_counter()
+
         queryset = Member.objects.all().select_related('house', 'father', 'married_to')
-        
-        # Optimization: if search term exists, at least require first letter match? 
-        # Or if "muhammed" vs "mohammed", first letter M matches. 
-        # But if "Umer" vs "Omer", first letter differs.
-        # For now, let's limit to active members or just fetch all (assuming < 10k members for now).
-        # If > 10k, we need a better strategy (e.g. Trigram similarity in Postgres, but we are using SQLite).
-        
-        # For performance, let's filter by gender if known context? (Parent search usually implies gender)
-        # But here we don't know the requested gender.
-        
-        candidates = list(queryset) # Evaluates the query
-        
-        scored_results = []
-        
-        for m in candidates:
-            total_score = 0
-            weights = 0
-            
-            # 1. Name Match (Highest Weight)
-            if search_term:
-                term = search_term.lower()
-                name = m.name.lower()
-                # Check name
-                s1 = difflib.SequenceMatcher(None, term, name).ratio()
-                
-                # Check compound name parts? "Muhammed Ali" vs "Ali"
-                # For now simple ratio.
-                
-                total_score += (s1 * 3) # Weight 3
-                weights += 3
-            
-            # 2. Surname
-            if surname_term:
-                term = surname_term.lower()
-                # surname might be empty in DB
-                sur = (m.surname or "").lower()
-                s2 = difflib.SequenceMatcher(None, term, sur).ratio()
-                total_score += s2
-                weights += 1
-            
-            # 3. Father
-            if father_term:
-                term = father_term.lower()
-                f_name = (m.father_name or (m.father.name if m.father else "")).lower()
-                s3 = difflib.SequenceMatcher(None, term, f_name).ratio()
-                total_score += (s3 * 1.5)
-                weights += 1.5
-                
-            # 4. Grandfather
-            if grandfather_term:
-                term = grandfather_term.lower()
-                g_name = (m.grandfather_name or "").lower()
-                s4 = difflib.SequenceMatcher(None, term, g_name).ratio()
-                total_score += s4
-                weights += 1
-                
-            # 5. Spouse
-            if spouse_term:
-                term = spouse_term.lower()
-                sp_name = (m.married_to_name or (m.married_to.name if m.married_to else "")).lower()
-                s5 = difflib.SequenceMatcher(None, term, sp_name).ratio()
-                total_score += (s5 * 1.5)
-                weights += 1.5
-                
-            # 6. House
-            if house_term:
-                term = house_term.lower()
-                h_name = (m.house.house_name if m.house else "").lower()
-                s6 = difflib.SequenceMatcher(None, term, h_name).ratio()
-                total_score += s6
-                weights += 1
-
-            if weights == 0:
-                continue # No search terms
-                
-            final_score = total_score / weights
-            
-            # Threshold
-            if final_score > 0.55: # Slightly loose to allow finding "the one"
-                scored_results.append((m, final_score))
+        if candidate_pks:
+            loaded = queryset.in_bulk(candidate_pks)
+            candidates = [loaded[pk] for pk in candidate_pks if pk in loaded]
+        else:
+            # Nothing shares a word key (e.g. a badly mangled name): fall back to
+            # the indexed key columns, blocking on the heaviest supplied field.
+            # Grandfather and spouse names have no key column, so a search on
+            # those alone finds nothing rather than scoring an arbitrary slice.
+            candidates = []
+            for term, key_field in ((search_term, 'name_key'), (father_term, 'father_name_key'),
+                                    (surname_term, 'surname_key'), (house_term, 'house__house_name_key')):
+                key = phonetic_key(term)
+                if key:
+                    blocked = queryset.filter(**block_range(key_field, key))
+                    candidates = list(blocked.order_by('pk')[:max_candidates + 1])
+                    matched = blocked.count() if len(candidates) > max_candidates else len(candidates)
+                    candidates = candidates[:max_candidates]
+                    break
+        fetched = time.perf_counter()
+
+        rows = [
+            (
+                m.name.lower(),
+                (m.surname or "").lower(),
+                (m.father_name or (m.father.name if m.father else "")).lower(),
+                (m.grandfather_name or "").lower(),
+                (m.married_to_name or (m.married_to.name if m.married_to else "")).lower(),
+                (m.house.house_name if m.house else "").lower(),
+            )
+            for m in candidates
+        ]
 
-        # Sort
-        scored_results.sort(key=lambda x: x[1], reverse=True)
-        top_results = [x[0] for x in scored_results[:20]]
+        # Threshold slightly loose to allow finding "the one"
+        top_results = [candidates[i] for i, _ in scorer.top_k(rows, 20, threshold=0.55)]
+        scored = time.perf_counter()
         
         # Return detailed data
         data = []
@@ -966,8 +1022,20 @@ class DigitalRequestViewSet(viewsets.ModelViewSet):
                 'mother_name': m.mother.name if m.mother else m.mother_name,
                 'mother_surname': m.mother.surname if m.mother else m.mother_surname,
             })
-            
-        return Response(data)
+
+        # Timing metadata travels in headers so the response body keeps its shape
+        response = Response(data)
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={(end - start) * 1000:.1f}'
+            for name, start, end in (
+                ('candidates', started, generated),
+                ('fetch', generated, fetched),
+                ('score', fetched, scored),
+            )
+        )
+        response['X-Search-Candidates'] = str(len(candidates))
+        response['X-Search-Matched'] = str(matched)
+        return response
 
     @action(detail=False, methods=['post'])
     def sync_firebase(self, request):
@@ -976,7 +1044,7 @@ class DigitalRequestViewSet(viewsets.ModelViewSet):
         """
         try:
             # 1. Get Firebase Config
-            setting = Settings.objects.first()
+            setting = AppSettings.objects.first()
             if not setting or not setting.firebase_config:
                 return Response({'error': 'Firebase not configured in settings'}, status=400)
             
@@ -1044,81 +1112,171 @@ class DashboardViewSet(viewsets.ViewSet):
     """
     
     def list(self, request):
-        """Return dashboard statistics"""
-        # Get counts for each model
+        """
+        Return dashboard statistics.
+        Query params:
+        - area: Restrict houses, members and obligations to one area (optional)
+        - year: Restrict collections, subcollections and obligations to a year (optional)
+
+        Figures come from the materialized counters and one conditional
+        aggregate per remaining table instead of one COUNT per figure.
+        """
+        area_id = request.query_params.get('area', None)
+        year = request.query_params.get('year', None)
+        if area_id and not area_id.isdigit():
+            return Response({'error': 'area must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        if year and not (len(year) == 4 and year.isdigit()):
+            return Response({'error': 'year must be a 4 digit year'}, status=status.HTTP_400_BAD_REQUEST)
+
+        areas = Area.objects.all()
+        collections = Collection.objects.all()
+        subcollections = SubCollection.objects.all()
+        if area_id:
+            areas = areas.filter(pk=area_id)
+        if year:
+            collections = collections.filter(subcollections__year=year)
+            subcollections = subcollections.filter(year=year)
+
+        # House, member and obligation figures come from the materialized
+        # counters (O(areas) rows). They are not kept per year, so a year
+        # scope counts obligations with one conditional aggregate instead.
+        totals = counters.totals(int(area_id) if area_id else None)
+        member_counts = totals[counters.MEMBER]
+        if year:
+            obligations = MemberObligation.objects.filter(subcollection__year=year)
+            if area_id:
+                obligations = obligations.filter(area=area_id)
+            obligation_counts = obligations.aggregate(
+                pending=Count('pk', filter=Q(paid_status='pending')),
+                paid=Count('pk', filter=Q(paid_status='paid')),
+                overdue=Count('pk', filter=Q(paid_status='overdue')),
+                partial=Count('pk', filter=Q(paid_status='partial')),
+            )
+        else:
+            obligation_counts = totals[counters.OBLIGATION]
+        todo_counts = Todo.objects.aggregate(
+            total=Count('pk'),
+            completed=Count('pk', filter=Q(completed=True)),
+        )
+
         stats = {
-            'areas_count': Area.objects.count(),
-            'houses_count': House.objects.count(),
-            'members_count': Member.objects.count(),
-            'collections_count': Collection.objects.count(),
-            'subcollections_count': SubCollection.objects.count(),
-            'obligations_count': MemberObligation.objects.count(),
-            'todos_count': Todo.objects.count(),
-            'completed_todos_count': Todo.objects.filter(completed=True).count(),
-            'pending_todos_count': Todo.objects.filter(completed=False).count(),
+            'areas_count': areas.count(),
+            'houses_count': totals[counters.HOUSE].total(),
+            'members_count': member_counts.total(),
+            'collections_count': collections.aggregate(total=Count('pk', distinct=True))['total'],
+            'subcollections_count': subcollections.count(),
+            'obligations_count': sum(obligation_counts.values()),
+            'todos_count': todo_counts['total'],
+            'completed_todos_count': todo_counts['completed'],
+            'pending_todos_count': todo_counts['total'] - todo_counts['completed'],
             'members_by_status': {
-                'live': Member.objects.filter(status='live').count(),
-                'dead': Member.objects.filter(status='dead').count(),
-                'terminated': Member.objects.filter(status='terminated').count(),
+                'live': member_counts['live'],
+                'dead': member_counts['dead'],
+                'terminated': member_counts['terminated'],
             },
             'obligations_by_status': {
-                'pending': MemberObligation.objects.filter(paid_status='pending').count(),
-                'paid': MemberObligation.objects.filter(paid_status='paid').count(),
-                'overdue': MemberObligation.objects.filter(paid_status='overdue').count(),
-                'partial': MemberObligation.objects.filter(paid_status='partial').count(),
+                'pending': obligation_counts['pending'],
+                'paid': obligation_counts['paid'],
+                'overdue': obligation_counts['overdue'],
+                'partial': obligation_counts['partial'],
             }
         }
         
         return Response(stats)
 
+class ChangesViewSet(viewsets.ViewSet):
+    """
+    Incremental sync: GET /api/changes/?since=<token>&limit=500
+
+    Returns the areas, houses, members, obligations and receipts upserted and
+    the ids deleted since `since` (everything when omitted), plus the token
+    for the next call. While `has_more` is true, call again right away.
+    """
+    def list(self, request):
+        try:
+            limit = min(int(request.query_params.get('limit', changes.DEFAULT_LIMIT)), changes.MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(changes.changes_since(request.query_params.get('since'), limit=limit))
+        except changes.InvalidToken as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+
+class OutboxViewSet(viewsets.ViewSet):
+    """
+    Transactional change log for sync consumers (see outbox.py).
+
+    GET /api/outbox/?after=<id>&limit=500 returns pending entries in order and
+    the `next` cursor; POST /api/outbox/ack/ {"ranges": [[first_id, last_id], ...]}
+    marks handled entries.
+    """
+    def list(self, request):
+        try:
+            after = int(request.query_params.get('after', 0))
+            limit = min(int(request.query_params.get('limit', 500)), 5000)
+        except ValueError:
+            return Response({'error': 'after and limit must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        entries = [
+            {
+                'id': entry.id,
+                'model': entry.model,
+                'object_id': entry.object_id,
+                'operation': entry.operation,
+                'changed_fields': entry.changed_fields,
+                'created_at': entry.created_at,
+            }
+            for entry in outbox.pending(after, limit)
+        ]
+        return Response({'entries': entries, 'next': entries[-1]['id'] if entries else after})
+
+    @action(detail=False, methods=['post'])
+    def ack(self, request):
+        ranges = request.data.get('ranges')
+        try:
+            ranges = [(int(first), int(last)) for first, last in ranges]
+        except (TypeError, ValueError):
+            return Response({'error': 'ranges must be a list of [first_id, last_id] pairs'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'acknowledged': outbox.acknowledge(ranges)})
+
+
 class PendingSyncViewSet(viewsets.ViewSet):
     """
-    Viewset returning pending Houses, Members, and Obligations combined.
+    Houses, members and obligations pending sync, newest first (see pending.py).
+
+    GET /api/pending-syncs/?cursor=<next>&limit=200 returns {'results', 'next'}.
+    POST /api/pending-syncs/ack/ {"ids": ["house_1001", "member_1002", ...]}
+    clears the flags in bulk; PATCH on one item still works.
     """
     def list(self, request):
-        houses = House.objects.filter(sync_pending=True)
-        members = Member.objects.filter(sync_pending=True)
-        obligations = MemberObligation.objects.filter(sync_pending=True)
-        
-        results = []
-        for h in houses:
-            results.append({
-                'id': f"house_{h.home_id}",
-                'model_name': 'House',
-                'object_id': h.home_id,
-                'description': f"House pending sync: {h.house_name} ({h.family_name})",
-                'is_sync_pending': True,
-                'action_type': 'UPDATE',
-                'timestamp': h.updated_at.isoformat(),
-            })
-            
-        for m in members:
-            results.append({
-                'id': f"member_{m.member_id}",
-                'model_name': 'Member',
-                'object_id': m.member_id,
-                'description': f"Member pending sync: {m.name} {m.surname}",
-                'is_sync_pending': True,
-                'action_type': 'UPDATE',
-                'timestamp': m.updated_at.isoformat(),
-            })
-            
-        for o in obligations:
-            sub_name = o.subcollection.name if o.subcollection else "Unknown"
-            member_name = o.member.name if o.member else "Unknown"
-            
-            results.append({
-                'id': f"obligation_{o.id}",
-                'model_name': 'Obligation',
-                'object_id': o.id,
-                'description': f"Obligation pending sync: {sub_name} for {member_name}",
-                'is_sync_pending': True,
-                'action_type': 'UPDATE',
-                'timestamp': o.updated_at.isoformat(),
-            })
-            
-        results.sort(key=lambda x: x['timestamp'], reverse=True)
-        return Response(results)
+        try:
+            limit = min(int(request.query_params.get('limit', pending.DEFAULT_LIMIT)), pending.MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'limit must be positive'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response(pending.page(request.query_params.get('cursor'), limit=limit))
+        except pending.InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['post'])
+    def ack(self, request):
+        item_ids = request.data.get('ids')
+        if not isinstance(item_ids, list):
+            return Response({'error': 'ids must be a list of pending sync item ids'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            with transaction.atomic():
+                cleared = pending.acknowledge(item_ids)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'acknowledged': cleared})
 
     def partial_update(self, request, pk=None):
         """
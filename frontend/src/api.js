@@ -59,6 +59,8 @@ api.interceptors.response.use(
 export const memberAPI = {
   getAll: (params) => api.get('/members/', { params }),
   getAllNoPagination: (params) => api.get('/members/all_members/', { params }),
+  // Streamed NDJSON/CSV: params { output: 'ndjson' | 'csv', columns: 'member_id,name,...', ...filters }
+  exportUrl: (params) => `${api.defaults.baseURL}/members/export/?${new URLSearchParams(params)}`,
   get: (id) => api.get(`/members/${id}/`),
   create: (data) => {
     const headers = data instanceof FormData ? { 'Content-Type': 'multipart/form-data' } : {};
@@ -108,6 +110,8 @@ export const collectionAPI = {
 export const subcollectionAPI = {
   getAll: () => api.get('/subcollections/'),
   get: (id) => api.get(`/subcollections/${id}/`),
+  // Server-side assignment: selector { area, status, guardian, gender, general_body_member, min_age, max_age, dry_run }
+  assign: (id, selector) => api.post(`/subcollections/${id}/assign/`, selector),
   create: (data) => api.post('/subcollections/', data),
   update: (id, data) => api.put(`/subcollections/${id}/`, data),
   delete: (id) => api.delete(`/subcollections/${id}/`),
@@ -126,6 +130,8 @@ export const obligationAPI = {
   statistics: (subcollectionId) => api.get('/obligations/statistics/', {
     params: { subcollection: subcollectionId }
   }),
+  // One request for many cards: pass { subcollections: '1,2,3' } or { collection: id }
+  batchStatistics: (params) => api.get('/obligations/batch_statistics/', { params }),
   exportData: () => api.post('/obligations/export_data/', {}, {
     responseType: 'blob',
   }),
@@ -172,9 +178,32 @@ export const settingsAPI = {
   delete: (id) => api.delete(`/settings/${id}/`),
 };
 
+// Incremental sync: pass the previous response's token as `since`; repeat while has_more
+export const changesAPI = {
+  since: (token, params) => api.get('/changes/', { params: { ...params, since: token || undefined } }),
+};
+
+// Transactional change log: read after the last seen id, then ack handled id ranges
+export const outboxAPI = {
+  pending: (after, params) => api.get('/outbox/', { params: { ...params, after: after || 0 } }),
+  ack: (ranges) => api.post('/outbox/ack/', { ranges }),
+};
+
 export const pendingSyncsAPI = {
-  getAll: (params) => api.get('/pending-syncs/', { params }),
+  page: (cursor, params) => api.get('/pending-syncs/', { params: { ...params, cursor: cursor || undefined } }),
+  // Follows the cursor through every page; resolves to { data: [items] }
+  getAll: async (params) => {
+    const data = [];
+    let cursor = null;
+    do {
+      const response = await pendingSyncsAPI.page(cursor, params);
+      data.push(...response.data.results);
+      cursor = response.data.next;
+    } while (cursor);
+    return { data };
+  },
   update: (id, data) => api.patch(`/pending-syncs/${id}/`, data),
+  ack: (ids) => api.post('/pending-syncs/ack/', { ids }),
 };
 
 export const digitalRequestAPI = {
@@ -322,12 +322,12 @@ const MyActions = () => {
                 }
             }
 
-            // 3. Clear pending sync flags locally
-            for (const action of pendingActions) {
-                try {
-                    await pendingSyncsAPI.update(action.id, { is_sync_pending: false });
-                    syncedCount++;
-                } catch (e) { }
+            // 3. Clear pending sync flags locally, in one request
+            try {
+                const response = await pendingSyncsAPI.ack(pendingActions.map(action => action.id));
+                syncedCount = response.data.acknowledged;
+            } catch (e) {
+                console.error("Failed to clear pending sync flags", e);
             }
 
             loadActions();